@@ -0,0 +1,501 @@
+//! `koko bench`: standardized synthesis benchmark (see history/BENCH_SPEC.md)
+//!
+//! Every test sentence is synthesized through two paths:
+//! - batch: the whole text in one `tts_raw_audio_with_style` call
+//! - streaming: sentence by sentence, as the WebSocket server does, which
+//!   gives the time to the first audio chunk
+//!
+//! Warm-up runs are discarded. `rtf` is generation time divided by audio
+//! duration, so lower is faster (0.1 = ten times faster than real time).
+
+use kokorox::tts::koko::{StyleSpec, TTSKoko};
+use kokorox::tts::segmentation::split_into_sentences;
+use serde::Serialize;
+use std::io::{self, Write};
+use std::time::{Instant, SystemTime, UNIX_EPOCH};
+
+/// Standard test sentences: (name, text)
+pub const BENCH_SENTENCES: [(&str, &str); 3] = [
+    ("short", "Hello world"),
+    ("medium", "The quick brown fox jumps over the lazy dog."),
+    (
+        "long",
+        "In a hole in the ground there lived a hobbit. Not a nasty, dirty, wet hole, \
+         filled with the ends of worms and an oozy smell, nor yet a dry, bare, sandy hole.",
+    ),
+];
+
+pub struct BenchOptions {
+    pub style: String,
+    pub language: String,
+    pub speed: f32,
+    /// Measured runs per sentence and path
+    pub runs: usize,
+    /// Discarded runs per sentence and path
+    pub warmup: usize,
+    /// Also benchmark the batch path for every available style
+    pub all_styles: bool,
+    /// Model description for the report
+    pub model: String,
+}
+
+#[derive(Serialize, Debug)]
+pub struct BenchReport {
+    pub benchmark: &'static str,
+    pub version: &'static str,
+    pub timestamp: String,
+    pub hardware: Hardware,
+    pub config: BenchConfig,
+    /// Batch path over all sentences; first_byte_latency_ms is from streaming
+    pub results: BenchMetrics,
+    /// Streaming path over all sentences
+    pub streaming: BenchMetrics,
+    pub sentences: Vec<SentenceResults>,
+    #[serde(skip_serializing_if = "Vec::is_empty")]
+    pub styles: Vec<StyleResults>,
+}
+
+#[derive(Serialize, Debug)]
+pub struct Hardware {
+    pub cpu: Option<String>,
+    pub cores: usize,
+    pub gpu: Option<String>,
+    pub memory_gb: Option<f64>,
+}
+
+#[derive(Serialize, Debug)]
+pub struct BenchConfig {
+    pub model: String,
+    pub style: String,
+    pub language: String,
+    pub speed: f32,
+    pub runs: usize,
+    pub warmup: usize,
+}
+
+#[derive(Serialize, Debug)]
+pub struct BenchMetrics {
+    pub rtf: f64,
+    pub first_byte_latency_ms: Option<f64>,
+    pub chars_per_second: f64,
+    pub latency_p50_ms: f64,
+    pub latency_p99_ms: f64,
+    pub memory_peak_mb: Option<f64>,
+    pub samples_per_second: f64,
+}
+
+#[derive(Serialize, Debug)]
+pub struct SentenceResults {
+    pub name: &'static str,
+    pub chars: usize,
+    pub batch: BenchMetrics,
+    pub streaming: BenchMetrics,
+}
+
+#[derive(Serialize, Debug)]
+pub struct StyleResults {
+    pub style: String,
+    pub results: BenchMetrics,
+}
+
+/// One measured synthesis
+struct RunSample {
+    chars: usize,
+    latency_ms: f64,
+    first_byte_ms: Option<f64>,
+    samples: usize,
+}
+
+impl BenchMetrics {
+    fn from_runs(runs: &[RunSample], sample_rate: u32) -> Self {
+        let total_seconds = runs.iter().map(|r| r.latency_ms).sum::<f64>() / 1000.0;
+        let chars: usize = runs.iter().map(|r| r.chars).sum();
+        let samples: usize = runs.iter().map(|r| r.samples).sum();
+        let audio_seconds = samples as f64 / sample_rate as f64;
+        let per_second = |n: f64| if total_seconds > 0.0 { n / total_seconds } else { 0.0 };
+
+        let latencies: Vec<f64> = runs.iter().map(|r| r.latency_ms).collect();
+        let first_bytes: Vec<f64> = runs.iter().filter_map(|r| r.first_byte_ms).collect();
+
+        BenchMetrics {
+            rtf: if audio_seconds > 0.0 { total_seconds / audio_seconds } else { 0.0 },
+            first_byte_latency_ms: (!first_bytes.is_empty()).then(|| percentile(&first_bytes, 50.0)),
+            chars_per_second: per_second(chars as f64),
+            latency_p50_ms: percentile(&latencies, 50.0),
+            latency_p99_ms: percentile(&latencies, 99.0),
+            memory_peak_mb: peak_memory_mb(),
+            samples_per_second: per_second(samples as f64),
+        }
+    }
+}
+
+/// Linear-interpolated percentile (0-100); 0.0 for no values
+fn percentile(values: &[f64], p: f64) -> f64 {
+    if values.is_empty() {
+        return 0.0;
+    }
+    let mut sorted = values.to_vec();
+    sorted.sort_by(|a, b| a.total_cmp(b));
+    let rank = p / 100.0 * (sorted.len() - 1) as f64;
+    let (lo, hi) = (rank.floor() as usize, rank.ceil() as usize);
+    sorted[lo] + (sorted[hi] - sorted[lo]) * (rank - lo as f64)
+}
+
+fn run_batch(
+    tts: &TTSKoko,
+    text: &str,
+    style: &StyleSpec,
+    opts: &BenchOptions,
+) -> Result<RunSample, Box<dyn std::error::Error>> {
+    let start = Instant::now();
+    let audio = tts.tts_raw_audio_with_style(text, &opts.language, style, opts.speed, None, false, true, false)?;
+    Ok(RunSample {
+        chars: text.chars().count(),
+        latency_ms: start.elapsed().as_secs_f64() * 1000.0,
+        first_byte_ms: None,
+        samples: audio.len(),
+    })
+}
+
+fn run_streaming(
+    tts: &TTSKoko,
+    text: &str,
+    style: &StyleSpec,
+    opts: &BenchOptions,
+) -> Result<RunSample, Box<dyn std::error::Error>> {
+    let start = Instant::now();
+    let mut first_byte_ms = None;
+    let mut samples = 0;
+    for sentence in split_into_sentences(text) {
+        if sentence.trim().is_empty() {
+            continue;
+        }
+        let audio =
+            tts.tts_raw_audio_with_style(&sentence, &opts.language, style, opts.speed, None, false, true, false)?;
+        if first_byte_ms.is_none() && !audio.is_empty() {
+            first_byte_ms = Some(start.elapsed().as_secs_f64() * 1000.0);
+        }
+        samples += audio.len();
+    }
+    Ok(RunSample {
+        chars: text.chars().count(),
+        latency_ms: start.elapsed().as_secs_f64() * 1000.0,
+        first_byte_ms,
+        samples,
+    })
+}
+
+type RunFn = fn(&TTSKoko, &str, &StyleSpec, &BenchOptions) -> Result<RunSample, Box<dyn std::error::Error>>;
+
+/// Warm up, then measure `opts.runs` runs of one text through one path
+fn measure(
+    run: RunFn,
+    tts: &TTSKoko,
+    text: &str,
+    style: &StyleSpec,
+    opts: &BenchOptions,
+) -> Result<Vec<RunSample>, Box<dyn std::error::Error>> {
+    for _ in 0..opts.warmup {
+        run(tts, text, style, opts)?;
+    }
+    (0..opts.runs.max(1)).map(|_| run(tts, text, style, opts)).collect()
+}
+
+/// Run the benchmark. Progress goes to stderr.
+pub fn run_bench(tts: &TTSKoko, opts: &BenchOptions) -> Result<BenchReport, Box<dyn std::error::Error>> {
+    let sample_rate = tts.sample_rate();
+    let style = StyleSpec::Name(opts.style.clone());
+
+    let mut sentences = Vec::new();
+    let (mut all_batch, mut all_streaming) = (Vec::new(), Vec::new());
+    for (name, text) in BENCH_SENTENCES {
+        eprintln!("bench: {} sentence ({} chars)", name, text.chars().count());
+        let batch = measure(run_batch, tts, text, &style, opts)?;
+        let streaming = measure(run_streaming, tts, text, &style, opts)?;
+        sentences.push(SentenceResults {
+            name,
+            chars: text.chars().count(),
+            batch: BenchMetrics::from_runs(&batch, sample_rate),
+            streaming: BenchMetrics::from_runs(&streaming, sample_rate),
+        });
+        all_batch.extend(batch);
+        all_streaming.extend(streaming);
+    }
+
+    let mut styles = Vec::new();
+    if opts.all_styles {
+        for name in tts.get_available_voices() {
+            eprintln!("bench: style {}", name);
+            let style = StyleSpec::Name(name.clone());
+            let mut runs = Vec::new();
+            for (_, text) in BENCH_SENTENCES {
+                runs.extend(measure(run_batch, tts, text, &style, opts)?);
+            }
+            styles.push(StyleResults {
+                style: name,
+                results: BenchMetrics::from_runs(&runs, sample_rate),
+            });
+        }
+    }
+
+    let streaming = BenchMetrics::from_runs(&all_streaming, sample_rate);
+    let mut results = BenchMetrics::from_runs(&all_batch, sample_rate);
+    results.first_byte_latency_ms = streaming.first_byte_latency_ms;
+
+    Ok(BenchReport {
+        benchmark: "koko-tts",
+        version: env!("CARGO_PKG_VERSION"),
+        timestamp: utc_timestamp(),
+        hardware: Hardware::detect(),
+        config: BenchConfig {
+            model: opts.model.clone(),
+            style: opts.style.clone(),
+            language: opts.language.clone(),
+            speed: opts.speed,
+            runs: opts.runs.max(1),
+            warmup: opts.warmup,
+        },
+        results,
+        streaming,
+        sentences,
+        styles,
+    })
+}
+
+/// Human-readable summary of a report
+pub fn print_report(report: &BenchReport) {
+    let row = |label: &str, m: &BenchMetrics| {
+        println!(
+            "{:<16} rtf {:>6.3}  p50 {:>8.1} ms  p99 {:>8.1} ms  first byte {:>8}  {:>8.0} chars/s  {:>9.0} samples/s",
+            label,
+            m.rtf,
+            m.latency_p50_ms,
+            m.latency_p99_ms,
+            m.first_byte_latency_ms
+                .map(|ms| format!("{:.1} ms", ms))
+                .unwrap_or_else(|| "-".to_string()),
+            m.chars_per_second,
+            m.samples_per_second,
+        )
+    };
+
+    println!(
+        "koko bench {} | style {} | {} | {} runs (+{} warm-up)",
+        report.version, report.config.style, report.config.language, report.config.runs, report.config.warmup
+    );
+    println!(
+        "CPU: {} ({} cores), GPU: {}, memory: {}",
+        report.hardware.cpu.as_deref().unwrap_or("unknown"),
+        report.hardware.cores,
+        report.hardware.gpu.as_deref().unwrap_or("none"),
+        report
+            .hardware
+            .memory_gb
+            .map(|gb| format!("{:.1} GB", gb))
+            .unwrap_or_else(|| "unknown".to_string()),
+    );
+    println!();
+    for sentence in &report.sentences {
+        row(&format!("{} batch", sentence.name), &sentence.batch);
+        row(&format!("{} stream", sentence.name), &sentence.streaming);
+    }
+    println!();
+    row("all batch", &report.results);
+    row("all stream", &report.streaming);
+    for style in &report.styles {
+        row(&style.style, &style.results);
+    }
+    if let Some(mb) = report.results.memory_peak_mb {
+        println!("\nPeak memory: {:.0} MB", mb);
+    }
+}
+
+impl Hardware {
+    fn detect() -> Self {
+        let gpu = if cfg!(feature = "cuda") {
+            Some("CUDA".to_string())
+        } else if cfg!(feature = "coreml") {
+            Some("CoreML".to_string())
+        } else {
+            None
+        };
+        Hardware {
+            cpu: cpu_name(),
+            cores: std::thread::available_parallelism().map(|n| n.get()).unwrap_or(1),
+            gpu,
+            memory_gb: total_memory_bytes().map(|b| b as f64 / (1u64 << 30) as f64),
+        }
+    }
+}
+
+#[cfg(target_os = "linux")]
+fn cpu_name() -> Option<String> {
+    let info = std::fs::read_to_string("/proc/cpuinfo").ok()?;
+    info.lines()
+        .find(|line| line.starts_with("model name"))
+        .and_then(|line| line.split(':').nth(1))
+        .map(|name| name.trim().to_string())
+}
+
+#[cfg(target_os = "macos")]
+fn cpu_name() -> Option<String> {
+    sysctl("machdep.cpu.brand_string")
+}
+
+#[cfg(not(any(target_os = "linux", target_os = "macos")))]
+fn cpu_name() -> Option<String> {
+    None
+}
+
+#[cfg(target_os = "linux")]
+fn total_memory_bytes() -> Option<u64> {
+    let info = std::fs::read_to_string("/proc/meminfo").ok()?;
+    let kb: u64 = info
+        .lines()
+        .find(|line| line.starts_with("MemTotal:"))?
+        .split_whitespace()
+        .nth(1)?
+        .parse()
+        .ok()?;
+    Some(kb * 1024)
+}
+
+#[cfg(target_os = "macos")]
+fn total_memory_bytes() -> Option<u64> {
+    sysctl("hw.memsize")?.parse().ok()
+}
+
+#[cfg(not(any(target_os = "linux", target_os = "macos")))]
+fn total_memory_bytes() -> Option<u64> {
+    None
+}
+
+#[cfg(target_os = "macos")]
+fn sysctl(name: &str) -> Option<String> {
+    let output = std::process::Command::new("sysctl").args(["-n", name]).output().ok()?;
+    Some(String::from_utf8_lossy(&output.stdout).trim().to_string())
+}
+
+/// Peak resident set size of this process so far, in MB
+#[cfg(unix)]
+fn peak_memory_mb() -> Option<f64> {
+    let mut usage: libc::rusage = unsafe { std::mem::zeroed() };
+    if unsafe { libc::getrusage(libc::RUSAGE_SELF, &mut usage) } != 0 {
+        return None;
+    }
+    // macOS reports bytes, Linux kilobytes
+    let bytes = if cfg!(target_os = "macos") {
+        usage.ru_maxrss as f64
+    } else {
+        usage.ru_maxrss as f64 * 1024.0
+    };
+    Some(bytes / (1024.0 * 1024.0))
+}
+
+#[cfg(not(unix))]
+fn peak_memory_mb() -> Option<f64> {
+    None
+}
+
+/// Current UTC time as RFC 3339, e.g. 2025-12-11T16:00:00Z
+fn utc_timestamp() -> String {
+    let secs = SystemTime::now()
+        .duration_since(UNIX_EPOCH)
+        .map(|d| d.as_secs() as i64)
+        .unwrap_or(0);
+    let (days, rem) = (secs.div_euclid(86_400), secs.rem_euclid(86_400));
+
+    // Civil date from days since 1970-01-01 (Howard Hinnant's algorithm)
+    let z = days + 719_468;
+    let era = z.div_euclid(146_097);
+    let doe = z.rem_euclid(146_097);
+    let yoe = (doe - doe / 1460 + doe / 36_524 - doe / 146_096) / 365;
+    let doy = doe - (365 * yoe + yoe / 4 - yoe / 100);
+    let mp = (5 * doy + 2) / 153;
+    let day = doy - (153 * mp + 2) / 5 + 1;
+    let month = if mp < 10 { mp + 3 } else { mp - 9 };
+    let year = yoe + era * 400 + if month <= 2 { 1 } else { 0 };
+
+    format!(
+        "{:04}-{:02}-{:02}T{:02}:{:02}:{:02}Z",
+        year,
+        month,
+        day,
+        rem / 3600,
+        rem % 3600 / 60,
+        rem % 60
+    )
+}
+
+/// Points stdout at stderr until dropped. koko's synthesis path logs to
+/// stdout, so this keeps `koko bench --output json > results.json` clean.
+pub struct StdoutToStderr {
+    #[cfg(unix)]
+    saved: libc::c_int,
+}
+
+impl StdoutToStderr {
+    #[cfg(unix)]
+    pub fn new() -> Option<Self> {
+        io::stdout().flush().ok()?;
+        let saved = unsafe { libc::dup(libc::STDOUT_FILENO) };
+        if saved < 0 {
+            return None;
+        }
+        if unsafe { libc::dup2(libc::STDERR_FILENO, libc::STDOUT_FILENO) } < 0 {
+            unsafe { libc::close(saved) };
+            return None;
+        }
+        Some(StdoutToStderr { saved })
+    }
+
+    #[cfg(not(unix))]
+    pub fn new() -> Option<Self> {
+        None
+    }
+}
+
+impl Drop for StdoutToStderr {
+    fn drop(&mut self) {
+        let _ = io::stdout().flush();
+        #[cfg(unix)]
+        unsafe {
+            libc::dup2(self.saved, libc::STDOUT_FILENO);
+            libc::close(self.saved);
+        }
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::{percentile, utc_timestamp, BenchMetrics, RunSample};
+
+    #[test]
+    fn interpolates_percentiles() {
+        let values = [4.0, 1.0, 3.0, 2.0];
+        assert_eq!(percentile(&values, 0.0), 1.0);
+        assert_eq!(percentile(&values, 50.0), 2.5);
+        assert_eq!(percentile(&values, 100.0), 4.0);
+        assert_eq!(percentile(&[], 50.0), 0.0);
+    }
+
+    #[test]
+    fn derives_rates_from_runs() {
+        let runs = [
+            RunSample { chars: 10, latency_ms: 500.0, first_byte_ms: Some(100.0), samples: 24_000 },
+            RunSample { chars: 10, latency_ms: 500.0, first_byte_ms: Some(300.0), samples: 24_000 },
+        ];
+        let metrics = BenchMetrics::from_runs(&runs, 24_000);
+        assert_eq!(metrics.rtf, 0.5);
+        assert_eq!(metrics.chars_per_second, 20.0);
+        assert_eq!(metrics.samples_per_second, 48_000.0);
+        assert_eq!(metrics.first_byte_latency_ms, Some(200.0));
+    }
+
+    #[test]
+    fn formats_timestamp() {
+        let ts = utc_timestamp();
+        assert_eq!(ts.len(), 20);
+        assert!(ts.ends_with('Z'));
+    }
+}
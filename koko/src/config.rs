@@ -59,6 +59,12 @@ pub struct AppConfig {
     /// Initial silence duration in tokens
     pub initial_silence: Option<usize>,
 
+    /// ONNX Runtime intra-op threads (None = one per core)
+    pub intra_threads: Option<usize>,
+
+    /// ONNX Runtime inter-op threads (None = ONNX Runtime default)
+    pub inter_threads: Option<usize>,
+
     /// Enable verbose debug output
     pub verbose: bool,
 
@@ -106,6 +112,8 @@ impl Default for AppConfig {
             data_path: None,
             model_type: None,
             initial_silence: None,
+            intra_threads: None,
+            inter_threads: None,
             verbose: false,
             debug_accents: false,
             server: ServerConfig::default(),
@@ -2,7 +2,7 @@ use base64::{engine::general_purpose::STANDARD as BASE64_STANDARD, Engine as _};
 use clap::{Parser, Subcommand};
 use futures_util::{SinkExt, StreamExt};
 use kokorox::{
-    tts::koko::{TTSKoko, TTSManager, TTSOpts},
+    tts::koko::{InitConfig, StyleSpec, TTSKoko, TTSManager, TTSOpts},
     utils::wav::{write_audio_chunk, WavHeader},
 };
 use regex::Regex;
@@ -22,6 +22,7 @@ use std::{
 use tokio::io::{AsyncBufReadExt, BufReader};
 use tokio_tungstenite::{connect_async, tungstenite::Message};
 
+mod bench;
 mod config;
 use config::AppConfig;
 
@@ -162,6 +163,83 @@ enum Mode {
         port: Option<u16>,
     },
 
+    /// Run as a long-lived synthesis worker: read one JSON job per line from stdin
+    /// and write one JSON result line per job to stdout. The model and voices are
+    /// loaded once, so a caller can keep a pool of workers busy.
+    ///
+    /// Job:    {"id": "...", "text": "...", "output": "out.wav", "style": "...",
+    ///          "language": "en-us", "speed": 1.0, "mono": false, "phonemes": false}
+    /// Result: {"id": "...", "status": "success"|"error", "output": "...",
+    ///          "error": "...", "audio_seconds": 1.2, "elapsed_ms": 340.0}
+    ///
+    /// Jobs may instead give "styles", "outputs" and optional "ids" lists to speak
+    /// the same text in several styles; one result line is written per style.
+    #[command(name = "worker")]
+    Worker {
+        /// Styles per forward pass for multi-style jobs. Only applies to models
+        /// exported with a batch axis (checked once at startup); with others,
+        /// such as the stock Kokoro export, styles run one at a time
+        #[arg(long = "style-batch", default_value_t = 8)]
+        style_batch: usize,
+    },
+
+    /// Synthesize every job in a JSONL file with a single model load.
+    /// Jobs use the same format as `koko worker`; one JSON result line is written
+    /// per job, in input order, to the --results file.
+    #[command(name = "batch")]
+    Batch {
+        /// JSONL file with one job per line ("-" reads jobs from stdin)
+        jobs_path: String,
+
+        /// File for the result lines (required: synthesis logs go to stdout)
+        #[arg(long = "results", value_name = "RESULTS_PATH")]
+        results_path: String,
+
+        /// Styles per forward pass for multi-style jobs. Only applies to models
+        /// exported with a batch axis (checked once at startup); with others,
+        /// such as the stock Kokoro export, styles run one at a time
+        #[arg(long = "style-batch", default_value_t = 8)]
+        style_batch: usize,
+    },
+
+    /// Print the phonemes and token IDs koko would synthesize, without synthesizing.
+    /// One JSON line is written per input text, with the phonemes and token IDs
+    /// (including --initial-silence) of each chunk:
+    /// {"text": "...", "language": "en-us", "phonemes": ["..."], "tokens": [[...]]}
+    /// The phoneme chunks, joined with newlines, can be fed back as job text with
+    /// "phonemes": true, so a text spoken by many voices is phonemized only once.
+    #[command(name = "phonemize")]
+    Phonemize {
+        /// Text to phonemize; without it, every non-empty stdin line is phonemized
+        text: Option<String>,
+    },
+
+    /// Benchmark synthesis speed, latency and memory on standard sentences,
+    /// through both the batch and the streaming (sentence by sentence) path.
+    /// Warm-up runs are discarded; `rtf` is generation time / audio duration.
+    #[command(name = "bench")]
+    Bench {
+        /// Voice style to benchmark (defaults to the global style)
+        #[arg(short = 's', long = "style", value_name = "STYLE")]
+        style: Option<String>,
+
+        /// Measured runs per sentence and path
+        #[arg(long, default_value_t = 5)]
+        runs: usize,
+
+        /// Discarded warm-up runs per sentence and path
+        #[arg(long, default_value_t = 1)]
+        warmup: usize,
+
+        /// Also benchmark every available voice style (batch path)
+        #[arg(long = "all-styles")]
+        all_styles: bool,
+
+        /// Output format: text or json
+        #[arg(long, default_value = "text", value_parser = ["text", "json"])]
+        output: String,
+    },
+
     /// List all available voice styles
     #[command(name = "voices", alias = "v", long_flag_aliases = ["voices"])]
     Voices {
@@ -284,6 +362,15 @@ struct Cli {
     #[arg(long = "initial-silence", value_name = "INITIAL_SILENCE")]
     initial_silence: Option<usize>,
 
+    /// ONNX Runtime intra-op threads (default: one per core).
+    /// When running several koko processes, split the cores between them
+    #[arg(long = "intra-threads", value_name = "N")]
+    intra_threads: Option<usize>,
+
+    /// ONNX Runtime inter-op threads (default: ONNX Runtime's choice)
+    #[arg(long = "inter-threads", value_name = "N")]
+    inter_threads: Option<usize>,
+
     /// Enable verbose debug output for text processing
     /// Especially useful for debugging issues with non-English text
     #[arg(
@@ -332,6 +419,8 @@ struct ResolvedConfig {
     speed: f32,
     mono: bool,
     initial_silence: Option<usize>,
+    intra_threads: Option<usize>,
+    inter_threads: Option<usize>,
     verbose: bool,
     debug_accents: bool,
     phonemes: bool,
@@ -359,6 +448,8 @@ impl ResolvedConfig {
             speed: cli.speed.unwrap_or(config.speed),
             mono: cli.mono.unwrap_or(config.mono),
             initial_silence: cli.initial_silence.or(config.initial_silence),
+            intra_threads: cli.intra_threads.or(config.intra_threads),
+            inter_threads: cli.inter_threads.or(config.inter_threads),
             verbose: cli.verbose.unwrap_or(config.verbose),
             debug_accents: cli.debug_accents.unwrap_or(config.debug_accents),
             phonemes: cli.phonemes,
@@ -1065,6 +1156,283 @@ fn ensure_parent_dir_exists(file_path: &str) -> io::Result<()> {
     Ok(())
 }
 
+/// A synthesis job for `koko worker`, one JSON object per line.
+/// Unset fields fall back to the resolved CLI/config settings.
+#[derive(Deserialize, Debug, Clone)]
+struct SynthesisJob {
+    /// Caller-chosen identifier, echoed back in the result
+    #[serde(default)]
+    id: Option<String>,
+    /// Text to synthesize (IPA phonemes when `phonemes` is true)
+    text: String,
+    /// Path of the WAV file to write
+    #[serde(default)]
+    output: String,
+    /// Voice style; a job style is always used as given (force-style).
+    /// Mixes may use float weights: "af_sky:0.37+am_echo:0.63"
+    #[serde(default)]
+    style: Option<String>,
+    /// Raw style values used instead of `style`: 256 floats, or a
+    /// (rows, 256) table indexed by token length, flattened row-major
+    #[serde(default)]
+    style_vector: Option<Vec<f32>>,
+    /// Several styles speaking the same text, one output (and optional id) each.
+    /// The text is phonemized once and styles are batched into forward passes;
+    /// one result line is written per style.
+    #[serde(default)]
+    styles: Vec<String>,
+    #[serde(default)]
+    outputs: Vec<String>,
+    #[serde(default)]
+    ids: Vec<String>,
+    #[serde(default, alias = "lan")]
+    language: Option<String>,
+    #[serde(default)]
+    speed: Option<f32>,
+    #[serde(default)]
+    mono: Option<bool>,
+    #[serde(default)]
+    phonemes: Option<bool>,
+}
+
+/// Result line written for every synthesis job (every style of a multi-style job)
+#[derive(Serialize, Debug)]
+struct SynthesisResult {
+    id: Option<String>,
+    status: &'static str,
+    output: String,
+    #[serde(skip_serializing_if = "Option::is_none")]
+    error: Option<String>,
+    /// Length of the generated audio in seconds
+    audio_seconds: f64,
+    /// Wall-clock time for synthesis and WAV write, in milliseconds
+    elapsed_ms: f64,
+}
+
+impl SynthesisResult {
+    fn failed(id: Option<String>, output: String, error: String, elapsed_ms: f64) -> Self {
+        SynthesisResult {
+            id,
+            status: "error",
+            output,
+            error: Some(error),
+            audio_seconds: 0.0,
+            elapsed_ms,
+        }
+    }
+}
+
+/// Settings used for job fields that are not set in the job itself
+struct JobDefaults {
+    lan: String,
+    style: String,
+    speed: f32,
+    mono: bool,
+    initial_silence: Option<usize>,
+    auto_detect: bool,
+    force_style: bool,
+    phonemes: bool,
+    url_mode: String,
+    verbose: bool,
+    /// Styles per forward pass for multi-style jobs
+    style_batch: usize,
+}
+
+/// Synthesize one job to its output file, returning the number of samples written
+fn synthesize_job(
+    tts: &TTSKoko,
+    job: &SynthesisJob,
+    defaults: &JobDefaults,
+) -> Result<usize, Box<dyn std::error::Error>> {
+    let phonemes = job.phonemes.unwrap_or(defaults.phonemes);
+    let text = if phonemes {
+        job.text.clone()
+    } else {
+        apply_text_preprocessing(&job.text, &defaults.url_mode, defaults.verbose)
+    };
+
+    if job.output.is_empty() {
+        return Err("Job has no output path".into());
+    }
+    ensure_parent_dir_exists(&job.output)?;
+    let style = match &job.style_vector {
+        Some(values) => StyleSpec::Vector(values.clone()),
+        None => StyleSpec::Name(job.style.clone().unwrap_or_else(|| defaults.style.clone())),
+    };
+    let audio = tts.tts_raw_audio_with_style(
+        &text,
+        job.language.as_deref().unwrap_or(&defaults.lan),
+        &style,
+        job.speed.unwrap_or(defaults.speed),
+        defaults.initial_silence,
+        // An explicit job language disables auto-detection for that job
+        defaults.auto_detect && job.language.is_none(),
+        job.style.is_some() || defaults.force_style,
+        phonemes,
+    )?;
+    tts.save_wav(&audio, &job.output, job.mono.unwrap_or(defaults.mono))?;
+    Ok(audio.len())
+}
+
+/// Style batching needs a model that returns one waveform per batch entry;
+/// check once at load time so no job pays for a failed batched pass.
+fn check_style_batching(tts: &TTSKoko, style_batch: usize) {
+    if style_batch <= 1 {
+        return;
+    }
+    if tts.probe_style_batching() {
+        eprintln!("Style batching on: up to {} styles per forward pass", style_batch);
+    } else {
+        eprintln!(
+            "Style batching off: the model has no batch axis, so --style-batch {} is ignored \
+             and styles are synthesized one at a time",
+            style_batch
+        );
+    }
+}
+
+/// Parse and run one job line, passing every result to `emit` as soon as it is ready.
+/// Malformed lines produce an error result; multi-style jobs produce one result per style.
+/// Only errors returned by `emit` (e.g. a closed result stream) are returned.
+fn run_job_line(
+    tts: &TTSKoko,
+    line: &str,
+    defaults: &JobDefaults,
+    emit: &mut dyn FnMut(SynthesisResult) -> Result<(), Box<dyn std::error::Error>>,
+) -> Result<(), Box<dyn std::error::Error>> {
+    match serde_json::from_str::<SynthesisJob>(line) {
+        Ok(job) if !job.styles.is_empty() => run_multi_style_job(tts, &job, defaults, emit),
+        Ok(job) => emit(run_synthesis_job(tts, &job, defaults)),
+        Err(e) => emit(SynthesisResult::failed(None, String::new(), format!("Invalid job: {}", e), 0.0)),
+    }
+}
+
+/// Synthesize a multi-style job, emitting each style's result as soon as its
+/// group of styles is synthesized and written, so callers can time out per
+/// style rather than per job. If synthesis fails, the styles not emitted yet
+/// get error results.
+fn run_multi_style_job(
+    tts: &TTSKoko,
+    job: &SynthesisJob,
+    defaults: &JobDefaults,
+    emit: &mut dyn FnMut(SynthesisResult) -> Result<(), Box<dyn std::error::Error>>,
+) -> Result<(), Box<dyn std::error::Error>> {
+    let id_for = |i: usize| -> Option<String> {
+        job.ids
+            .get(i)
+            .cloned()
+            .or_else(|| job.id.as_ref().map(|id| format!("{}:{}", id, i)))
+    };
+    let output_for = |i: usize| job.outputs.get(i).cloned().unwrap_or_default();
+
+    if job.outputs.len() != job.styles.len() {
+        let error = format!(
+            "Job has {} styles but {} outputs",
+            job.styles.len(),
+            job.outputs.len()
+        );
+        for i in 0..job.styles.len() {
+            emit(SynthesisResult::failed(id_for(i), output_for(i), error.clone(), 0.0))?;
+        }
+        return Ok(());
+    }
+
+    let phonemes = job.phonemes.unwrap_or(defaults.phonemes);
+    let text = if phonemes {
+        job.text.clone()
+    } else {
+        apply_text_preprocessing(&job.text, &defaults.url_mode, defaults.verbose)
+    };
+    let styles: Vec<&str> = job.styles.iter().map(String::as_str).collect();
+    let mono = job.mono.unwrap_or(defaults.mono);
+
+    let mut emitted = 0;
+    let mut emit_error = None;
+    let mut mark = std::time::Instant::now();
+    let outcome = tts.tts_raw_audio_multi_style_each(
+        &text,
+        job.language.as_deref().unwrap_or(&defaults.lan),
+        &styles,
+        job.speed.unwrap_or(defaults.speed),
+        defaults.initial_silence,
+        defaults.auto_detect && job.language.is_none(),
+        // Job styles are always used as given
+        true,
+        phonemes,
+        defaults.style_batch,
+        &mut |first, waveforms| {
+            // Shared work is spread evenly over the styles of a group
+            let elapsed_ms = mark.elapsed().as_secs_f64() * 1000.0 / waveforms.len() as f64;
+            for (offset, waveform) in waveforms.iter().enumerate() {
+                let i = first + offset;
+                let output = &job.outputs[i];
+                let saved = ensure_parent_dir_exists(output)
+                    .map_err(Box::<dyn std::error::Error>::from)
+                    .and_then(|_| tts.save_wav(waveform, output, mono));
+                let result = match saved {
+                    Ok(()) => SynthesisResult {
+                        id: id_for(i),
+                        status: "success",
+                        output: output.clone(),
+                        error: None,
+                        audio_seconds: waveform.len() as f64 / tts.sample_rate() as f64,
+                        elapsed_ms,
+                    },
+                    Err(e) => SynthesisResult::failed(id_for(i), output.clone(), e.to_string(), elapsed_ms),
+                };
+                if let Err(e) = emit(result) {
+                    emit_error = Some(e);
+                    return Err("Result stream closed".into());
+                }
+                emitted = i + 1;
+            }
+            mark = std::time::Instant::now();
+            Ok(())
+        },
+    );
+
+    if let Some(e) = emit_error {
+        return Err(e);
+    }
+    if let Err(e) = outcome {
+        let elapsed_ms = mark.elapsed().as_secs_f64() * 1000.0;
+        for i in emitted..job.styles.len() {
+            emit(SynthesisResult::failed(id_for(i), output_for(i), e.to_string(), elapsed_ms))?;
+        }
+    }
+    Ok(())
+}
+
+fn run_synthesis_job(tts: &TTSKoko, job: &SynthesisJob, defaults: &JobDefaults) -> SynthesisResult {
+    let start = std::time::Instant::now();
+    let outcome = synthesize_job(tts, job, defaults);
+    let elapsed_ms = start.elapsed().as_secs_f64() * 1000.0;
+
+    match outcome {
+        Ok(samples) => SynthesisResult {
+            id: job.id.clone(),
+            status: "success",
+            output: job.output.clone(),
+            error: None,
+            audio_seconds: samples as f64 / tts.sample_rate() as f64,
+            elapsed_ms,
+        },
+        Err(e) => SynthesisResult::failed(job.id.clone(), job.output.clone(), e.to_string(), elapsed_ms),
+    }
+}
+
+/// Write one JSON value as a single line and flush it.
+/// For stdout, pass a locked handle so the line never interleaves with log output.
+fn write_json_line<W: Write, T: Serialize>(
+    out: &mut W,
+    value: &T,
+) -> Result<(), Box<dyn std::error::Error>> {
+    let line = serde_json::to_string(value)?;
+    writeln!(out, "{}", line)?;
+    out.flush()?;
+    Ok(())
+}
+
 #[derive(Debug, Clone)]
 enum PipeBackend {
     Local,
@@ -1425,6 +1793,12 @@ fn main() -> Result<(), Box<dyn std::error::Error>> {
         let silent = resolved.silent;
         let mode = cli.mode.clone();
 
+        // Keep library log lines out of a JSON benchmark report on stdout
+        let mut bench_redirect = match &mode {
+            Mode::Bench { output, .. } if output == "json" => bench::StdoutToStderr::new(),
+            _ => None,
+        };
+
         // Initialize ONNX Runtime (required for CUDA with load-dynamic)
         if let Err(e) = kokorox::onn::init_ort(None) {
             eprintln!("Failed to initialize ONNX Runtime: {}", e);
@@ -1474,13 +1848,35 @@ fn main() -> Result<(), Box<dyn std::error::Error>> {
             kokorox::utils::hf_cache::ModelVariant::V1English
         };
 
-        let tts = TTSKoko::new_with_variant(
+        let init_config = InitConfig {
+            intra_threads: resolved.intra_threads,
+            inter_threads: resolved.inter_threads,
+            ..InitConfig::default()
+        };
+
+        let tts = TTSKoko::new_with_config(
             model_path.as_deref(),
             data_path.as_deref(),
             model_type.as_deref(),
-            variant
+            variant,
+            init_config.clone(),
         ).await;
 
+        // Settings for worker/batch job fields that a job leaves unset
+        let job_defaults = |style_batch: usize| JobDefaults {
+            lan: lan.clone(),
+            style: style.clone(),
+            speed,
+            mono,
+            initial_silence,
+            auto_detect,
+            force_style,
+            phonemes,
+            url_mode: url_mode.clone(),
+            verbose,
+            style_batch,
+        };
+
         match &mode {
             Mode::Config { .. } => {
                 // Already handled above
@@ -1593,7 +1989,7 @@ fn main() -> Result<(), Box<dyn std::error::Error>> {
                 println!("Starting OpenAI-compatible HTTP server on {addr}");
 
                 // Use TTSManager for dynamic model switching
-                let manager = TTSManager::with_variant(variant, model_type.clone()).await;
+                let manager = TTSManager::with_variant_and_config(variant, model_type.clone(), init_config.clone()).await;
                 let app = kokorox_openai::create_server_with_manager(manager).await;
                 let binding = tokio::net::TcpListener::bind(&addr).await?;
                 kokorox_openai::serve(binding, app.into_make_service()).await?;
@@ -1611,7 +2007,7 @@ fn main() -> Result<(), Box<dyn std::error::Error>> {
 
                 // Use TTSManager for dynamic model switching
                 // Initialize with the currently selected variant
-                let manager = TTSManager::with_variant(variant, model_type.clone()).await;
+                let manager = TTSManager::with_variant_and_config(variant, model_type.clone(), init_config.clone()).await;
                 kokorox_websocket::start_server_with_manager(manager, addr).await?;
 
                 tts.cleanup();
@@ -1622,6 +2018,147 @@ fn main() -> Result<(), Box<dyn std::error::Error>> {
                 return Ok(());
             }
 
+            Mode::Worker { style_batch } => {
+                let defaults = job_defaults(*style_batch);
+                check_style_batching(&tts, *style_batch);
+
+                // Tell the caller the model and voices are loaded
+                write_json_line(
+                    &mut io::stdout().lock(),
+                    &serde_json::json!({
+                        "event": "ready",
+                        "sample_rate": tts.sample_rate(),
+                        "voices": tts.get_available_voices().len(),
+                    }),
+                )?;
+
+                let stdin = tokio::io::stdin();
+                let mut lines = BufReader::new(stdin).lines();
+
+                while let Some(line) = lines.next_line().await? {
+                    let line = line.trim();
+                    if line.is_empty() {
+                        continue;
+                    }
+                    run_job_line(&tts, line, &defaults, &mut |result| {
+                        write_json_line(&mut io::stdout().lock(), &result)
+                    })?;
+                }
+            }
+
+            Mode::Bench {
+                style: bench_style,
+                runs,
+                warmup,
+                all_styles,
+                output,
+            } => {
+                let opts = bench::BenchOptions {
+                    style: bench_style.clone().unwrap_or_else(|| style.clone()),
+                    language: lan.clone(),
+                    speed,
+                    runs: *runs,
+                    warmup: *warmup,
+                    all_styles: *all_styles,
+                    model: model_path.clone().unwrap_or_else(|| {
+                        kokorox::utils::hf_cache::get_model_path_for_variant(variant)
+                            .display()
+                            .to_string()
+                    }),
+                };
+                let report = bench::run_bench(&tts, &opts)?;
+                drop(bench_redirect.take());
+
+                if output == "json" {
+                    println!("{}", serde_json::to_string_pretty(&report)?);
+                } else {
+                    bench::print_report(&report);
+                }
+            }
+
+            Mode::Phonemize { text } => {
+                let texts: Vec<String> = match text {
+                    Some(text) => vec![text.clone()],
+                    None => io::stdin()
+                        .lines()
+                        .collect::<Result<Vec<_>, _>>()?
+                        .into_iter()
+                        .filter(|line| !line.trim().is_empty())
+                        .collect(),
+                };
+
+                for text in texts {
+                    let processed = apply_text_preprocessing(&text, &url_mode, verbose);
+                    let line = match tts.phonemize_chunks(&processed, &lan, auto_detect, false) {
+                        Ok((language, chunks)) => {
+                            let tokens: Vec<Vec<i64>> = chunks
+                                .iter()
+                                .map(|p| tts.tokenize_chunk(p, initial_silence))
+                                .collect();
+                            serde_json::json!({
+                                "text": text,
+                                "language": language,
+                                "phonemes": chunks,
+                                "tokens": tokens,
+                            })
+                        }
+                        Err(e) => serde_json::json!({ "text": text, "error": e.to_string() }),
+                    };
+                    write_json_line(&mut io::stdout().lock(), &line)?;
+                }
+            }
+
+            Mode::Batch {
+                jobs_path,
+                results_path,
+                style_batch,
+            } => {
+                let defaults = job_defaults(*style_batch);
+                check_style_batching(&tts, *style_batch);
+
+                let jobs: Box<dyn io::BufRead> = if jobs_path == "-" {
+                    Box::new(io::BufReader::new(io::stdin()))
+                } else {
+                    Box::new(io::BufReader::new(fs::File::open(jobs_path)?))
+                };
+                ensure_parent_dir_exists(results_path)?;
+                let mut results = io::BufWriter::new(fs::File::create(results_path)?);
+
+                let start = std::time::Instant::now();
+                let (mut succeeded, mut failed) = (0usize, 0usize);
+                let mut audio_seconds = 0.0;
+
+                for line in jobs.lines() {
+                    let line = line?;
+                    let line = line.trim();
+                    if line.is_empty() {
+                        continue;
+                    }
+                    run_job_line(&tts, line, &defaults, &mut |result| {
+                        if result.error.is_none() {
+                            succeeded += 1;
+                            audio_seconds += result.audio_seconds;
+                        } else {
+                            failed += 1;
+                            eprintln!(
+                                "Job {} failed: {}",
+                                result.id.as_deref().unwrap_or("?"),
+                                result.error.as_deref().unwrap_or_default()
+                            );
+                        }
+                        write_json_line(&mut results, &result)
+                    })?;
+                }
+
+                eprintln!(
+                    "Batch complete: {} succeeded, {} failed, {:.1}s of audio in {:.1}s",
+                    succeeded,
+                    failed,
+                    audio_seconds,
+                    start.elapsed().as_secs_f64()
+                );
+            }
+
             Mode::Stream => {
                 let stdin = tokio::io::stdin();
                 let reader = BufReader::new(stdin);
@@ -6,7 +6,10 @@ use axum::http::{header, StatusCode};
 use axum::response::{IntoResponse, Response};
 use axum::{extract::State, routing::get, routing::post, Json, Router};
 use kokorox::{
-    tts::koko::{InitConfig as TTSKokoInitConfig, TTSKoko, TTSManager},
+    tts::koko::{
+        is_style_mix, parse_style_mix, InitConfig as TTSKokoInitConfig, StyleSpec, TTSKoko,
+        TTSManager,
+    },
     utils::mp3::pcm_to_mp3,
     utils::wav::{write_audio_chunk, WavHeader},
 };
@@ -68,6 +71,25 @@ struct SpeechRequest {
     // Enable automatic language detection
     #[serde(default)]
     auto_detect: Option<bool>,
+
+    // Raw style values used instead of `voice`: 256 floats, or a
+    // (rows, 256) table indexed by token length, flattened row-major
+    #[serde(default)]
+    style_vector: Option<Vec<f32>>,
+}
+
+/// Style for a request: a raw vector if given, otherwise a weighted mix
+/// (`af_sky:0.3+am_echo:0.7`) used exactly, otherwise a voice name
+fn request_style(voice: String, style_vector: Option<Vec<f32>>) -> Result<StyleSpec, SpeechError> {
+    if let Some(values) = style_vector {
+        Ok(StyleSpec::Vector(values))
+    } else if is_style_mix(&voice) {
+        parse_style_mix(&voice)
+            .map(StyleSpec::Mix)
+            .map_err(SpeechError::InvalidStyle)
+    } else {
+        Ok(StyleSpec::Name(voice))
+    }
 }
 
 #[derive(Serialize)]
@@ -135,12 +157,17 @@ enum SpeechError {
 
     #[allow(dead_code)]
     Mp3Conversion(std::io::Error),
+
+    InvalidStyle(Box<dyn Error>),
 }
 
 impl IntoResponse for SpeechError {
     fn into_response(self) -> Response {
-        // None of these errors make sense to expose to the user of the API
-        StatusCode::INTERNAL_SERVER_ERROR.into_response()
+        match self {
+            SpeechError::InvalidStyle(e) => (StatusCode::BAD_REQUEST, e.to_string()).into_response(),
+            // None of these errors make sense to expose to the user of the API
+            _ => StatusCode::INTERNAL_SERVER_ERROR.into_response(),
+        }
     }
 }
 
@@ -272,6 +299,7 @@ async fn handle_tts(
         initial_silence,
         language,
         auto_detect,
+        style_vector,
     }): Json<SpeechRequest>,
 ) -> Result<Response, SpeechError> {
     // Determine language - either specified, auto-detected, or default
@@ -291,11 +319,13 @@ async fn handle_tts(
         );
     }
 
+    let style = request_style(voice, style_vector)?;
+
     let raw_audio = tts
-        .tts_raw_audio(
+        .tts_raw_audio_with_style(
             &input,
             &lan,
-            &voice,
+            &style,
             speed,
             initial_silence,
             auto_detect_language,
@@ -378,6 +408,7 @@ async fn handle_tts_with_manager(
         initial_silence,
         language,
         auto_detect,
+        style_vector,
     }): Json<SpeechRequest>,
 ) -> Result<Response, SpeechError> {
     // Determine language - either specified, auto-detected, or default
@@ -397,11 +428,13 @@ async fn handle_tts_with_manager(
         );
     }
 
+    let style = request_style(voice, style_vector)?;
+
     let raw_audio = manager
-        .tts_raw_audio(
+        .tts_raw_audio_with_style(
             &input,
             &lan,
-            &voice,
+            &style,
             speed,
             initial_silence,
             auto_detect_language,
@@ -1,7 +1,7 @@
 use std::net::SocketAddr;
 
 use futures_util::{stream::SplitSink, SinkExt, StreamExt};
-use kokorox::tts::koko::{TTSKoko, TTSManager};
+use kokorox::tts::koko::{is_style_mix, parse_style_mix, StyleSpec, TTSKoko, TTSManager};
 use serde::{Deserialize, Serialize};
 use tokio::net::{TcpListener, TcpStream};
 use tokio_tungstenite::{accept_async, tungstenite::Message, WebSocketStream};
@@ -18,6 +18,17 @@ struct ClientCommand {
     auto_detect: bool,
     /// Stream ID for streaming mode (stream_start/stream_append/stream_end)
     stream_id: Option<String>,
+    /// Raw style values used instead of the voice (synthesize/stream_start):
+    /// 256 floats, or a (rows, 256) table indexed by token length, row-major
+    style_vector: Option<Vec<f32>>,
+}
+
+/// Style for a command: its raw vector if given, otherwise its voice or the current voice
+fn command_style(style_vector: Option<Vec<f32>>, voice: Option<&str>, current_voice: &str) -> StyleSpec {
+    match style_vector {
+        Some(values) => StyleSpec::Vector(values),
+        None => StyleSpec::Name(voice.unwrap_or(current_voice).to_string()),
+    }
 }
 
 /// State for an active streaming session
@@ -26,8 +37,8 @@ struct StreamSession {
     buffer: String,
     /// Number of audio chunks sent so far
     chunk_count: usize,
-    /// Voice to use for this stream
-    voice: String,
+    /// Voice style to use for this stream
+    style: StyleSpec,
     /// Language for this stream
     language: String,
     /// Speed for this stream
@@ -159,10 +170,11 @@ async fn handle_connection(stream: TcpStream, manager: TTSManager) {
                                     ))
                                     .await;
 
+                                let style = command_style(cmd.style_vector, cmd.voice.as_deref(), &current_voice);
                                 let result = synthesize_streaming_with_manager(
                                     &manager,
                                     &synth_text,
-                                    &current_voice,
+                                    &style,
                                     language,
                                     speed,
                                     use_auto_detect,
@@ -200,7 +212,7 @@ async fn handle_connection(stream: TcpStream, manager: TTSManager) {
                             let session = StreamSession {
                                 buffer: String::new(),
                                 chunk_count: 0,
-                                voice: cmd.voice.unwrap_or_else(|| current_voice.clone()),
+                                style: command_style(cmd.style_vector, cmd.voice.as_deref(), &current_voice),
                                 language: cmd.language.unwrap_or_else(|| current_language.clone()),
                                 speed: cmd.speed.unwrap_or(current_speed),
                                 auto_detect: cmd.auto_detect || auto_detect,
@@ -387,10 +399,10 @@ async fn synthesize_and_send_chunk(
     write: &mut SplitSink<WebSocketStream<TcpStream>, Message>,
 ) -> Result<(), Box<dyn std::error::Error + Send + Sync>> {
     let audio = manager
-        .tts_raw_audio(
+        .tts_raw_audio_with_style(
             text,
             &session.language,
-            &session.voice,
+            &session.style,
             session.speed,
             None,
             session.auto_detect,
@@ -457,12 +469,10 @@ async fn handle_connection_legacy(stream: TcpStream, tts: TTSKoko) {
                         }
                         "set_voice" => {
                             if let Some(v) = cmd.voice {
-                                let is_valid = if v.contains('+') {
-                                    v.split('+').all(|part| {
-                                        part.split_once('.')
-                                            .map(|(name, _)| voices.contains(&name.to_string()))
-                                            .unwrap_or(false)
-                                    })
+                                let is_valid = if is_style_mix(&v) {
+                                    parse_style_mix(&v)
+                                        .map(|parts| parts.iter().all(|(name, _)| voices.contains(name)))
+                                        .unwrap_or(false)
                                 } else {
                                     voices.contains(&v)
                                 };
@@ -530,10 +540,11 @@ async fn handle_connection_legacy(stream: TcpStream, tts: TTSKoko) {
                                     ))
                                     .await;
 
+                                let style = command_style(cmd.style_vector, cmd.voice.as_deref(), &current_voice);
                                 let result = synthesize_streaming(
                                     &tts,
                                     &synth_text,
-                                    &current_voice,
+                                    &style,
                                     language,
                                     speed,
                                     &mut write,
@@ -591,7 +602,7 @@ async fn handle_connection_legacy(stream: TcpStream, tts: TTSKoko) {
 async fn synthesize_streaming(
     tts: &TTSKoko,
     text: &str,
-    voice: &str,
+    style: &StyleSpec,
     language: &str,
     speed: f32,
     write: &mut SplitSink<WebSocketStream<TcpStream>, Message>,
@@ -607,7 +618,7 @@ async fn synthesize_streaming(
         }
 
         let audio_opt =
-            match tts.tts_raw_audio(sentence, language, voice, speed, None, false, true, false) {
+            match tts.tts_raw_audio_with_style(sentence, language, style, speed, None, false, true, false) {
                 Ok(audio) => Some(audio),
                 Err(_) => {
                     eprintln!("TTS error for sentence '{}'", sentence);
@@ -638,7 +649,7 @@ async fn synthesize_streaming(
 async fn synthesize_streaming_with_manager(
     manager: &TTSManager,
     text: &str,
-    voice: &str,
+    style: &StyleSpec,
     language: &str,
     speed: f32,
     auto_detect: bool,
@@ -655,10 +666,10 @@ async fn synthesize_streaming_with_manager(
         }
 
         let audio_opt = match manager
-            .tts_raw_audio(
+            .tts_raw_audio_with_style(
                 sentence,
                 language,
-                voice,
+                style,
                 speed,
                 None,
                 auto_detect,
@@ -12,6 +12,18 @@ use ort::session::Session;
 
 pub trait OrtBase {
     fn load_model(&mut self, model_path: String) -> Result<(), String> {
+        self.load_model_with_threads(model_path, None, None)
+    }
+
+    /// Load a model with explicit ONNX Runtime thread pool sizes.
+    /// `intra_threads` parallelizes within an operator, `inter_threads` runs
+    /// independent operators concurrently; None keeps the ONNX Runtime default.
+    fn load_model_with_threads(
+        &mut self,
+        model_path: String,
+        intra_threads: Option<usize>,
+        inter_threads: Option<usize>,
+    ) -> Result<(), String> {
         #[cfg(feature = "cuda")]
         let providers = [CUDAExecutionProvider::default().build()];
 
@@ -25,7 +37,19 @@ pub trait OrtBase {
         let providers = [CPUExecutionProvider::default().build()];
 
         match SessionBuilder::new() {
-            Ok(builder) => {
+            Ok(mut builder) => {
+                if let Some(n) = intra_threads {
+                    builder = builder
+                        .with_intra_threads(n)
+                        .map_err(|e| format!("Failed to set intra-op threads: {}", e))?;
+                }
+                if let Some(n) = inter_threads {
+                    // Inter-op threads are only used with parallel execution
+                    builder = builder
+                        .with_parallel_execution(n > 1)
+                        .and_then(|b| b.with_inter_threads(n))
+                        .map_err(|e| format!("Failed to set inter-op threads: {}", e))?;
+                }
                 let session = builder
                     .with_execution_providers(providers)
                     .map_err(|e| format!("Failed to build session: {}", e))?
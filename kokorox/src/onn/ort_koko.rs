@@ -29,8 +29,17 @@ impl ort_base::OrtBase for OrtKoko {
 }
 impl OrtKoko {
     pub fn new(model_path: String) -> Result<Self, String> {
+        Self::new_with_threads(model_path, None, None)
+    }
+
+    /// Load the model with explicit intra-/inter-op thread counts (None = ONNX Runtime default)
+    pub fn new_with_threads(
+        model_path: String,
+        intra_threads: Option<usize>,
+        inter_threads: Option<usize>,
+    ) -> Result<Self, String> {
         let mut instance = OrtKoko { sess: None };
-        instance.load_model(model_path)?;
+        instance.load_model_with_threads(model_path, intra_threads, inter_threads)?;
         Ok(instance)
     }
 
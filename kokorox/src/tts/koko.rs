@@ -3,15 +3,13 @@ use crate::tts::phonemizer::{
     detect_language, get_default_voice_for_language, normalize_language_code,
 };
 use crate::tts::tokenize::{tokenize, tokenize_with_variant, ModelVariant as TokenizerVariant};
-use std::collections::HashMap;
 use std::path::Path;
+use std::sync::atomic::{AtomicBool, Ordering};
 use std::sync::Arc;
 
 use crate::onn::ort_koko::{self};
+use crate::tts::voices::{VoiceStore, DEFAULT_STYLE_CACHE_SIZE};
 use crate::utils;
-use ndarray::Array3;
-use ndarray_npy::NpzReader;
-use std::fs::File;
 
 use espeak_rs::text_to_phonemes;
 
@@ -38,10 +36,13 @@ pub struct TTSKoko {
     model_path: String,
     voices_path: String,
     model: Arc<ort_koko::OrtKoko>,
-    styles: HashMap<String, Vec<[[f32; 256]; 1]>>,
+    styles: Arc<VoiceStore>,
     init_config: InitConfig,
     /// Model variant being used (English/multilingual or Chinese)
     model_variant: ModelVariant,
+    /// Whether the model returns one waveform per style in a batched pass;
+    /// off until probe_style_batching() finds that it does
+    style_batching: Arc<AtomicBool>,
 }
 
 #[derive(Clone)]
@@ -49,6 +50,13 @@ pub struct InitConfig {
     pub model_url: String,
     pub voices_url: String,
     pub sample_rate: u32,
+    /// Decoded voices kept in memory; other voices are read from the pack on use
+    pub style_cache_size: usize,
+    /// ONNX Runtime intra-op threads (None = one per core). Lower this when
+    /// several koko processes share a machine.
+    pub intra_threads: Option<usize>,
+    /// ONNX Runtime inter-op threads (None = ONNX Runtime default)
+    pub inter_threads: Option<usize>,
 }
 
 impl Default for InitConfig {
@@ -57,6 +65,9 @@ impl Default for InitConfig {
             model_url: "https://github.com/thewh1teagle/kokoro-onnx/releases/download/model-files-v1.0/kokoro-v1.0.onnx".into(),
             voices_url: "https://github.com/thewh1teagle/kokoro-onnx/releases/download/model-files-v1.0/voices-v1.0.bin".into(),
             sample_rate: 24000,
+            style_cache_size: DEFAULT_STYLE_CACHE_SIZE,
+            intra_threads: None,
+            inter_threads: None,
         }
     }
 }
@@ -68,6 +79,8 @@ pub struct TTSManager {
     current_tts: Arc<tokio::sync::RwLock<Option<TTSKoko>>>,
     current_variant: Arc<tokio::sync::RwLock<Option<ModelVariant>>>,
     model_type: Option<String>,
+    /// Settings for every model this manager loads
+    init_config: InitConfig,
 }
 
 impl TTSManager {
@@ -77,16 +90,29 @@ impl TTSManager {
             current_tts: Arc::new(tokio::sync::RwLock::new(None)),
             current_variant: Arc::new(tokio::sync::RwLock::new(None)),
             model_type,
+            init_config: InitConfig::default(),
         }
     }
 
     /// Create a new TTSManager with a specific model preloaded
     pub async fn with_variant(variant: ModelVariant, model_type: Option<String>) -> Self {
-        let tts = TTSKoko::new_with_variant(None, None, model_type.as_deref(), variant).await;
+        Self::with_variant_and_config(variant, model_type, InitConfig::default()).await
+    }
+
+    /// Create a new TTSManager with a specific model preloaded, using `cfg`
+    /// (thread counts, style cache size) for it and every model switched to later
+    pub async fn with_variant_and_config(
+        variant: ModelVariant,
+        model_type: Option<String>,
+        cfg: InitConfig,
+    ) -> Self {
+        let tts =
+            TTSKoko::new_with_config(None, None, model_type.as_deref(), variant, cfg.clone()).await;
         Self {
             current_tts: Arc::new(tokio::sync::RwLock::new(Some(tts))),
             current_variant: Arc::new(tokio::sync::RwLock::new(Some(variant))),
             model_type,
+            init_config: cfg,
         }
     }
 
@@ -129,7 +155,14 @@ impl TTSManager {
         // Need to switch models
         println!("Switching to {:?} model...", needed_variant);
         let new_tts =
-            TTSKoko::new_with_variant(None, None, self.model_type.as_deref(), needed_variant).await;
+            TTSKoko::new_with_config(
+                None,
+                None,
+                self.model_type.as_deref(),
+                needed_variant,
+                self.init_config.clone(),
+            )
+            .await;
 
         // Update the stored TTS
         {
@@ -190,6 +223,43 @@ impl TTSManager {
         })
     }
 
+    /// Synthesize audio with a StyleSpec, selecting the model like tts_raw_audio
+    pub async fn tts_raw_audio_with_style(
+        &self,
+        txt: &str,
+        lan: &str,
+        style: &StyleSpec,
+        speed: f32,
+        initial_silence: Option<usize>,
+        auto_detect_language: bool,
+        force_style: bool,
+        phonemes: bool,
+    ) -> Result<Vec<f32>, Box<dyn std::error::Error + Send + Sync>> {
+        let effective_language = if auto_detect_language && Self::text_is_chinese(txt) {
+            "zh"
+        } else {
+            lan
+        };
+
+        let tts = self.get_tts_for_language(effective_language).await;
+        tts.tts_raw_audio_with_style(
+            txt,
+            lan,
+            style,
+            speed,
+            initial_silence,
+            auto_detect_language,
+            force_style,
+            phonemes,
+        )
+        .map_err(|e| -> Box<dyn std::error::Error + Send + Sync> {
+            Box::new(std::io::Error::new(
+                std::io::ErrorKind::Other,
+                e.to_string(),
+            ))
+        })
+    }
+
     /// Get available voices for the currently loaded model
     pub async fn get_available_voices(&self) -> Vec<String> {
         if let Some(tts) = self.current_tts.read().await.as_ref() {
@@ -421,6 +491,74 @@ pub fn restore_spanish_accents(text: &str) -> String {
     fixed
 }
 
+/// Pad a token list with the 0 start/end token the model expects
+fn pad_tokens(tokens: &[i64]) -> Vec<i64> {
+    let mut padded = Vec::with_capacity(tokens.len() + 2);
+    padded.push(0);
+    padded.extend_from_slice(tokens);
+    padded.push(0);
+    padded
+}
+
+/// A voice style given by name, as a weighted mix, or as raw values
+#[derive(Debug, Clone, PartialEq)]
+pub enum StyleSpec {
+    /// Voice name or mix string, resolved like `--style`
+    Name(String),
+    /// Weighted sum of named voices; weights are used as given
+    Mix(Vec<(String, f32)>),
+    /// Raw style values: 256 floats used for every token length, or a
+    /// row-major (rows, 256) table indexed by token length like a voice pack entry
+    Vector(Vec<f32>),
+}
+
+/// Whether a style name is a voice mix rather than a single voice
+pub fn is_style_mix(style_name: &str) -> bool {
+    style_name.contains('+') || style_name.contains(':')
+}
+
+/// Parse a voice mix string into (voice, weight) pairs.
+///
+/// Accepts float weights, `af_sky:0.37+am_echo:0.63` (any number of voices),
+/// and the older tenths syntax, `af_sky.4+am_echo.6`.
+pub fn parse_style_mix(style_name: &str) -> Result<Vec<(String, f32)>, Box<dyn std::error::Error>> {
+    let invalid = || -> Box<dyn std::error::Error> {
+        format!("Invalid voice mix format '{}'. Use format: voice1:weight+voice2:weight (e.g., jf_alpha:0.4+am_echo:0.6)", style_name).into()
+    };
+
+    let mut parts = Vec::new();
+    for part in style_name.split('+') {
+        let (name, weight) = if let Some((name, weight)) = part.split_once(':') {
+            (name, weight.parse::<f32>().map_err(|_| invalid())?)
+        } else if let Some((name, tenths)) = part.split_once('.') {
+            (name, tenths.parse::<f32>().map_err(|_| invalid())? * 0.1)
+        } else {
+            return Err(invalid());
+        };
+        if name.is_empty() || !weight.is_finite() {
+            return Err(invalid());
+        }
+        parts.push((name.to_string(), weight));
+    }
+    Ok(parts)
+}
+
+/// Style row for one token length from raw style values (see StyleSpec::Vector)
+fn style_vector_row(
+    values: &[f32],
+    tokens_len: usize,
+) -> Result<Vec<Vec<f32>>, Box<dyn std::error::Error>> {
+    if values.is_empty() || values.len() % 256 != 0 {
+        return Err(format!(
+            "Style vector must have 256 or rows * 256 values, got {}",
+            values.len()
+        )
+        .into());
+    }
+    let row = tokens_len.min(values.len() / 256 - 1);
+    Ok(vec![values[row * 256..(row + 1) * 256].to_vec()])
+}
+
 // Function to fix common Spanish phoneme issues
 pub fn fix_spanish_phonemes(phonemes: &str) -> String {
     println!("DEBUG: Fixing Spanish phonemes: {}", phonemes);
@@ -485,9 +623,7 @@ impl TTSKoko {
 
     /// Get a list of all available voice IDs
     pub fn get_available_voices(&self) -> Vec<String> {
-        let mut voices: Vec<String> = self.styles.keys().cloned().collect();
-        voices.sort();
-        voices
+        self.styles.names().to_vec()
     }
 
     /// Create a new TTSKoko instance with automatic HF cache downloads
@@ -510,6 +646,19 @@ impl TTSKoko {
         voices_path: Option<&str>,
         model_type: Option<&str>,
         variant: ModelVariant,
+    ) -> Self {
+        Self::new_with_config(model_path, voices_path, model_type, variant, InitConfig::default())
+            .await
+    }
+
+    /// Create a new TTSKoko instance with automatic HF cache downloads and
+    /// explicit settings (thread counts, style cache size)
+    pub async fn new_with_config(
+        model_path: Option<&str>,
+        voices_path: Option<&str>,
+        model_type: Option<&str>,
+        variant: ModelVariant,
+        cfg: InitConfig,
     ) -> Self {
         // Use HF cache logic to ensure files are available
         let (resolved_model_path, resolved_voices_path) =
@@ -522,9 +671,10 @@ impl TTSKoko {
             .await
             .expect("Failed to ensure model and voices files are available");
 
-        Self::from_paths_with_variant(
+        Self::from_config_with_variant(
             resolved_model_path.to_string_lossy().as_ref(),
             resolved_voices_path.to_string_lossy().as_ref(),
+            cfg,
             variant,
         )
         .await
@@ -568,14 +718,24 @@ impl TTSKoko {
         }
 
         let model = Arc::new(
-            ort_koko::OrtKoko::new(model_path.to_string())
-                .expect("Failed to create Kokoro TTS model"),
+            ort_koko::OrtKoko::new_with_threads(
+                model_path.to_string(),
+                cfg.intra_threads,
+                cfg.inter_threads,
+            )
+            .expect("Failed to create Kokoro TTS model"),
         );
 
         // TODO: if(not streaming) { model.print_info(); }
         // model.print_info();
 
-        let styles = Self::load_voices(voices_path);
+        let styles = Arc::new(
+            VoiceStore::open(voices_path, cfg.style_cache_size).expect("Failed to open voices file"),
+        );
+        println!(
+            "voice styles available: {} (decoded on first use)",
+            styles.len()
+        );
 
         TTSKoko {
             model_path: model_path.to_string(),
@@ -584,6 +744,7 @@ impl TTSKoko {
             styles,
             init_config: cfg,
             model_variant: variant,
+            style_batching: Arc::new(AtomicBool::new(false)),
         }
     }
 
@@ -601,7 +762,7 @@ impl TTSKoko {
         }
 
         // Also check for specific known custom voice styles in the loaded styles
-        let has_custom_styles = self.styles.keys().any(|k| {
+        let has_custom_styles = self.styles.names().iter().any(|k| {
             k.starts_with("en_")
                 || k.starts_with("zh_")
                 || k.starts_with("ja_")
@@ -766,6 +927,235 @@ impl TTSKoko {
         force_style: bool,
         phonemes: bool,
     ) -> Result<Vec<f32>, Box<dyn std::error::Error>> {
+        let (language, token_chunks) =
+            self.text_to_token_chunks(txt, lan, initial_silence, auto_detect_language, phonemes)?;
+        let effective_style =
+            self.resolve_style(style_name, &language, auto_detect_language, force_style);
+
+        self.synthesize_token_chunks(&token_chunks, &StyleSpec::Name(effective_style), speed)
+    }
+
+    /// Like tts_raw_audio, but with the style given as a StyleSpec.
+    ///
+    /// Weighted mixes and raw vectors are used exactly as given; names go
+    /// through the usual style selection.
+    pub fn tts_raw_audio_with_style(
+        &self,
+        txt: &str,
+        lan: &str,
+        style: &StyleSpec,
+        speed: f32,
+        initial_silence: Option<usize>,
+        auto_detect_language: bool,
+        force_style: bool,
+        phonemes: bool,
+    ) -> Result<Vec<f32>, Box<dyn std::error::Error>> {
+        if let StyleSpec::Name(style_name) = style {
+            return self.tts_raw_audio(
+                txt,
+                lan,
+                style_name,
+                speed,
+                initial_silence,
+                auto_detect_language,
+                force_style,
+                phonemes,
+            );
+        }
+
+        let (_, token_chunks) =
+            self.text_to_token_chunks(txt, lan, initial_silence, auto_detect_language, phonemes)?;
+        self.synthesize_token_chunks(&token_chunks, style, speed)
+    }
+
+    /// Run every token chunk through the model with one style and concatenate the audio
+    fn synthesize_token_chunks(
+        &self,
+        token_chunks: &[Vec<i64>],
+        style: &StyleSpec,
+        speed: f32,
+    ) -> Result<Vec<f32>, Box<dyn std::error::Error>> {
+        let mut final_audio = Vec::new();
+        for tokens in token_chunks {
+            // Get style vectors once per chunk
+            let styles = self.style_for_spec(style, tokens.len())?;
+            let chunk_audio = self.infer_chunk(vec![pad_tokens(tokens)], styles, speed)?;
+            final_audio.extend(chunk_audio.iter().cloned());
+        }
+
+        Ok(final_audio)
+    }
+
+    /// Synthesize the same text with several styles.
+    ///
+    /// Like tts_raw_audio_multi_style_each, but collects one waveform per
+    /// style, in the order of `style_names`.
+    pub fn tts_raw_audio_multi_style(
+        &self,
+        txt: &str,
+        lan: &str,
+        style_names: &[&str],
+        speed: f32,
+        initial_silence: Option<usize>,
+        auto_detect_language: bool,
+        force_style: bool,
+        phonemes: bool,
+        batch_size: usize,
+    ) -> Result<Vec<Vec<f32>>, Box<dyn std::error::Error>> {
+        let mut audio = Vec::with_capacity(style_names.len());
+        self.tts_raw_audio_multi_style_each(
+            txt,
+            lan,
+            style_names,
+            speed,
+            initial_silence,
+            auto_detect_language,
+            force_style,
+            phonemes,
+            batch_size,
+            &mut |_, waveforms| {
+                audio.extend(waveforms);
+                Ok(())
+            },
+        )?;
+        Ok(audio)
+    }
+
+    /// Synthesize the same text with several styles, handing over audio as it is done.
+    ///
+    /// The text is split, phonemized and tokenized once. Styles are then
+    /// synthesized in groups of up to `batch_size`, one forward pass per
+    /// chunk and group if the model supports batched styles (see
+    /// probe_style_batching), otherwise one style per pass. After each group
+    /// `on_audio(first, waveforms)` receives the finished waveforms of
+    /// styles `first..first + waveforms.len()`.
+    pub fn tts_raw_audio_multi_style_each(
+        &self,
+        txt: &str,
+        lan: &str,
+        style_names: &[&str],
+        speed: f32,
+        initial_silence: Option<usize>,
+        auto_detect_language: bool,
+        force_style: bool,
+        phonemes: bool,
+        batch_size: usize,
+        on_audio: &mut dyn FnMut(usize, Vec<Vec<f32>>) -> Result<(), Box<dyn std::error::Error>>,
+    ) -> Result<(), Box<dyn std::error::Error>> {
+        let (language, token_chunks) =
+            self.text_to_token_chunks(txt, lan, initial_silence, auto_detect_language, phonemes)?;
+        let effective_styles: Vec<String> = style_names
+            .iter()
+            .map(|name| self.resolve_style(name, &language, auto_detect_language, force_style))
+            .collect();
+        let batch_size = if self.style_batching.load(Ordering::Relaxed) {
+            batch_size.max(1)
+        } else {
+            1
+        };
+
+        let mut first = 0;
+        for batch in effective_styles.chunks(batch_size) {
+            let mut audio = vec![Vec::new(); batch.len()];
+            for tokens in &token_chunks {
+                let padded = pad_tokens(tokens);
+                let mut styles = Vec::with_capacity(batch.len());
+                for style in batch {
+                    styles.extend(self.mix_styles(style, tokens.len())?);
+                }
+
+                if batch.len() > 1 {
+                    let output = self.infer_chunk(vec![padded; batch.len()], styles, speed)?;
+                    if output.ndim() < 2 || output.shape()[0] != batch.len() {
+                        return Err(format!(
+                            "Model returned shape {:?} for {} batched styles",
+                            output.shape(),
+                            batch.len()
+                        )
+                        .into());
+                    }
+                    for (row, waveform) in output.outer_iter().enumerate() {
+                        audio[row].extend(waveform.iter().cloned());
+                    }
+                } else {
+                    let output = self.infer_chunk(vec![padded], styles, speed)?;
+                    audio[0].extend(output.iter().cloned());
+                }
+            }
+            on_audio(first, audio)?;
+            first += batch.len();
+        }
+
+        Ok(())
+    }
+
+    /// Check once whether the model returns one waveform per batch row.
+    ///
+    /// Runs a tiny two-row forward pass and enables batched styles in
+    /// tts_raw_audio_multi_style for models that support them. The stock
+    /// Kokoro export returns a single waveform, so batching stays off there.
+    pub fn probe_style_batching(&self) -> bool {
+        let tokens = pad_tokens(&[16, 4, 16]);
+        let styles = vec![vec![0.0; 256]; 2];
+        let supported = matches!(
+            self.model.infer(vec![tokens; 2], styles, 1.0),
+            Ok(output) if output.ndim() >= 2 && output.shape()[0] == 2
+        );
+        self.style_batching.store(supported, Ordering::Relaxed);
+        supported
+    }
+
+    /// Split text into chunks and turn each chunk into model tokens.
+    /// Returns the normalized language code used and one token list per chunk.
+    fn text_to_token_chunks(
+        &self,
+        txt: &str,
+        lan: &str,
+        initial_silence: Option<usize>,
+        auto_detect_language: bool,
+        phonemes: bool,
+    ) -> Result<(String, Vec<Vec<i64>>), Box<dyn std::error::Error>> {
+        let (language, phoneme_chunks) =
+            self.phonemize_chunks(txt, lan, auto_detect_language, phonemes)?;
+
+        let token_chunks = phoneme_chunks
+            .iter()
+            .map(|phonemes| self.tokenize_chunk(phonemes, initial_silence))
+            .collect();
+
+        Ok((language, token_chunks))
+    }
+
+    /// Token IDs of one chunk as synthesis feeds them to the model (before
+    /// padding), including the `initial_silence` tokens. The style row a
+    /// chunk reads is the length of this list.
+    pub fn tokenize_chunk(&self, phonemes: &str, initial_silence: Option<usize>) -> Vec<i64> {
+        let mut tokens = self.tokenize_phonemes(phonemes);
+        for _ in 0..initial_silence.unwrap_or(0) {
+            tokens.insert(0, 30);
+        }
+        tokens
+    }
+
+    /// Token IDs for a phoneme string, using the vocabulary of the loaded model
+    pub fn tokenize_phonemes(&self, phonemes: &str) -> Vec<i64> {
+        match self.model_variant {
+            ModelVariant::V1Chinese => tokenize_with_variant(phonemes, TokenizerVariant::Chinese),
+            ModelVariant::V1English => tokenize_with_variant(phonemes, TokenizerVariant::English),
+        }
+    }
+
+    /// Split text into chunks and phonemize each chunk, exactly as synthesis does.
+    /// Returns the normalized language code used and one phoneme string per chunk;
+    /// with `phonemes` set, the input is already IPA (one or more chunks per
+    /// line) and is only chunked.
+    pub fn phonemize_chunks(
+        &self,
+        txt: &str,
+        lan: &str,
+        auto_detect_language: bool,
+        phonemes: bool,
+    ) -> Result<(String, Vec<String>), Box<dyn std::error::Error>> {
         let cleaned_text = if phonemes {
             None
         } else {
@@ -778,11 +1168,22 @@ impl TTSKoko {
         // phoneme order and prevent cutting inside syllables.
         let chunks = if phonemes {
             println!("PHONEMES MODE: Chunking by words with token budget");
-            self.split_phonemes_into_chunks(txt, 500) // leave ~12 tokens margin
+            // Each line is chunked on its own and kept verbatim if it fits, so
+            // the chunks printed by `koko phonemize` (one per line) come back
+            // unchanged
+            txt.lines()
+                .filter(|line| !line.trim().is_empty())
+                .flat_map(|line| {
+                    if self.tokenize_phonemes(line).len() <= 500 {
+                        vec![line.to_string()]
+                    } else {
+                        self.split_phonemes_into_chunks(line, 500) // leave ~12 tokens margin
+                    }
+                })
+                .collect()
         } else {
             self.split_text_into_chunks(text_for_tts, 500) // leave ~12 tokens margin
         };
-        let mut final_audio = Vec::new();
 
         // Determine language to use
         let language = if auto_detect_language {
@@ -814,135 +1215,7 @@ impl TTSKoko {
             "en-us".to_string()
         });
 
-        // Determine if we're using custom voices
-        let is_custom = self.is_using_custom_voices(&self.voices_path);
-
-        // Determine which style to use
-        // Special case: if force_style is true but the style is the default
-        // English voice (af_heart) while the language is non-English, do not
-        // force the style. This avoids accidentally overriding language-
-        // appropriate voices when users pass --force-style without changing
-        // the default style.
-        let force_style_effective = if force_style
-            && style_name == "af_heart"
-            && !language.starts_with("en")
-        {
-            println!(
-                "NOTE: Ignoring forced style 'af_heart' for non-English language '{}'; using language-appropriate voice.",
-                language
-            );
-            false
-        } else {
-            force_style
-        };
-
-        let effective_style = if !force_style_effective {
-            // Try to automatically select a voice appropriate for the language
-            // This applies to both auto-detect and manual language selection modes
-            let default_style = get_default_voice_for_language(&language, is_custom);
-
-            // Check if the default style exists in our voices
-            if self.styles.contains_key(&default_style) {
-                if auto_detect_language {
-                    println!(
-                        "Detected language: {} - Using voice style: {}",
-                        language, default_style
-                    );
-                } else {
-                    println!(
-                        "Manual language: {} - Using appropriate voice style: {}",
-                        language, default_style
-                    );
-                }
-                default_style
-            } else {
-                // Fall back to user-provided style if default not available
-                if auto_detect_language {
-                    println!(
-                        "Detected language: {} - Default voice unavailable, using: {}",
-                        language, style_name
-                    );
-                } else {
-                    println!(
-                        "Manual language: {} - No specific voice available, using: {}",
-                        language, style_name
-                    );
-                }
-                // Check if the user's style is available
-                if !self.styles.contains_key(style_name) {
-                    println!(
-                        "WARNING: Specified style '{}' not found in available voices",
-                        style_name
-                    );
-                    println!(
-                        "Available voices: {:?}",
-                        self.styles.keys().collect::<Vec<_>>()
-                    );
-                    // Fall back to a default voice we know exists - first voice in the list
-                    let fallback_style = self.styles.keys().next().unwrap().to_string();
-                    println!("Falling back to first available voice: {}", fallback_style);
-                    fallback_style
-                } else {
-                    style_name.to_string()
-                }
-            }
-        } else {
-            // User has explicitly forced a specific style
-            if auto_detect_language {
-                println!(
-                    "Detected language: {} - User override: using voice style: {}",
-                    language, style_name
-                );
-            } else {
-                println!(
-                    "Manual language mode: {} - User force-style: {}",
-                    language, style_name
-                );
-            }
-
-            // Check if the forced style exists (or if it's a valid mix)
-            if style_name.contains("+") {
-                // Voice mixing - validate each voice exists
-                let mut all_valid = true;
-                for style_part in style_name.split('+') {
-                    if let Some((name, _)) = style_part.split_once('.') {
-                        if !self.styles.contains_key(name) {
-                            println!(
-                                "WARNING: Voice '{}' in mix not found in available voices",
-                                name
-                            );
-                            all_valid = false;
-                        }
-                    }
-                }
-
-                if !all_valid {
-                    println!(
-                        "Available voices: {:?}",
-                        self.styles.keys().collect::<Vec<_>>()
-                    );
-                    let fallback_style = self.styles.keys().next().unwrap().to_string();
-                    println!("Falling back to first available voice: {}", fallback_style);
-                    fallback_style
-                } else {
-                    style_name.to_string()
-                }
-            } else if !self.styles.contains_key(style_name) {
-                println!(
-                    "WARNING: Forced style '{}' not found in available voices",
-                    style_name
-                );
-                println!(
-                    "Available voices: {:?}",
-                    self.styles.keys().collect::<Vec<_>>()
-                );
-                let fallback_style = self.styles.keys().next().unwrap().to_string();
-                println!("Falling back to first available voice: {}", fallback_style);
-                fallback_style
-            } else {
-                style_name.to_string()
-            }
-        };
+        let mut phoneme_chunks = Vec::new();
 
         for chunk in chunks {
             // Convert chunk to phonemes using the determined language
@@ -1148,49 +1421,171 @@ impl TTSKoko {
                 println!("Original: {}", chunk);
                 println!("Phonemes after fix: {}", phonemes);
             }
-            // Use the appropriate vocabulary based on model variant
-            let mut tokens = match self.model_variant {
-                ModelVariant::V1Chinese => {
-                    tokenize_with_variant(&phonemes, TokenizerVariant::Chinese)
-                }
-                ModelVariant::V1English => {
-                    tokenize_with_variant(&phonemes, TokenizerVariant::English)
-                }
-            };
+            phoneme_chunks.push(phonemes);
+        }
 
-            for _ in 0..initial_silence.unwrap_or(0) {
-                tokens.insert(0, 30);
-            }
+        Ok((language, phoneme_chunks))
+    }
 
-            // Get style vectors once - using the effective style determined above
-            let styles = self.mix_styles(&effective_style, tokens.len())?;
+    /// Decide which voice style to use for a language, honouring force_style
+    fn resolve_style(
+        &self,
+        style_name: &str,
+        language: &str,
+        auto_detect_language: bool,
+        force_style: bool,
+    ) -> String {
+        // Determine if we're using custom voices
+        let is_custom = self.is_using_custom_voices(&self.voices_path);
 
-            // pad a 0 to start and end of tokens
-            let mut padded_tokens = vec![0];
-            for &token in &tokens {
-                padded_tokens.push(token);
-            }
-            padded_tokens.push(0);
+        // Determine which style to use
+        // Special case: if force_style is true but the style is the default
+        // English voice (af_heart) while the language is non-English, do not
+        // force the style. This avoids accidentally overriding language-
+        // appropriate voices when users pass --force-style without changing
+        // the default style.
+        let force_style_effective = if force_style
+            && style_name == "af_heart"
+            && !language.starts_with("en")
+        {
+            println!(
+                "NOTE: Ignoring forced style 'af_heart' for non-English language '{}'; using language-appropriate voice.",
+                language
+            );
+            false
+        } else {
+            force_style
+        };
+
+        if !force_style_effective {
+            // Try to automatically select a voice appropriate for the language
+            // This applies to both auto-detect and manual language selection modes
+            let default_style = get_default_voice_for_language(&language, is_custom);
 
-            let tokens = vec![padded_tokens];
+            // Check if the default style exists in our voices
+            if self.styles.contains(&default_style) {
+                if auto_detect_language {
+                    println!(
+                        "Detected language: {} - Using voice style: {}",
+                        language, default_style
+                    );
+                } else {
+                    println!(
+                        "Manual language: {} - Using appropriate voice style: {}",
+                        language, default_style
+                    );
+                }
+                default_style
+            } else {
+                // Fall back to user-provided style if default not available
+                if auto_detect_language {
+                    println!(
+                        "Detected language: {} - Default voice unavailable, using: {}",
+                        language, style_name
+                    );
+                } else {
+                    println!(
+                        "Manual language: {} - No specific voice available, using: {}",
+                        language, style_name
+                    );
+                }
+                // Check if the user's style is available
+                if !self.styles.contains(style_name) {
+                    println!(
+                        "WARNING: Specified style '{}' not found in available voices",
+                        style_name
+                    );
+                    println!(
+                        "Available voices: {:?}",
+                        self.styles.names()
+                    );
+                    // Fall back to a default voice we know exists - first voice in the list
+                    let fallback_style = self.styles.names()[0].clone();
+                    println!("Falling back to first available voice: {}", fallback_style);
+                    fallback_style
+                } else {
+                    style_name.to_string()
+                }
+            }
+        } else {
+            // User has explicitly forced a specific style
+            if auto_detect_language {
+                println!(
+                    "Detected language: {} - User override: using voice style: {}",
+                    language, style_name
+                );
+            } else {
+                println!(
+                    "Manual language mode: {} - User force-style: {}",
+                    language, style_name
+                );
+            }
 
-            match self.model.infer(tokens, styles.clone(), speed) {
-                Ok(chunk_audio) => {
-                    let chunk_audio: Vec<f32> = chunk_audio.iter().cloned().collect();
-                    final_audio.extend_from_slice(&chunk_audio);
+            // Check if the forced style exists (or if it's a valid mix)
+            if is_style_mix(style_name) {
+                // Voice mixing - validate each voice exists
+                let mut all_valid = true;
+                match parse_style_mix(style_name) {
+                    Ok(parts) => {
+                        for (name, _) in &parts {
+                            if !self.styles.contains(name) {
+                                println!(
+                                    "WARNING: Voice '{}' in mix not found in available voices",
+                                    name
+                                );
+                                all_valid = false;
+                            }
+                        }
+                    }
+                    Err(e) => {
+                        println!("WARNING: {}", e);
+                        all_valid = false;
+                    }
                 }
-                Err(e) => {
-                    eprintln!("Error processing chunk: {:?}", e);
-                    eprintln!("Chunk text was: {:?}", chunk);
-                    return Err(Box::new(std::io::Error::new(
-                        std::io::ErrorKind::Other,
-                        format!("Chunk processing failed: {:?}", e),
-                    )));
+
+                if !all_valid {
+                    println!(
+                        "Available voices: {:?}",
+                        self.styles.names()
+                    );
+                    let fallback_style = self.styles.names()[0].clone();
+                    println!("Falling back to first available voice: {}", fallback_style);
+                    fallback_style
+                } else {
+                    style_name.to_string()
                 }
+            } else if !self.styles.contains(style_name) {
+                println!(
+                    "WARNING: Forced style '{}' not found in available voices",
+                    style_name
+                );
+                println!(
+                    "Available voices: {:?}",
+                    self.styles.names()
+                );
+                let fallback_style = self.styles.names()[0].clone();
+                println!("Falling back to first available voice: {}", fallback_style);
+                fallback_style
+            } else {
+                style_name.to_string()
             }
         }
+    }
 
-        Ok(final_audio)
+    /// Run one forward pass, turning inference errors into chunk errors
+    fn infer_chunk(
+        &self,
+        tokens: Vec<Vec<i64>>,
+        styles: Vec<Vec<f32>>,
+        speed: f32,
+    ) -> Result<ndarray::ArrayD<f32>, Box<dyn std::error::Error>> {
+        self.model.infer(tokens, styles, speed).map_err(|e| {
+            eprintln!("Error processing chunk: {:?}", e);
+            Box::new(std::io::Error::new(
+                std::io::ErrorKind::Other,
+                format!("Chunk processing failed: {:?}", e),
+            )) as Box<dyn std::error::Error>
+        })
     }
 
     pub fn tts(
@@ -1219,36 +1614,34 @@ impl TTSKoko {
             phonemes,
         )?;
 
-        // Save to file
-        if mono {
-            let spec = hound::WavSpec {
-                channels: 1,
-                sample_rate: self.init_config.sample_rate,
-                bits_per_sample: 32,
-                sample_format: hound::SampleFormat::Float,
-            };
+        self.save_wav(&audio, save_path, mono)?;
+        eprintln!("Audio saved to {}", save_path);
+        Ok(())
+    }
 
-            let mut writer = hound::WavWriter::create(save_path, spec)?;
-            for &sample in &audio {
-                writer.write_sample(sample)?;
-            }
-            writer.finalize()?;
-        } else {
-            let spec = hound::WavSpec {
-                channels: 2,
-                sample_rate: self.init_config.sample_rate,
-                bits_per_sample: 32,
-                sample_format: hound::SampleFormat::Float,
-            };
+    /// Write audio samples to a 32-bit float WAV file.
+    /// Stereo output duplicates the mono signal into both channels.
+    pub fn save_wav(
+        &self,
+        audio: &[f32],
+        save_path: &str,
+        mono: bool,
+    ) -> Result<(), Box<dyn std::error::Error>> {
+        let spec = hound::WavSpec {
+            channels: if mono { 1 } else { 2 },
+            sample_rate: self.init_config.sample_rate,
+            bits_per_sample: 32,
+            sample_format: hound::SampleFormat::Float,
+        };
 
-            let mut writer = hound::WavWriter::create(save_path, spec)?;
-            for &sample in &audio {
-                writer.write_sample(sample)?;
+        let mut writer = hound::WavWriter::create(save_path, spec)?;
+        for &sample in audio {
+            writer.write_sample(sample)?;
+            if !mono {
                 writer.write_sample(sample)?;
             }
-            writer.finalize()?;
         }
-        eprintln!("Audio saved to {}", save_path);
+        writer.finalize()?;
         Ok(())
     }
 
@@ -1257,80 +1650,61 @@ impl TTSKoko {
         style_name: &str,
         tokens_len: usize,
     ) -> Result<Vec<Vec<f32>>, Box<dyn std::error::Error>> {
-        if !style_name.contains("+") {
-            if let Some(style) = self.styles.get(style_name) {
-                let styles = vec![style[tokens_len][0].to_vec()];
+        if !is_style_mix(style_name) {
+            if let Some(style) = self.styles.get(style_name)? {
+                let styles = vec![style[tokens_len].to_vec()];
                 Ok(styles)
             } else {
                 Err(format!("can not found from styles_map: {}", style_name).into())
             }
         } else {
             eprintln!("parsing style mix");
-            let styles: Vec<&str> = style_name.split('+').collect();
-
-            let mut style_names = Vec::new();
-            let mut style_portions = Vec::new();
-
-            for style in styles {
-                if let Some((name, portion)) = style.split_once('.') {
-                    if let Ok(portion) = portion.parse::<f32>() {
-                        if !self.styles.contains_key(name) {
-                            return Err(
-                                format!("Voice '{}' not found in available voices", name).into()
-                            );
-                        }
-                        style_names.push(name);
-                        style_portions.push(portion * 0.1);
-                    }
-                }
-            }
+            let parts = parse_style_mix(style_name)?;
+            self.blend_styles(&parts, tokens_len)
+        }
+    }
 
-            if style_names.is_empty() {
-                return Err(format!("Invalid voice mix format '{}'. Use format: voice1.weight+voice2.weight (e.g., jf_alpha.4+am_echo.6)", style_name).into());
+    /// Weighted sum of named voices for one token length
+    pub fn blend_styles(
+        &self,
+        parts: &[(String, f32)],
+        tokens_len: usize,
+    ) -> Result<Vec<Vec<f32>>, Box<dyn std::error::Error>> {
+        if parts.is_empty() {
+            return Err("Voice mix has no voices".into());
+        }
+        for (name, _) in parts {
+            if !self.styles.contains(name) {
+                return Err(format!("Voice '{}' not found in available voices", name).into());
             }
+        }
 
-            eprintln!("styles: {:?}, portions: {:?}", style_names, style_portions);
+        eprintln!("styles/portions: {:?}", parts);
 
-            let mut blended_style = vec![vec![0.0; 256]; 1];
+        let mut blended_style = vec![vec![0.0; 256]; 1];
 
-            for (name, portion) in style_names.iter().zip(style_portions.iter()) {
-                if let Some(style) = self.styles.get(*name) {
-                    let style_slice = &style[tokens_len][0];
-                    for j in 0..256 {
-                        blended_style[0][j] += style_slice[j] * portion;
-                    }
+        for (name, portion) in parts {
+            if let Some(style) = self.styles.get(name)? {
+                let style_slice = &style[tokens_len];
+                for j in 0..256 {
+                    blended_style[0][j] += style_slice[j] * portion;
                 }
             }
-            Ok(blended_style)
         }
+        Ok(blended_style)
     }
 
-    fn load_voices(voices_path: &str) -> HashMap<String, Vec<[[f32; 256]; 1]>> {
-        let mut npz = NpzReader::new(File::open(voices_path).unwrap()).unwrap();
-        let mut map = HashMap::new();
-
-        for voice in npz.names().unwrap() {
-            let voice_data: Result<Array3<f32>, _> = npz.by_name(&voice);
-            let voice_data = voice_data.unwrap();
-            let mut tensor = vec![[[0.0; 256]; 1]; 511];
-            for (i, inner_value) in voice_data.outer_iter().enumerate() {
-                for (j, inner_inner_value) in inner_value.outer_iter().enumerate() {
-                    for (k, number) in inner_inner_value.iter().enumerate() {
-                        tensor[i][j][k] = *number;
-                    }
-                }
-            }
-            map.insert(voice, tensor);
+    /// Style vector for one token length from any style specification
+    pub fn style_for_spec(
+        &self,
+        spec: &StyleSpec,
+        tokens_len: usize,
+    ) -> Result<Vec<Vec<f32>>, Box<dyn std::error::Error>> {
+        match spec {
+            StyleSpec::Name(name) => self.mix_styles(name, tokens_len),
+            StyleSpec::Mix(parts) => self.blend_styles(parts, tokens_len),
+            StyleSpec::Vector(values) => style_vector_row(values, tokens_len),
         }
-
-        let sorted_voices = {
-            let mut voices = map.keys().collect::<Vec<_>>();
-            voices.sort();
-            voices
-        };
-
-        println!("voice styles loaded: {:?}", sorted_voices);
-        map
     }
 
     // Method to properly clean up resources before application exit
@@ -1374,3 +1748,49 @@ impl TTSKoko {
         // reduce the likelihood of the mutex error.
     }
 }
+
+#[cfg(test)]
+mod tests {
+    use super::{parse_style_mix, style_vector_row};
+
+    #[test]
+    fn parses_float_weight_mixes() {
+        let parts = parse_style_mix("af_sky:0.37+am_echo:0.5+bf_emma:0.13").unwrap();
+        assert_eq!(
+            parts,
+            vec![
+                ("af_sky".to_string(), 0.37),
+                ("am_echo".to_string(), 0.5),
+                ("bf_emma".to_string(), 0.13),
+            ]
+        );
+    }
+
+    #[test]
+    fn parses_tenths_mixes() {
+        let parts = parse_style_mix("jf_alpha.4+am_echo.6").unwrap();
+        assert_eq!(parts[0].0, "jf_alpha");
+        assert!((parts[0].1 - 0.4).abs() < 1e-6);
+        assert!((parts[1].1 - 0.6).abs() < 1e-6);
+    }
+
+    #[test]
+    fn rejects_malformed_mixes() {
+        assert!(parse_style_mix("af_sky+am_echo:0.5").is_err());
+        assert!(parse_style_mix("af_sky:abc").is_err());
+        assert!(parse_style_mix(":0.5").is_err());
+    }
+
+    #[test]
+    fn style_vector_rows_by_token_length() {
+        let single = vec![1.0; 256];
+        assert_eq!(style_vector_row(&single, 42).unwrap(), vec![single.clone()]);
+
+        let table: Vec<f32> = (0..3).flat_map(|row| vec![row as f32; 256]).collect();
+        assert_eq!(style_vector_row(&table, 1).unwrap()[0][0], 1.0);
+        // Longer inputs use the last row
+        assert_eq!(style_vector_row(&table, 100).unwrap()[0][0], 2.0);
+
+        assert!(style_vector_row(&[0.0; 100], 1).is_err());
+    }
+}
@@ -5,3 +5,4 @@ pub mod phonemizer;
 pub mod segmentation;
 pub mod tokenize;
 pub mod vocab;
+pub mod voices;
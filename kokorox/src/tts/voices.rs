@@ -0,0 +1,371 @@
+//! Lazily loaded voice styles.
+//!
+//! Opening a voices NPZ only reads its zip directory. A voice is decoded the
+//! first time it is used and kept in a bounded LRU cache, so packs with
+//! hundreds of mixed voices start as fast as the stock pack and only pay
+//! memory for the voices that are actually spoken.
+//!
+//! Low-rank packs (`*.lrvoices.npz`, written by voice-pca's lowrank_pack.py)
+//! store voice i as `mean + coefficients[i] @ basis`. Only the shared basis
+//! and the small coefficient matrix are kept in memory; a voice is expanded
+//! to its style rows when it is first used, like an NPZ voice.
+
+use std::collections::{HashMap, HashSet, VecDeque};
+use std::error::Error;
+use std::fs::File;
+use std::sync::Arc;
+
+use ndarray::{Array, Array1, Array2, Array3, Dimension};
+use ndarray_npy::NpzReader;
+use parking_lot::Mutex;
+
+/// Style rows for one voice, indexed by token length
+pub type StyleTable = Arc<Vec<[f32; 256]>>;
+
+/// Number of decoded voices kept in memory by default
+pub const DEFAULT_STYLE_CACHE_SIZE: usize = 128;
+
+/// Voice tables have at least this many rows (one per token count up to the
+/// 510-token limit); shorter tables are zero-padded like before.
+const MIN_STYLE_ROWS: usize = 511;
+
+/// `format` field in the header of a low-rank pack
+const LOWRANK_FORMAT: &str = "kokoro-lowrank-voices";
+
+/// Newest low-rank pack format this reader understands
+const LOWRANK_VERSION: u64 = 1;
+
+/// Arrays every low-rank pack contains
+const LOWRANK_MEMBERS: [&str; 5] = ["header", "names", "mean", "basis", "coefficients"];
+
+/// Small LRU cache of decoded voices; the most recently used voice is last
+struct StyleCache {
+    capacity: usize,
+    entries: VecDeque<(String, StyleTable)>,
+}
+
+impl StyleCache {
+    fn get(&mut self, name: &str) -> Option<StyleTable> {
+        let pos = self.entries.iter().position(|(n, _)| n == name)?;
+        let entry = self.entries.remove(pos)?;
+        let table = entry.1.clone();
+        self.entries.push_back(entry);
+        Some(table)
+    }
+
+    fn insert(&mut self, name: &str, table: StyleTable) {
+        if self.capacity == 0 {
+            return;
+        }
+        // Two threads may decode the same voice at once; keep one entry
+        self.entries.retain(|(n, _)| n != name);
+        while self.entries.len() >= self.capacity {
+            self.entries.pop_front();
+        }
+        self.entries.push_back((name.to_string(), table));
+    }
+}
+
+/// Voices of a low-rank pack: voice i is `mean + coefficients[i] @ basis`
+struct LowRankVoices {
+    /// Rows per voice
+    rows: usize,
+    /// (rows * 256,)
+    mean: Array1<f32>,
+    /// (rank, rows * 256)
+    basis: Array2<f32>,
+    /// (voices, rank)
+    coefficients: Array2<f32>,
+    position: HashMap<String, usize>,
+}
+
+impl LowRankVoices {
+    fn read(reader: &mut NpzReader<File>) -> Result<Self, Box<dyn Error>> {
+        let header: Array1<u8> = reader.by_name("header")?;
+        let header: serde_json::Value = serde_json::from_slice(&header.to_vec())?;
+        if header["format"] != LOWRANK_FORMAT {
+            return Err("not a low-rank voice pack".into());
+        }
+        let version = header["version"].as_u64().unwrap_or(0);
+        if version > LOWRANK_VERSION {
+            return Err(format!(
+                "low-rank pack format v{} is newer than this reader (up to v{})",
+                version, LOWRANK_VERSION
+            )
+            .into());
+        }
+        let shape: Vec<u64> = serde_json::from_value(header["shape"].clone())?;
+        if shape.len() != 3 || shape[1] != 1 || shape[2] != 256 {
+            return Err(format!("Voice has shape {:?}, expected (rows, 1, 256)", shape).into());
+        }
+        let rows = shape[0] as usize;
+
+        let names: Array1<u8> = reader.by_name("names")?;
+        let names = String::from_utf8(names.to_vec())?;
+        let position: HashMap<String, usize> = names
+            .split('\n')
+            .filter(|name| !name.is_empty())
+            .enumerate()
+            .map(|(i, name)| (name.to_string(), i))
+            .collect();
+
+        let float16 = match header["dtype"].as_str() {
+            Some("float32") => false,
+            Some("float16") => true,
+            other => return Err(format!("unsupported low-rank dtype {:?}", other).into()),
+        };
+        let mean: Array1<f32> = read_floats(reader, "mean", float16)?;
+        let basis: Array2<f32> = read_floats(reader, "basis", float16)?;
+        let coefficients: Array2<f32> = reader.by_name("coefficients")?;
+
+        if mean.len() != rows * 256
+            || basis.ncols() != rows * 256
+            || coefficients.dim() != (position.len(), basis.nrows())
+        {
+            return Err(format!(
+                "low-rank arrays do not match: mean {:?}, basis {:?}, coefficients {:?} for {} voices",
+                mean.dim(),
+                basis.dim(),
+                coefficients.dim(),
+                position.len()
+            )
+            .into());
+        }
+
+        Ok(LowRankVoices {
+            rows,
+            mean,
+            basis,
+            coefficients,
+            position,
+        })
+    }
+
+    /// Expand one voice to a (rows, 1, 256) array
+    fn decode(&self, name: &str) -> Result<Array3<f32>, Box<dyn Error>> {
+        let i = self.position[name];
+        let flat = self.basis.t().dot(&self.coefficients.row(i)) + &self.mean;
+        Ok(flat.into_shape_with_order((self.rows, 1, 256))?)
+    }
+}
+
+/// Read a float array stored as float32, or as the uint16 bits of float16
+fn read_floats<D: Dimension>(
+    reader: &mut NpzReader<File>,
+    name: &str,
+    float16: bool,
+) -> Result<Array<f32, D>, Box<dyn Error>> {
+    if float16 {
+        let bits: Array<u16, D> = reader.by_name(name)?;
+        Ok(bits.mapv(f16_to_f32))
+    } else {
+        Ok(reader.by_name(name)?)
+    }
+}
+
+/// Widen IEEE 754 half-precision bits to f32 (exact)
+fn f16_to_f32(bits: u16) -> f32 {
+    let sign = ((bits >> 15) as u32) << 31;
+    let exponent = ((bits >> 10) & 0x1f) as u32;
+    let fraction = (bits & 0x3ff) as u32;
+    let magnitude = match exponent {
+        // Zero and subnormals: fraction * 2^-24
+        0 => (fraction as f32) * f32::from_bits(0x3380_0000),
+        // Infinity and NaN
+        0x1f => f32::from_bits(0x7f80_0000 | (fraction << 13)),
+        _ => f32::from_bits(((exponent + 112) << 23) | (fraction << 13)),
+    };
+    f32::from_bits(sign | magnitude.to_bits())
+}
+
+/// Where a store's voices come from
+enum VoiceSource {
+    /// One (rows, 1, 256) array per voice
+    Npz(Mutex<NpzReader<File>>),
+    /// Low-rank pack, held in memory in compressed form
+    LowRank(LowRankVoices),
+}
+
+/// Voice styles of one NPZ voices file or low-rank pack, decoded on demand
+pub struct VoiceStore {
+    path: String,
+    /// Voice names in sorted order
+    names: Vec<String>,
+    index: HashSet<String>,
+    source: VoiceSource,
+    cache: Mutex<StyleCache>,
+}
+
+impl VoiceStore {
+    /// Open a voices NPZ, reading only its directory, or a low-rank pack,
+    /// reading its basis and coefficients.
+    /// At most `cache_size` decoded voices are kept in memory.
+    pub fn open(path: &str, cache_size: usize) -> Result<Self, Box<dyn Error>> {
+        let mut reader = NpzReader::new(File::open(path)?)?;
+        let members = reader.names()?;
+        let lowrank = LOWRANK_MEMBERS
+            .iter()
+            .all(|member| members.iter().any(|name| name == member));
+
+        let (mut names, source) = if lowrank {
+            let voices =
+                LowRankVoices::read(&mut reader).map_err(|e| format!("{} in {}", e, path))?;
+            let names = voices.position.keys().cloned().collect();
+            (names, VoiceSource::LowRank(voices))
+        } else {
+            (members, VoiceSource::Npz(Mutex::new(reader)))
+        };
+        names.sort();
+        let index = names.iter().cloned().collect();
+
+        Ok(VoiceStore {
+            path: path.to_string(),
+            names,
+            index,
+            source,
+            cache: Mutex::new(StyleCache {
+                capacity: cache_size,
+                entries: VecDeque::new(),
+            }),
+        })
+    }
+
+    /// All voice names, sorted
+    pub fn names(&self) -> &[String] {
+        &self.names
+    }
+
+    pub fn len(&self) -> usize {
+        self.names.len()
+    }
+
+    pub fn is_empty(&self) -> bool {
+        self.names.is_empty()
+    }
+
+    pub fn contains(&self, name: &str) -> bool {
+        self.index.contains(name)
+    }
+
+    /// Style table for a voice, decoding it on first use.
+    /// Returns Ok(None) for voices that are not in the file.
+    pub fn get(&self, name: &str) -> Result<Option<StyleTable>, Box<dyn Error>> {
+        if !self.contains(name) {
+            return Ok(None);
+        }
+        if let Some(table) = self.cache.lock().get(name) {
+            return Ok(Some(table));
+        }
+
+        let data: Array3<f32> = match &self.source {
+            VoiceSource::Npz(reader) => reader.lock().by_name(name)?,
+            VoiceSource::LowRank(voices) => voices.decode(name)?,
+        };
+        let table = Arc::new(style_rows(&data).map_err(|e| format!("{} in {}", e, self.path))?);
+        self.cache.lock().insert(name, table.clone());
+        Ok(Some(table))
+    }
+}
+
+/// Convert a (rows, 1, 256) voice array into style rows
+fn style_rows(data: &Array3<f32>) -> Result<Vec<[f32; 256]>, String> {
+    let shape = data.shape();
+    if shape[1] != 1 || shape[2] != 256 {
+        return Err(format!("Voice has shape {:?}, expected (rows, 1, 256)", shape));
+    }
+
+    let mut rows = vec![[0.0; 256]; shape[0].max(MIN_STYLE_ROWS)];
+    for (row, values) in rows.iter_mut().zip(data.outer_iter()) {
+        for (dst, src) in row.iter_mut().zip(values.iter()) {
+            *dst = *src;
+        }
+    }
+    Ok(rows)
+}
+
+#[cfg(test)]
+mod tests {
+    use super::{f16_to_f32, style_rows, StyleCache, VoiceStore, MIN_STYLE_ROWS};
+    use ndarray::{Array1, Array2, Array3};
+    use ndarray_npy::NpzWriter;
+    use std::collections::VecDeque;
+    use std::fs::File;
+    use std::sync::Arc;
+
+    #[test]
+    fn pads_style_rows() {
+        let data = Array3::from_shape_fn((510, 1, 256), |(i, _, k)| (i * 256 + k) as f32);
+        let rows = style_rows(&data).unwrap();
+        assert_eq!(rows.len(), MIN_STYLE_ROWS);
+        assert_eq!(rows[2][3], (2 * 256 + 3) as f32);
+        assert_eq!(rows[510], [0.0; 256]);
+
+        assert!(style_rows(&Array3::zeros((510, 2, 256))).is_err());
+    }
+
+    #[test]
+    fn widens_float16() {
+        assert_eq!(f16_to_f32(0x0000), 0.0);
+        assert_eq!(f16_to_f32(0x3c00), 1.0);
+        assert_eq!(f16_to_f32(0xc000), -2.0);
+        assert_eq!(f16_to_f32(0x3555), 0.333_251_95);
+        assert_eq!(f16_to_f32(0x7bff), 65504.0);
+        assert_eq!(f16_to_f32(0x0001), 2f32.powi(-24));
+        assert_eq!(f16_to_f32(0xfc00), f32::NEG_INFINITY);
+        assert!(f16_to_f32(0x7e00).is_nan());
+    }
+
+    #[test]
+    fn decodes_low_rank_pack() {
+        // Two voices of 4 rows: voice i = mean + coefficients[i] @ basis
+        let width = 4 * 256;
+        let mean = Array1::from_shape_fn(width, |j| j as f32);
+        let basis = Array2::from_shape_fn((2, width), |(r, j)| ((r + 1) * (j % 7)) as f32);
+        let coefficients = Array2::from_shape_vec((2, 2), vec![1.0f32, 0.0, 0.5, -2.0]).unwrap();
+        let header = r#"{"format": "kokoro-lowrank-voices", "version": 1, "num_voices": 2,
+            "rank": 2, "shape": [4, 1, 256], "dtype": "float32", "error": {}}"#;
+
+        let path =
+            std::env::temp_dir().join(format!("lowrank-{}.lrvoices.npz", std::process::id()));
+        let mut npz = NpzWriter::new(File::create(&path).unwrap());
+        npz.add_array("header", &Array1::from(header.as_bytes().to_vec()))
+            .unwrap();
+        npz.add_array("names", &Array1::from(b"af_a\nam_b".to_vec()))
+            .unwrap();
+        npz.add_array("mean", &mean).unwrap();
+        npz.add_array("basis", &basis).unwrap();
+        npz.add_array("coefficients", &coefficients).unwrap();
+        npz.finish().unwrap();
+
+        let store = VoiceStore::open(path.to_str().unwrap(), 1).unwrap();
+        std::fs::remove_file(&path).unwrap();
+        assert_eq!(store.names(), ["af_a", "am_b"]);
+        assert!(store.get("missing").unwrap().is_none());
+
+        let table = store.get("am_b").unwrap().unwrap();
+        assert_eq!(table.len(), MIN_STYLE_ROWS);
+        for (row, k) in [(0, 0), (1, 3), (3, 255)] {
+            let j = row * 256 + k;
+            let expected = mean[j] + 0.5 * basis[[0, j]] - 2.0 * basis[[1, j]];
+            assert_eq!(table[row][k], expected);
+        }
+        assert_eq!(table[4], [0.0; 256]);
+    }
+
+    #[test]
+    fn cache_evicts_least_recently_used() {
+        let mut cache = StyleCache {
+            capacity: 2,
+            entries: VecDeque::new(),
+        };
+        let table = Arc::new(vec![[0.0; 256]]);
+        cache.insert("a", table.clone());
+        cache.insert("b", table.clone());
+        assert!(cache.get("a").is_some());
+        cache.insert("c", table);
+
+        assert!(cache.get("b").is_none());
+        assert!(cache.get("a").is_some());
+        assert!(cache.get("c").is_some());
+    }
+}
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Content-Addressed Audio Cache for Kokoro Voice PCA
+
+Synthesized WAVs are stored under a hash of everything the model sees for
+them, so re-running generate_audio.py only synthesizes mixes whose audio
+would actually change. The key covers:
+- the model file's SHA-256
+- the style rows koko reads (style[len(tokens)] for each token chunk)
+- the token IDs of each chunk (or the text and language when unknown)
+- speed and mono output
+
+Cache Layout:
+- <cache_dir>/<key[:2]>/<key>.wav
+- <cache_dir>/sources.json   model file digests by path, size and mtime
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+from voice_pack import VoicePack, source_sha256
+
+
+DEFAULT_AUDIO_CACHE_DIR = Path(__file__).parent.parent / "data" / "cache" / "audio"
+
+AUDIO_CACHE_VERSION = 1
+
+# Rows of a Kokoro voice (one per token count). koko zero-pads its voice
+# tables past the last row, so longer chunks read a zero style row.
+VOICE_ROWS = 510
+STYLE_DIM = 256
+
+
+def parse_style(style: str) -> dict[str, float]:
+    """
+    Parse a koko style into {voice: weight}.
+
+    A plain voice name has weight 1; mixes are "name:weight+name:weight".
+    """
+    if "+" not in style and ":" not in style:
+        return {style: 1.0}
+    weights = {}
+    for part in style.split("+"):
+        name, sep, weight = part.partition(":")
+        if not sep:
+            raise ValueError(f"Mix part {part!r} in {style!r} has no weight")
+        weights[name] = weights.get(name, 0.0) + float(weight)
+    return weights
+
+
+def style_rows(pack: VoicePack, style: str, rows: Optional[list[int]] = None) -> np.ndarray:
+    """
+    Return the (len(rows), 256) style rows koko blends for a style.
+
+    Only the requested rows are read from the pack, so this stays cheap for
+    memory-mapped packs. rows=None returns all rows; rows past the end of
+    the voices raise IndexError (see koko_style_rows()).
+    """
+    weights = parse_style(style)
+    missing = [name for name in weights if name not in pack]
+    if missing:
+        raise KeyError(f"Voices not found in {pack.source}: {', '.join(missing)}")
+
+    num_rows = pack.data.shape[1]
+    index = slice(None) if rows is None else list(rows)
+    out = None
+    for name, weight in weights.items():
+        part = pack[name].reshape(num_rows, -1)[index].astype(np.float32) * np.float32(weight)
+        out = part if out is None else out + part
+    return out
+
+
+def koko_style_rows(
+    read_style: Callable[[str, Optional[list[int]]], np.ndarray],
+    style: str,
+    rows: Optional[list[int]],
+) -> np.ndarray:
+    """
+    The (len(rows), 256) style rows koko uses for a style, padding included.
+
+    read_style(style, rows) reads rows that exist in the voices (all rows for
+    rows=None); rows from VOICE_ROWS on are zero, as in koko's padded tables.
+    """
+    if rows is None:
+        return read_style(style, None)
+    out = np.zeros((len(rows), STYLE_DIM), dtype=np.float32)
+    inside = [i for i, row in enumerate(rows) if row < VOICE_ROWS]
+    if inside:
+        out[inside] = read_style(style, [rows[i] for i in inside])
+    return out
+
+
+def audio_cache_key(
+    model_sha256: str,
+    style: np.ndarray,
+    tokens: Optional[list[list[int]]] = None,
+    text: Optional[str] = None,
+    language: Optional[str] = None,
+    speed: float = 1.0,
+    mono: bool = False,
+) -> str:
+    """Hex SHA-256 key of one synthesis; pass tokens, or text and language."""
+    digest = hashlib.sha256()
+    header = {
+        "version": AUDIO_CACHE_VERSION,
+        "model": model_sha256,
+        "tokens": tokens,
+        "text": None if tokens is not None else text,
+        "language": None if tokens is not None else language,
+        "speed": float(np.float32(speed)),
+        "mono": bool(mono),
+    }
+    digest.update(json.dumps(header, sort_keys=True).encode())
+    digest.update(np.ascontiguousarray(style, dtype="<f4").tobytes())
+    return digest.hexdigest()
+
+
+class AudioCache:
+    """Directory of synthesized WAVs addressed by audio_cache_key()."""
+
+    def __init__(self, cache_dir: Path = DEFAULT_AUDIO_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+
+    def path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.wav"
+
+    def model_sha256(self, model_path: Path) -> str:
+        """SHA-256 of a model file, only rehashed when its size or mtime changes."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        return source_sha256(Path(model_path), self.cache_dir)
+
+    def __contains__(self, key: str) -> bool:
+        return self.path(key).exists()
+
+    def fetch(self, key: str, dest: Path) -> bool:
+        """Copy the cached WAV for key to dest; False if it is not cached."""
+        src = self.path(key)
+        if not src.exists():
+            return False
+        _copy_atomic(src, Path(dest))
+        return True
+
+    def store(self, key: str, src: Path) -> None:
+        """Add a synthesized WAV to the cache (a copy, so later rewrites of src are safe)."""
+        dest = self.path(key)
+        if not dest.exists():
+            _copy_atomic(Path(src), dest)
+
+
+def _copy_atomic(src: Path, dest: Path) -> None:
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+    except BaseException:
+        os.unlink(tmp)
+        raise
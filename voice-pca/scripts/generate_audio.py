@@ -13,14 +13,53 @@ Usage:
 
 import argparse
 import json
-import subprocess
 import sys
+import time
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Optional
+from functools import partial
+from typing import Callable, Optional
 
 import numpy as np
 
+from audio_cache import (
+    DEFAULT_AUDIO_CACHE_DIR,
+    AudioCache,
+    audio_cache_key,
+    koko_style_rows,
+    style_rows,
+)
+from koko_worker import (
+    KokoWorkerPool,
+    available_cpus,
+    default_model_path,
+    phonemize_texts,
+    run_koko_batch,
+    split_cpus,
+)
+from mix_store import (
+    MixStore,
+    is_mix_manifest,
+    load_mix_manifest,
+    load_mix_metadata,
+    shard_parts,
+)
+from npz_io import save_npz
+from voice_pack import npz_member_names, open_voice_pack
+
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+# Output sample rate of the Kokoro model
+SAMPLE_RATE = 24000
+
+# Phonemes of the test sentences, shared by all runs of the same koko build
+PHONEME_CACHE_PATH = Path(__file__).parent.parent / "data" / "cache" / "phonemes.json"
+
 
 # Test sentences for different languages
 TEST_SENTENCES = {
@@ -93,23 +132,33 @@ def create_custom_voices_npz(
     mixed_voices_path: Path,
     original_voices_path: Path,
     output_path: Path,
+    parts: Optional[list[int]] = None,
 ) -> Path:
     """
     Create a combined NPZ file with original + mixed voices.
 
-    The koko CLI loads voices from an NPZ file, so we need to combine
-    our mixed voices with the original voices into a single file.
+    Only used with --combined-pack, where koko looks mixes up by name in a
+    single voices file. If mixed_voices_path is a manifest, parts limits it
+    to those part indices.
     """
     print(f"Creating combined voices NPZ at: {output_path}")
 
-    # Load original voices
-    original = np.load(original_voices_path)
-    original_voices = {name: original[name] for name in original.files}
+    # Load original voices (memory-mapped from the voice pack cache)
+    original = open_voice_pack(original_voices_path)
+    original_voices = {name: original[name] for name in original.names}
     print(f"  Original voices: {len(original_voices)}")
 
-    # Load mixed voices
-    mixed = np.load(mixed_voices_path)
-    mixed_voices = {name: mixed[name] for name in mixed.files}
+    # Load mixed voices (materialized NPZ or weights-only virtual mixes)
+    store = MixStore(
+        mixed_voices_path, base_path=original_voices_path, cache_bytes=0, parts=parts
+    )
+    if store.stored_rows is not None:
+        raise ValueError(
+            f"{mixed_voices_path} stores only style rows {store.stored_rows}; "
+            "koko needs full voices (regenerate without --rows)"
+        )
+    ids = store.ids
+    mixed_voices = dict(zip(ids, store.get_many(ids)))
     print(f"  Mixed voices: {len(mixed_voices)}")
 
     # Combine
@@ -117,97 +166,388 @@ def create_custom_voices_npz(
     print(f"  Total voices: {len(combined)}")
 
     # Save combined NPZ
-    np.savez_compressed(output_path, **combined)
+    save_npz(output_path, combined)
     print(f"  Saved to: {output_path}")
 
     return output_path
 
 
-def generate_audio_for_voice(
+def mix_style(weights: dict[str, float]) -> str:
+    """koko style string for a float-weighted mix, e.g. "af_sky:0.37+am_echo:0.63"."""
+    return "+".join(f"{voice}:{weight:.9g}" for voice, weight in weights.items() if weight)
+
+
+def weight_styles(
+    mixes: list[dict],
+    mixed_voices_path: Path,
+    original_voices_path: Path,
+    parts: Optional[list[int]] = None,
+) -> dict[str, str]:
+    """
+    Map mix ID -> koko mix style over the original voices.
+
+    koko blends the base voices itself, so no combined pack is needed.
+    Virtual mixes use their exact weights; materialized mixes use the
+    metadata components (weights rounded to 4 decimals). Mixes with unknown
+    weights or voices missing from the original pack are left out.
+    """
+    store = None
+    if mixed_voices_path.exists():
+        store = MixStore(
+            mixed_voices_path, base_path=original_voices_path, cache_bytes=0, parts=parts
+        )
+    available = set(npz_member_names(original_voices_path))
+
+    styles = {}
+    for mix in mixes:
+        weights = None
+        if store is not None and mix["id"] in store:
+            weights = store.mix_weights(mix["id"])
+        if weights is None and mix.get("components"):
+            weights = {c["voice"]: c["weight"] for c in mix["components"]}
+        if weights and set(weights) <= available and mix_style(weights):
+            styles[mix["id"]] = mix_style(weights)
+    return styles
+
+
+def build_job(
     voice_id: str,
     metadata: dict,
     output_dir: Path,
-    voices_path: Path,
-    koko_binary: Path,
     sentence_index: int = 0,
+    style: Optional[str] = None,
 ) -> dict:
     """
-    Generate audio for a single mixed voice.
+    Build the koko worker/batch job that synthesizes one mixed voice.
+
+    style defaults to the voice ID, i.e. a voice stored in koko's pack.
+    """
+    # Determine language for test sentence
+    if metadata.get("type") == "intra_language":
+        language = metadata.get("language", "en-us")
+    else:
+        # For inter-language, use English as common ground
+        languages = metadata.get("languages", ["en-us"])
+        # Prefer English if available
+        language = "en-us" if "en-us" in languages else languages[0]
+
+    # For PCA analysis, we use English for all voices to ensure consistent
+    # comparison across the voice embedding space. This avoids issues with
+    # espeak-rs language support bugs and makes perceptual comparison fair.
+    #
+    # Known espeak-rs issues:
+    # - en-gb, pt-pt, zh don't work with espeak_SetVoiceByName
+    # - kokorox phonemizer maps cmn->zh internally but espeak-rs doesn't support "zh"
+    espeak_language = "en-us"
+
+    # Always use English test sentence for consistent voice comparison
+    test_sentence = get_test_sentence("en-us", sentence_index)
+
+    return {
+        "id": voice_id,
+        "text": test_sentence,
+        "style": style or voice_id,
+        "language": espeak_language,  # Use mapped language for espeak compatibility
+        "output": str(output_dir / f"{voice_id}.wav"),
+    }
+
+
+def check_job_result(job: dict, reply: Optional[dict]) -> dict:
+    """
+    Turn a koko result line (None if there was none) into a generation result.
 
-    Returns a result dict with status and paths.
+    koko's own timing is kept as synth_ms (its share of a multi-style job),
+    with the audio length and real-time factor derived from it.
     """
     result = {
-        "voice_id": voice_id,
+        "voice_id": job["id"],
         "status": "pending",
         "audio_path": None,
         "error": None,
     }
+    if reply is not None:
+        result["worker"] = reply.get("worker")
+        result["audio_seconds"] = reply.get("audio_seconds")
+        result["synth_ms"] = reply.get("elapsed_ms")
+        if reply.get("audio_seconds") and reply.get("elapsed_ms") is not None:
+            result["rtf"] = reply["elapsed_ms"] / 1000 / reply["audio_seconds"]
+    audio_path = Path(job["output"])
+
+    # Check that audio was actually written, not only that koko said so
+    if audio_path.exists() and audio_path.stat().st_size > 1000:
+        result["status"] = "success"
+        result["audio_path"] = str(audio_path)
+    elif reply is None:
+        result["status"] = "error"
+        result["error"] = "No result from koko"
+    elif reply.get("status") != "success":
+        result["status"] = "error"
+        result["error"] = (reply.get("error") or "Unknown error")[:500]
+    else:
+        result["status"] = "error"
+        result["error"] = "Audio file not created or too small"
+
+    return result
 
-    try:
-        # Determine language for test sentence
-        if metadata.get("type") == "intra_language":
-            language = metadata.get("language", "en-us")
-        else:
-            # For inter-language, use English as common ground
-            languages = metadata.get("languages", ["en-us"])
-            # Prefer English if available
-            language = "en-us" if "en-us" in languages else languages[0]
-
-        # For PCA analysis, we use English for all voices to ensure consistent
-        # comparison across the voice embedding space. This avoids issues with
-        # espeak-rs language support bugs and makes perceptual comparison fair.
-        #
-        # Known espeak-rs issues:
-        # - en-gb, pt-pt, zh don't work with espeak_SetVoiceByName
-        # - kokorox phonemizer maps cmn->zh internally but espeak-rs doesn't support "zh"
-        espeak_language = "en-us"
-
-        # Always use English test sentence for consistent voice comparison
-        test_sentence = get_test_sentence("en-us", sentence_index)
-
-        # Output path
-        audio_path = output_dir / f"{voice_id}.wav"
-
-        # Build koko command
-        cmd = [
-            str(koko_binary),
-            "--data", str(voices_path),
-            "--style", voice_id,
-            "--lan", espeak_language,  # Use mapped language for espeak compatibility
-            "--force-style",
-            "text",
-            test_sentence,
-            "--output", str(audio_path),
-        ]
 
-        # Run koko
-        proc = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=60,
+def group_jobs(jobs: list[dict], style_batch: int) -> list[dict]:
+    """
+    Merge jobs that speak the same text into multi-style jobs of up to style_batch styles.
+
+    koko phonemizes each multi-style job once and runs its styles in
+    batched forward passes. With style_batch <= 1 the jobs are returned as is.
+    """
+    if style_batch <= 1:
+        return jobs
+
+    by_text: dict[tuple[str, str, bool], list[dict]] = {}
+    for job in jobs:
+        by_text.setdefault((job["text"], job["language"], job.get("phonemes", False)), []).append(job)
+
+    grouped = []
+    for (text, language, _), same_text in by_text.items():
+        for i in range(0, len(same_text), style_batch):
+            group = same_text[i:i + style_batch]
+            grouped.append({
+                "id": group[0]["id"],
+                "text": text,
+                "language": language,
+                "phonemes": group[0].get("phonemes", False),
+                "styles": [job["style"] for job in group],
+                "outputs": [job["output"] for job in group],
+                "ids": [job["id"] for job in group],
+            })
+    return grouped
+
+
+def split_job(job: dict) -> list[dict]:
+    """Inverse of group_jobs for one job: the single-style jobs it covers."""
+    if not job.get("styles"):
+        return [job]
+    shared = {k: job[k] for k in ("text", "language", "phonemes") if k in job}
+    return [
+        {"id": id_, "style": style, "output": output, **shared}
+        for id_, style, output in zip(job["ids"], job["styles"], job["outputs"])
+    ]
+
+
+def mix_style_rows(store: MixStore, mix_id: str, rows: Optional[list[int]] = None) -> np.ndarray:
+    """The (len(rows), 256) style rows of a mix koko reads by name (all rows for None)."""
+    voice = store[mix_id]
+    voice = voice.reshape(voice.shape[0], -1)
+    return voice if rows is None else voice[rows]
+
+
+def job_cache_keys(
+    jobs: list[dict],
+    read_style: Callable[[str, Optional[list[int]]], np.ndarray],
+    model_sha256: str,
+    phonemized: dict[str, dict],
+) -> dict[str, str]:
+    """
+    Audio cache key of every job, from the style rows and tokens koko will use.
+
+    read_style(style, rows) returns the style rows koko reads for a job's
+    style (all rows for rows=None). Jobs whose text was phonemized are keyed
+    on their token IDs and only the style rows those token counts select
+    (koko phonemize includes the initial silence tokens, so len(chunk) is the
+    row synthesis reads; rows past the voice are koko's zero padding); others
+    on their text and the full style.
+    """
+    keys = {}
+    for job in jobs:
+        tokens = phonemized.get(job["text"], {}).get("tokens")
+        rows = [len(chunk) for chunk in tokens] if tokens is not None else None
+        keys[job["id"]] = audio_cache_key(
+            model_sha256,
+            koko_style_rows(read_style, job["style"], rows),
+            tokens=tokens,
+            text=job["text"],
+            language=job["language"],
+            speed=job.get("speed", 1.0),
+            mono=job.get("mono", False),
         )
+    return keys
 
-        # Check if audio was actually generated (koko may crash after saving due to mutex issue)
-        # The returncode may be non-zero due to cleanup crash, but audio is still valid
-        if audio_path.exists() and audio_path.stat().st_size > 1000:
-            result["status"] = "success"
-            result["audio_path"] = str(audio_path)
-        elif proc.returncode != 0:
-            result["status"] = "error"
-            result["error"] = proc.stderr[:500] if proc.stderr else "Unknown error"
-        else:
-            result["status"] = "error"
-            result["error"] = "Audio file not created or too small"
 
-    except subprocess.TimeoutExpired:
-        result["status"] = "timeout"
-        result["error"] = "Generation timed out after 60s"
+def use_phonemes(jobs: list[dict], phonemes: dict[str, list[str]]) -> int:
+    """
+    Switch jobs whose text has known phoneme chunks to koko's phoneme input mode.
+
+    The chunks are sent one per line, which koko keeps as its chunks.
+    Returns the number of jobs switched; the others keep their plain text.
+    """
+    switched = 0
+    for job in jobs:
+        if job["text"] in phonemes and not job.get("phonemes"):
+            job["text"] = "\n".join(phonemes[job["text"]])
+            job["phonemes"] = True
+            switched += 1
+    return switched
+
+
+def generate_audio_for_job(
+    job: dict,
+    pool: KokoWorkerPool,
+    timeout: float = 60,
+    submitted: Optional[float] = None,
+) -> list[dict]:
+    """
+    Run one (possibly multi-style) job on a persistent koko worker.
+
+    Returns one result dict with status and paths per voice. wall_ms is the
+    round trip of the whole job and queue_wait_ms the time between
+    submitted (a time.perf_counter() value) and the job being sent.
+    """
+    start = time.perf_counter()
+    timing = {"queue_wait_ms": (start - submitted) * 1000 if submitted is not None else None}
+    voice_jobs = split_job(job)
+    try:
+        replies = pool.run(job, timeout=timeout)
+        timing["wall_ms"] = (time.perf_counter() - start) * 1000
+        return [{**check_job_result(j, replies.get(j["id"])), **timing} for j in voice_jobs]
+    except TimeoutError:
+        error, status = f"Generation timed out after {timeout:.0f}s", "timeout"
     except Exception as e:
-        result["status"] = "error"
-        result["error"] = str(e)
+        error, status = str(e), "error"
 
-    return result
+    timing["wall_ms"] = (time.perf_counter() - start) * 1000
+    return [
+        {"voice_id": j["id"], "status": status, "audio_path": None, "error": error, **timing}
+        for j in voice_jobs
+    ]
+
+
+def generate_audio_batch(
+    jobs: list[dict],
+    output_dir: Path,
+    voices_path: Path,
+    koko_binary: Path,
+    processes: int = 1,
+    style_batch: int = 8,
+    model_path: Optional[Path] = None,
+    intra_threads: Optional[int] = None,
+    cpu_sets: Optional[list[list[int]]] = None,
+) -> list[dict]:
+    """
+    Run all jobs with `koko batch`, one invocation per process.
+
+    Each invocation loads the model once and works through its share of the
+    jobs; there is no per-job timeout. Returns one result dict per voice;
+    "worker" is the index of the invocation that synthesized it.
+    """
+    chunks = [jobs[i::processes] for i in range(processes) if jobs[i::processes]]
+    log_dir = output_dir / "logs"
+    log_dir.mkdir(parents=True, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=len(chunks) or 1) as executor:
+        futures = [
+            executor.submit(
+                run_koko_batch,
+                koko_binary,
+                voices_path,
+                chunk,
+                log_dir / f"koko_batch_{i}.jsonl",
+                log_path=log_dir / f"koko_batch_{i}.log",
+                style_batch=style_batch,
+                model_path=model_path,
+                intra_threads=intra_threads,
+                cpus=cpu_sets[i % len(cpu_sets)] if cpu_sets else None,
+            )
+            for i, chunk in enumerate(chunks)
+        ]
+        replies = {}
+        for i, future in enumerate(futures):
+            for id_, reply in future.result().items():
+                replies[id_] = {**reply, "worker": i}
+
+    return [
+        check_job_result(j, replies.get(j["id"]))
+        for job in jobs
+        for j in split_job(job)
+    ]
+
+
+def thread_budget(
+    workers: int,
+    threads_per_worker: Optional[int] = None,
+    pin_cpus: bool = False,
+) -> tuple[Optional[int], Optional[list[list[int]]]]:
+    """
+    Split the available cores across koko processes.
+
+    Returns (ONNX Runtime intra-op threads per worker, CPU set per worker).
+    threads_per_worker=None gives each worker an equal share of the cores,
+    0 keeps ONNX Runtime's default of one thread per core. CPU sets are
+    only returned with pin_cpus.
+    """
+    cpus = available_cpus()
+    if threads_per_worker is None:
+        threads_per_worker = max(1, len(cpus) // workers)
+    cpu_sets = split_cpus(cpus, workers) if pin_cpus else None
+    return threads_per_worker or None, cpu_sets
+
+
+def peak_child_rss_mb() -> Optional[float]:
+    """Peak resident set size of the largest finished child process (koko), in MB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles(values: list[float]) -> Optional[dict[str, float]]:
+    """p50/p95/p99, mean and max of a list of timings, None if it is empty."""
+    if not values:
+        return None
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "mean": float(np.mean(values)),
+        "max": float(np.max(values)),
+    }
+
+
+def summarize_metrics(results: list[dict], wall_seconds: float) -> dict:
+    """
+    Run-level throughput and latency of the voices synthesized in this run.
+
+    Cached voices are left out, and failed or timed-out jobs are left out of
+    the latency stats. Latencies are per job round trip, so with
+    --style-batch every voice of a job reports the same wall_ms.
+    """
+    synthesized = [r for r in results if not r.get("cached")]
+    succeeded = [r for r in synthesized if r["status"] == "success"]
+    audio_seconds = sum(r.get("audio_seconds") or 0.0 for r in succeeded)
+    synth_seconds = sum(r.get("synth_ms") or 0.0 for r in succeeded) / 1000
+
+    return {
+        "wall_seconds": wall_seconds,
+        "voices_synthesized": len(succeeded),
+        "audio_seconds": audio_seconds,
+        "samples_per_second": audio_seconds * SAMPLE_RATE / wall_seconds if wall_seconds > 0 else None,
+        "rtf": synth_seconds / audio_seconds if audio_seconds > 0 else None,
+        "wall_ms": percentiles([r["wall_ms"] for r in succeeded if r.get("wall_ms") is not None]),
+        "synth_ms": percentiles([r["synth_ms"] for r in succeeded if r.get("synth_ms") is not None]),
+        "queue_wait_ms": percentiles(
+            [r["queue_wait_ms"] for r in succeeded if r.get("queue_wait_ms") is not None]
+        ),
+        "peak_child_rss_mb": peak_child_rss_mb(),
+    }
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse an "i/N" shard spec (0-based shard index i of N shards)."""
+    try:
+        shard, num_shards = (int(x) for x in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected i/N, got {value!r}")
+    if num_shards < 1 or not 0 <= shard < num_shards:
+        raise argparse.ArgumentTypeError(f"Shard index must be in [0, N), got {value!r}")
+    return shard, num_shards
 
 
 def main():
@@ -217,14 +557,14 @@ def main():
     parser.add_argument(
         "--mixed-voices",
         type=Path,
-        default=Path(__file__).parent.parent / "data" / "mixed" / "all_mixes.npz",
-        help="Path to mixed voices NPZ file",
+        default=Path(__file__).parent.parent / "data" / "mixed" / "all_mixes.manifest.json",
+        help="Path to mixed voices: NPZ, virtual mix (.mixw.npz) or manifest (.manifest.json)",
     )
     parser.add_argument(
         "--metadata",
         type=Path,
-        default=Path(__file__).parent.parent / "data" / "mixed" / "all_mixes_metadata.json",
-        help="Path to mixed voices metadata JSON",
+        default=Path(__file__).parent.parent / "data" / "mixed" / "all_mixes.manifest.json",
+        help="Path to mixed voices metadata JSON or mix manifest",
     )
     parser.add_argument(
         "--original-voices",
@@ -244,11 +584,66 @@ def main():
         default=None,
         help="Path to koko binary (auto-detected if not specified)",
     )
+    parser.add_argument(
+        "--model",
+        type=Path,
+        default=None,
+        help="ONNX model passed to koko (default: koko's downloaded model); "
+        "its hash is part of the audio cache key",
+    )
+    parser.add_argument(
+        "--audio-cache",
+        type=Path,
+        default=DEFAULT_AUDIO_CACHE_DIR,
+        help="Content-addressed cache of synthesized audio",
+    )
+    parser.add_argument(
+        "--no-audio-cache",
+        action="store_true",
+        help="Synthesize every voice even if identical audio is cached",
+    )
     parser.add_argument(
         "--workers",
         type=int,
         default=4,
-        help="Number of parallel workers",
+        help="Number of persistent koko worker processes",
+    )
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=None,
+        help="ONNX Runtime threads per koko process (default: available cores / "
+        "--workers; 0 = ONNX Runtime default of one per core)",
+    )
+    parser.add_argument(
+        "--pin-cpus",
+        action="store_true",
+        help="Pin each koko process to its own share of the cores (Linux only)",
+    )
+    parser.add_argument(
+        "--combined-pack",
+        action="store_true",
+        help="Write a combined NPZ of original + mixed voices for koko instead of "
+        "sending each mix as float weights over the original voices",
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Hand all jobs to `koko batch` (one invocation per worker) "
+        "instead of persistent workers; no per-job timeout",
+    )
+    parser.add_argument(
+        "--style-batch",
+        type=int,
+        default=1,
+        help="Voices per koko job: >1 phonemizes the test sentence once and, for "
+        "models exported with a batch axis, batches the styles into shared forward passes",
+    )
+    parser.add_argument(
+        "--no-phonemize-once",
+        action="store_true",
+        help="Send plain text to koko so every job is phonemized again, instead "
+        "of phonemizing each test sentence once (cached in data/cache/phonemes.json)",
     )
     parser.add_argument(
         "--sentence-index",
@@ -268,6 +663,13 @@ def main():
         default=None,
         help="Only process voices matching this prefix",
     )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        help="Only synthesize shard i of N (e.g. 2/8); needs a mix manifest, "
+        "see voice_mixer.py --shards",
+    )
 
     args = parser.parse_args()
 
@@ -298,21 +700,22 @@ def main():
     # Create output directory
     args.output.mkdir(parents=True, exist_ok=True)
 
-    # Create combined voices file
-    combined_voices_path = args.output.parent / "voices" / "combined_voices.npz"
-    combined_voices_path.parent.mkdir(parents=True, exist_ok=True)
-    if not combined_voices_path.exists() or args.mixed_voices.stat().st_mtime > combined_voices_path.stat().st_mtime:
-        create_custom_voices_npz(
-            args.mixed_voices,
-            args.original_voices,
-            combined_voices_path,
-        )
-    else:
-        print(f"Using existing combined voices: {combined_voices_path}")
+    # Select this shard's manifest parts; per-shard file names let several
+    # nodes share one output directory
+    parts = None
+    shard_suffix = ""
+    if args.shard:
+        shard, num_shards = args.shard
+        if not (is_mix_manifest(args.mixed_voices) and is_mix_manifest(args.metadata)):
+            print("ERROR: --shard needs --mixed-voices and --metadata to be mix manifests")
+            sys.exit(1)
+        num_parts = len(load_mix_manifest(args.mixed_voices)["parts"])
+        parts = shard_parts(num_parts, shard, num_shards)
+        shard_suffix = f"_shard_{shard:04d}_of_{num_shards:04d}"
+        print(f"Shard {shard}/{num_shards}: manifest parts {parts}")
 
     # Load metadata
-    with open(args.metadata) as f:
-        metadata = json.load(f)
+    metadata = load_mix_metadata(args.metadata, parts)
 
     mixes = metadata["mixes"]
     print(f"Total mixes in metadata: {len(mixes)}")
@@ -326,45 +729,164 @@ def main():
         mixes = mixes[:args.limit]
         print(f"Limited to: {len(mixes)}")
 
+    if args.combined_pack:
+        # Create combined voices file; koko looks the mixes up by ID
+        voices_path = args.output.parent / "voices" / f"combined_voices{shard_suffix}.npz"
+        voices_path.parent.mkdir(parents=True, exist_ok=True)
+        if not voices_path.exists() or args.mixed_voices.stat().st_mtime > voices_path.stat().st_mtime:
+            create_custom_voices_npz(
+                args.mixed_voices,
+                args.original_voices,
+                voices_path,
+                parts,
+            )
+        else:
+            print(f"Using existing combined voices: {voices_path}")
+
+        # Check voice IDs against the combined pack (reads the zip directory only)
+        available = set(npz_member_names(voices_path))
+        styles = {m["id"]: m["id"] for m in mixes if m["id"] in available}
+    else:
+        # koko mixes the original voices from each mix's weights
+        voices_path = args.original_voices
+        styles = weight_styles(mixes, args.mixed_voices, args.original_voices, parts)
+
+    missing = [m["id"] for m in mixes if m["id"] not in styles]
+    if missing:
+        print(f"WARNING: {len(missing)} voices cannot be synthesized from {voices_path}, skipping:")
+        print(f"  {', '.join(missing[:10])}{' ...' if len(missing) > 10 else ''}")
+        mixes = [m for m in mixes if m["id"] in styles]
+
     # Generate audio
+    intra_threads, cpu_sets = thread_budget(args.workers, args.threads_per_worker, args.pin_cpus)
     print(f"\nGenerating audio for {len(mixes)} voices...")
     print(f"Output directory: {args.output}")
-    print(f"Using {args.workers} workers\n")
+    print(f"Using {args.workers} koko workers, {intra_threads or 'default'} ONNX Runtime threads each")
+    if cpu_sets:
+        print(f"Pinned to CPU sets: {cpu_sets}")
+    print()
 
     results = []
-    success_count = 0
-    error_count = 0
-
-    # Create metadata lookup
-    meta_lookup = {m["id"]: m for m in mixes}
-
-    with ThreadPoolExecutor(max_workers=args.workers) as executor:
-        futures = {}
-
-        for mix in mixes:
-            voice_id = mix["id"]
-            future = executor.submit(
-                generate_audio_for_voice,
-                voice_id=voice_id,
-                metadata=mix,
-                output_dir=args.output,
-                voices_path=combined_voices_path,
-                koko_binary=koko_binary,
-                sentence_index=args.sentence_index,
-            )
-            futures[future] = voice_id
 
-        for future in as_completed(futures):
-            voice_id = futures[future]
-            result = future.result()
-            results.append(result)
+    def record(result: dict) -> None:
+        results.append(result)
+        if result["status"] == "success":
+            if audio_cache and result["voice_id"] in cache_keys and not result.get("cached"):
+                audio_cache.store(cache_keys[result["voice_id"]], Path(result["audio_path"]))
+            print(f"  [OK] {result['voice_id']}{' (cached)' if result.get('cached') else ''}")
+        else:
+            print(f"  [FAIL] {result['voice_id']}: {result['error'][:100]}")
+
+    jobs = [build_job(m["id"], m, args.output, args.sentence_index, styles[m["id"]]) for m in mixes]
+
+    # Every voice speaks the same sentence: phonemize it once and send the
+    # phonemes, so espeak is off the per-job path
+    phonemized = {}
+    if not args.no_phonemize_once and jobs:
+        (args.output / "logs").mkdir(parents=True, exist_ok=True)
+        phonemized = phonemize_texts(
+            koko_binary,
+            voices_path,
+            sorted({job["text"] for job in jobs}),
+            language=jobs[0]["language"],
+            cache_path=PHONEME_CACHE_PATH,
+            log_path=args.output / "logs" / "koko_phonemize.log",
+            model_path=args.model,
+        )
 
-            if result["status"] == "success":
-                success_count += 1
-                print(f"  [OK] {voice_id}")
+    # Reuse audio whose style rows, tokens, speed and model are unchanged
+    # before any koko work is scheduled
+    audio_cache = None
+    cache_keys = {}
+    model_path = args.model or default_model_path()
+    if not args.no_audio_cache and jobs:
+        if model_path.exists():
+            audio_cache = AudioCache(args.audio_cache)
+            if args.combined_pack:
+                # Read the mixes' rows from the mix file, not the throwaway combined pack
+                store = MixStore(
+                    args.mixed_voices, base_path=args.original_voices, cache_bytes=0, parts=parts
+                )
+                read_style = partial(mix_style_rows, store)
             else:
-                error_count += 1
-                print(f"  [FAIL] {voice_id}: {result['error'][:100]}")
+                read_style = partial(style_rows, open_voice_pack(args.original_voices))
+            cache_keys = job_cache_keys(
+                jobs, read_style, audio_cache.model_sha256(model_path), phonemized
+            )
+            cached = {
+                job["id"] for job in jobs if audio_cache.fetch(cache_keys[job["id"]], Path(job["output"]))
+            }
+            for job in jobs:
+                if job["id"] in cached:
+                    record({
+                        "voice_id": job["id"],
+                        "status": "success",
+                        "audio_path": job["output"],
+                        "error": None,
+                        "cached": True,
+                    })
+            jobs = [job for job in jobs if job["id"] not in cached]
+            print(f"Audio cache: {len(cached)} cached, {len(jobs)} to synthesize")
+        else:
+            print(f"WARNING: koko model not found at {model_path}, audio cache disabled (see --model)")
+
+    if phonemized:
+        switched = use_phonemes(jobs, {text: p["phonemes"] for text, p in phonemized.items()})
+        print(f"Phonemized {len(phonemized)} sentence(s) once for {switched}/{len(jobs)} jobs")
+
+    # One job per voice; with --style-batch, voices speaking the same
+    # sentence share a multi-style job
+    jobs = group_jobs(jobs, args.style_batch)
+
+    run_start = time.perf_counter()
+    startup_seconds = None
+    if jobs and args.batch:
+        for result in generate_audio_batch(
+            jobs,
+            output_dir=args.output,
+            voices_path=voices_path,
+            koko_binary=koko_binary,
+            processes=args.workers,
+            style_batch=args.style_batch,
+            model_path=args.model,
+            intra_threads=intra_threads,
+            cpu_sets=cpu_sets,
+        ):
+            record(result)
+    elif jobs:
+        # Each koko worker loads the model and combined voices once and then
+        # serves jobs; one thread per worker keeps them all busy
+        pool = KokoWorkerPool(
+            args.workers,
+            koko_binary=koko_binary,
+            voices_path=voices_path,
+            log_dir=args.output / "logs",
+            style_batch=max(args.style_batch, 1),
+            model_path=args.model,
+            intra_threads=intra_threads,
+            cpu_sets=cpu_sets,
+        )
+        with pool, ThreadPoolExecutor(max_workers=args.workers) as executor:
+            # Latency and throughput are measured once the model is loaded
+            try:
+                pool.wait_ready()
+            except (TimeoutError, RuntimeError) as e:
+                # Jobs report the failure and the pool restarts the worker
+                print(f"WARNING: koko worker failed to start: {e}")
+            startup_seconds = time.perf_counter() - run_start
+            run_start = time.perf_counter()
+            futures = [
+                executor.submit(generate_audio_for_job, job, pool, submitted=time.perf_counter())
+                for job in jobs
+            ]
+            for future in as_completed(futures):
+                for result in future.result():
+                    record(result)
+
+    metrics = summarize_metrics(results, time.perf_counter() - run_start)
+    metrics["startup_seconds"] = startup_seconds
+    success_count = sum(1 for r in results if r["status"] == "success")
+    error_count = len(results) - success_count
 
     # Summary
     print(f"\n{'='*50}")
@@ -372,15 +894,36 @@ def main():
     print(f"  Success: {success_count}")
     print(f"  Errors: {error_count}")
     print(f"  Total: {len(results)}")
+    if metrics["voices_synthesized"]:
+        print(f"  Synthesized: {metrics['voices_synthesized']} voices, "
+              f"{metrics['audio_seconds']:.1f}s of audio in {metrics['wall_seconds']:.1f}s "
+              f"({metrics['samples_per_second']:.0f} samples/s)")
+        if metrics["wall_ms"]:
+            latency = metrics["wall_ms"]
+            print(f"  Job latency: p50 {latency['p50']:.0f} ms, p95 {latency['p95']:.0f} ms, "
+                  f"p99 {latency['p99']:.0f} ms")
+        if metrics["rtf"] is not None:
+            print(f"  Real-time factor: {metrics['rtf']:.3f}")
+        if metrics["peak_child_rss_mb"] is not None:
+            print(f"  Peak koko RSS: {metrics['peak_child_rss_mb']:.0f} MB")
 
     # Save generation results
-    results_path = args.output / "generation_results.json"
+    results_path = args.output / f"generation_results{shard_suffix}.json"
     with open(results_path, "w") as f:
         json.dump(
             {
                 "total": len(results),
                 "success": success_count,
                 "errors": error_count,
+                "run": {
+                    "mode": "batch" if args.batch else "worker",
+                    "workers": args.workers,
+                    "style_batch": args.style_batch,
+                    "threads_per_worker": intra_threads,
+                    "cpu_sets": cpu_sets,
+                    "koko": str(koko_binary),
+                },
+                "metrics": metrics,
                 "results": results,
             },
             f,
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Persistent koko Workers and Batch Runs
+
+Starting `koko` once per mix reloads the ONNX model, re-initializes espeak
+and re-reads the voices NPZ before about a second of real synthesis. This
+module keeps long-lived `koko worker` processes instead: each loads the
+model and voices once, then takes JSON jobs on stdin and answers with one
+JSON result line per output on stdout. run_koko_batch() hands a whole job list
+to a single `koko batch` invocation instead, and phonemize_texts() runs
+`koko phonemize` so a sentence spoken by many voices is phonemized once.
+
+koko also logs to stdout, so only lines that parse as JSON objects are
+treated as protocol messages.
+"""
+
+import json
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+
+def default_model_path() -> Path:
+    """Where koko keeps the English model it downloads when --model is not given."""
+    if sys.platform == "darwin":
+        cache_dir = Path.home() / "Library" / "Caches"
+    elif sys.platform == "win32":
+        cache_dir = Path(os.environ.get("LOCALAPPDATA", Path.home()))
+    else:
+        cache_dir = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    return cache_dir / "huggingface" / "kokoro" / "v1.0" / "model.onnx"
+
+
+def available_cpus() -> list[int]:
+    """CPUs this process may run on (respects taskset/cgroup affinity where supported)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def split_cpus(cpus: list[int], parts: int) -> list[list[int]]:
+    """
+    Split cpus into parts contiguous groups of near-equal size.
+
+    With more parts than CPUs every group gets one CPU, reused round-robin.
+    """
+    if parts >= len(cpus):
+        return [[cpus[i % len(cpus)]] for i in range(parts)]
+    size, extra = divmod(len(cpus), parts)
+    groups, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(cpus[start:end])
+        start = end
+    return groups
+
+
+def pin_process(pid: int, cpus: Optional[list[int]]) -> None:
+    """
+    Restrict a process to cpus (Linux only; a no-op elsewhere or for cpus=None).
+
+    Called right after spawning koko: its ONNX Runtime threads are only
+    created once the model loads, so they inherit the affinity.
+    """
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(pid, cpus)
+
+
+def koko_command(
+    koko_binary: Path,
+    voices_path: Path,
+    language: str,
+    model_path: Optional[Path] = None,
+    intra_threads: Optional[int] = None,
+) -> list[str]:
+    """
+    Global koko arguments shared by every subcommand; append the subcommand.
+
+    intra_threads caps ONNX Runtime's thread pool (with one inter-op
+    thread), so several koko processes can share the cores without
+    oversubscribing them.
+    """
+    cmd = [str(koko_binary), "--data", str(voices_path), "--lan", language]
+    if model_path:
+        cmd += ["--model", str(model_path)]
+    if intra_threads:
+        cmd += ["--intra-threads", str(intra_threads), "--inter-threads", "1"]
+    return cmd
+
+
+class KokoWorker:
+    """One `koko worker` subprocess with a line-oriented JSON protocol."""
+
+    def __init__(
+        self,
+        koko_binary: Path,
+        voices_path: Path,
+        language: str = "en-us",
+        log_path: Optional[Path] = None,
+        startup_timeout: float = 300,
+        style_batch: int = 8,
+        model_path: Optional[Path] = None,
+        intra_threads: Optional[int] = None,
+        cpus: Optional[list[int]] = None,
+    ):
+        self.startup_timeout = startup_timeout
+        self.style_batch = max(style_batch, 1)
+        self.ready = False
+        self._messages: queue.Queue = queue.Queue()
+        self._next_id = 0
+
+        cmd = koko_command(koko_binary, voices_path, language, model_path, intra_threads) + [
+            "--force-style", "true",
+            "worker",
+            "--style-batch", str(style_batch),
+        ]
+        self._log = open(log_path, "a") if log_path else None
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=self._log or subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        pin_process(self.proc.pid, cpus)
+        self._reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self._reader.start()
+
+    def _read_stdout(self) -> None:
+        for line in self.proc.stdout:
+            line = line.strip()
+            if not line.startswith("{"):
+                if self._log:
+                    self._log.write(line + "\n")
+                continue
+            try:
+                self._messages.put(json.loads(line))
+            except ValueError:
+                if self._log:
+                    self._log.write(line + "\n")
+        self._messages.put(None)  # EOF: worker exited
+
+    def _next_message(self, timeout: float) -> dict:
+        try:
+            message = self._messages.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"koko worker did not answer within {timeout:.0f}s")
+        if message is None:
+            raise RuntimeError(f"koko worker exited (code {self.proc.poll()})")
+        return message
+
+    def wait_ready(self) -> None:
+        """Block until the worker reports that the model and voices are loaded."""
+        while not self.ready:
+            message = self._next_message(self.startup_timeout)
+            if message.get("event") == "ready":
+                self.ready = True
+
+    def run(self, job: dict, timeout: float = 60) -> dict[str, dict]:
+        """
+        Send one job and return {id: result} for each of its outputs.
+
+        A multi-style job ("styles"/"outputs"/"ids") gets one result per
+        style. koko writes a style's result as soon as its group of up to
+        style_batch styles is done, so timeout is per style: the wait for
+        the next result line scales with the size of the next group.
+        """
+        self.wait_ready()
+
+        job = dict(job)
+        if job.get("id") is None:
+            job["id"] = f"job-{self._next_id}"
+            self._next_id += 1
+        if job.get("styles"):
+            job.setdefault("ids", [f"{job['id']}:{i}" for i in range(len(job["styles"]))])
+            expected = set(job["ids"])
+        else:
+            expected = {job["id"]}
+        self.proc.stdin.write(json.dumps(job) + "\n")
+        self.proc.stdin.flush()
+
+        results = {}
+        while expected - results.keys():
+            group = min(len(expected - results.keys()), self.style_batch)
+            message = self._next_message(timeout * group)
+            if message.get("id") in expected:
+                results[message["id"]] = message
+            elif message.get("id") is None and message.get("status") == "error":
+                raise RuntimeError(message.get("error") or "koko rejected the job")
+        return results
+
+    def close(self, timeout: float = 5) -> None:
+        """Close stdin so the worker exits, killing it if it does not."""
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            self.proc.kill()
+        if self._log:
+            self._log.close()
+            self._log = None
+
+    def kill(self) -> None:
+        self.proc.kill()
+        self.close()
+
+
+class KokoWorkerPool:
+    """
+    Fixed-size pool of KokoWorker processes.
+
+    run() is safe to call from several threads; each call takes an idle
+    worker, so with one thread per worker every worker stays busy. A worker
+    that times out or dies is replaced by a fresh one; if that fails too,
+    its slot is dropped, and run() raises once no slots are left.
+
+    intra_threads is passed to every worker; with cpu_sets, the worker in
+    slot i is pinned to cpu_sets[i] (see split_cpus()).
+
+    Usage:
+        with KokoWorkerPool(4, koko_binary=koko, voices_path=voices) as pool:
+            results = pool.run({"id": "a", "text": "...", "style": "mix_inter_0001", "output": "a.wav"})
+    """
+
+    def __init__(
+        self,
+        size: int,
+        koko_binary: Path,
+        voices_path: Path,
+        language: str = "en-us",
+        log_dir: Optional[Path] = None,
+        style_batch: int = 8,
+        model_path: Optional[Path] = None,
+        intra_threads: Optional[int] = None,
+        cpu_sets: Optional[list[list[int]]] = None,
+    ):
+        self.size = size
+        self._worker_kwargs = {
+            "koko_binary": koko_binary,
+            "voices_path": voices_path,
+            "language": language,
+            "style_batch": style_batch,
+            "model_path": model_path,
+            "intra_threads": intra_threads,
+        }
+        self._cpu_sets = cpu_sets
+        self._log_dir = log_dir
+        if log_dir:
+            log_dir.mkdir(parents=True, exist_ok=True)
+
+        self._idle: queue.Queue = queue.Queue()
+        self._live = size
+        self._lock = threading.Lock()
+        # Start every worker first so they load the model in parallel
+        for slot in range(size):
+            self._idle.put((slot, self._spawn(slot)))
+
+    def _spawn(self, slot: int) -> KokoWorker:
+        log_path = self._log_dir / f"koko_worker_{slot}.log" if self._log_dir else None
+        cpus = self._cpu_sets[slot % len(self._cpu_sets)] if self._cpu_sets else None
+        return KokoWorker(log_path=log_path, cpus=cpus, **self._worker_kwargs)
+
+    def wait_ready(self) -> None:
+        """Block until every idle worker has loaded the model and voices."""
+        workers = [self._idle.get() for _ in range(self._idle.qsize())]
+        try:
+            for entry in workers:
+                if entry is not None:
+                    entry[1].wait_ready()
+        finally:
+            for entry in workers:
+                self._idle.put(entry)
+
+    def run(self, job: dict, timeout: float = 60) -> dict[str, dict]:
+        """Run a job on an idle worker; each result gets a "worker" key with its slot."""
+        entry = self._idle.get()
+        if entry is None:
+            # Every slot was dropped; let the other waiting callers see it too
+            self._idle.put(None)
+            raise RuntimeError("No koko workers left: every worker failed to restart")
+
+        slot, worker = entry
+        try:
+            results = worker.run(job, timeout)
+        except (TimeoutError, RuntimeError, OSError):
+            worker.kill()
+            self._respawn(slot)
+            raise
+        self._idle.put((slot, worker))
+        for result in results.values():
+            result["worker"] = slot
+        return results
+
+    def _respawn(self, slot: int) -> None:
+        """Put a fresh worker in slot, or drop the slot if it cannot start."""
+        try:
+            self._idle.put((slot, self._spawn(slot)))
+        except Exception as e:
+            print(f"WARNING: could not restart koko worker {slot}, dropping it: {e}", file=sys.stderr)
+            with self._lock:
+                self._live -= 1
+                if self._live == 0:
+                    self._idle.put(None)
+
+    def close(self) -> None:
+        while not self._idle.empty():
+            entry = self._idle.get()
+            if entry is not None:
+                entry[1].close()
+
+    def __enter__(self) -> "KokoWorkerPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def run_koko_batch(
+    koko_binary: Path,
+    voices_path: Path,
+    jobs: list[dict],
+    jobs_path: Path,
+    language: str = "en-us",
+    log_path: Optional[Path] = None,
+    style_batch: int = 8,
+    model_path: Optional[Path] = None,
+    intra_threads: Optional[int] = None,
+    cpus: Optional[list[int]] = None,
+) -> dict[str, dict]:
+    """
+    Run jobs through one `koko batch` invocation and return {job id: result}.
+
+    The jobs are written to jobs_path and the results to
+    "<jobs_path stem>.results.jsonl" next to it. Every job needs an "id"
+    (multi-style jobs an "ids" list).
+    Jobs without a result line (e.g. koko crashed) are missing from the
+    returned dict.
+    """
+    jobs_path = Path(jobs_path)
+    results_path = jobs_path.with_name(f"{jobs_path.stem}.results.jsonl")
+    with open(jobs_path, "w") as f:
+        for job in jobs:
+            f.write(json.dumps(job) + "\n")
+
+    cmd = koko_command(koko_binary, voices_path, language, model_path, intra_threads) + [
+        "--force-style", "true",
+        "batch", str(jobs_path),
+        "--results", str(results_path),
+        "--style-batch", str(style_batch),
+    ]
+    with open(log_path or os.devnull, "a") as log:
+        proc = subprocess.Popen(cmd, stdout=log, stderr=log)
+        pin_process(proc.pid, cpus)
+        proc.wait()
+
+    results = {}
+    if results_path.exists():
+        with open(results_path) as f:
+            for line in f:
+                if line.startswith("{"):
+                    result = json.loads(line)
+                    results[result.get("id")] = result
+    return results
+
+
+def _koko_signature(koko_binary: Path) -> dict:
+    """Identify a koko build by path, size and mtime; a rebuild invalidates cached phonemes."""
+    stat = Path(koko_binary).stat()
+    return {"koko": str(Path(koko_binary).resolve()), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def phonemize_texts(
+    koko_binary: Path,
+    voices_path: Path,
+    texts: list[str],
+    language: str = "en-us",
+    cache_path: Optional[Path] = None,
+    log_path: Optional[Path] = None,
+    model_path: Optional[Path] = None,
+) -> dict[str, dict]:
+    """
+    Phonemize texts with `koko phonemize` and return {text: {"phonemes", "tokens"}}.
+
+    "phonemes" holds the phonemes of each chunk; joined with newlines they go
+    back to koko as job text with "phonemes": true, which skips normalization
+    and espeak on every synthesis and keeps koko's chunks. "tokens" holds the
+    model's token IDs per chunk, including the initial silence tokens.
+    Results are kept in the JSON file cache_path, shared by all runs of the
+    same koko build, so only texts not seen before start koko at all. Texts
+    koko could not phonemize are missing from the returned dict.
+    """
+    signature = _koko_signature(koko_binary)
+    cache = {}
+    if cache_path and Path(cache_path).exists():
+        with open(cache_path) as f:
+            stored = json.load(f)
+        if stored.get("build") == signature:
+            cache = {
+                k: v
+                for k, v in stored.get("phonemes", {}).items()
+                if isinstance(v, dict) and isinstance(v.get("phonemes"), list)
+            }
+
+    def key(text: str) -> str:
+        return f"{language}\t{text}"
+
+    missing = [text for text in dict.fromkeys(texts) if key(text) not in cache]
+    if missing:
+        if any("\n" in text for text in missing):
+            raise ValueError("koko phonemize reads one text per line; texts must not contain newlines")
+        cmd = koko_command(koko_binary, voices_path, language, model_path) + ["phonemize"]
+        with open(log_path or os.devnull, "a") as log:
+            proc = subprocess.run(
+                cmd, input="\n".join(missing) + "\n", stdout=subprocess.PIPE, stderr=log, text=True
+            )
+        for line in proc.stdout.splitlines():
+            if not line.startswith("{"):
+                continue
+            reply = json.loads(line)
+            if reply.get("phonemes") and reply.get("text") in missing:
+                cache[key(reply["text"])] = {"phonemes": reply["phonemes"], "tokens": reply["tokens"]}
+
+        if cache_path:
+            cache_path = Path(cache_path)
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=cache_path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"build": signature, "phonemes": cache}, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, cache_path)
+
+    return {text: cache[key(text)] for text in texts if key(text) in cache}
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Low-Rank Compressed Voice Packs for Kokoro Voice PCA
+
+The 510 rows of a voice are strongly correlated, and so are the voices of a
+pack (every mix is a combination of the same base voices). A low-rank pack
+stores a pack of N voices as
+- mean:         (D,) mean voice, D = 510 * 256
+- basis:        (k, D) shared principal components
+- coefficients: (N, k) per-voice coordinates in the basis
+so voice i is mean + coefficients[i] @ basis. The rank k is configurable;
+the reconstruction error of every voice is measured when the pack is
+written. koko reads the pack directly with --data: it keeps the mean,
+basis and coefficients in memory and decodes a voice when it is first used,
+so loading voices needs about the size of the pack rather than 510 KB per
+voice. decode_to_npz() expands it back to the (510, 1, 256) voices NPZ for
+other readers.
+
+Packs of mixes are compressed with pca.py's exact Gram path (k >= V - 1
+base voices is lossless up to float rounding); other packs use an SVD, or
+streaming_pca.py when they do not fit in memory.
+
+File Format (*.lrvoices.npz):
+- header:       UTF-8 JSON as a uint8 array: format version, voice shape,
+                rank, storage dtype and reconstruction error
+- names:        UTF-8 voice names joined by newlines, as a uint8 array
+- mean, basis:  float32, or float16 stored as its uint16 bit pattern
+- coefficients: (N, k) float32
+Every member is a plain numeric array, so readers without NumPy's string
+and float16 types (kokorox's ndarray-npy) can load it.
+"""
+
+import argparse
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from mix_store import MixStore
+from npz_io import NpzWriter
+from pca import pca_of_store
+from streaming_pca import fit_streaming_pca
+
+
+LOWRANK_FORMAT = "kokoro-lowrank-voices"
+LOWRANK_VERSION = 1
+LOWRANK_SUFFIX = ".lrvoices.npz"
+
+
+@dataclass
+class LowRankPack:
+    """A voice pack stored as mean + coefficients @ shared basis."""
+
+    names: list[str]
+    mean: np.ndarray
+    basis: np.ndarray
+    coefficients: np.ndarray
+    shape: tuple[int, ...] = (510, 1, 256)
+    error: dict = field(default_factory=dict)
+
+    @property
+    def rank(self) -> int:
+        return self.basis.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.mean.nbytes + self.basis.nbytes + self.coefficients.nbytes
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name) -> bool:
+        return name in self.names
+
+    def decode_rows(self, index: np.ndarray) -> np.ndarray:
+        """Reconstruct voices by position as an (n, 510, 1, 256) float32 array."""
+        coefficients = self.coefficients[index].astype(np.float32)
+        flat = self.mean.astype(np.float32) + coefficients @ self.basis.astype(np.float32)
+        return flat.reshape(len(coefficients), *self.shape)
+
+    def decode(self, name: str) -> np.ndarray:
+        """Reconstruct one voice as a (510, 1, 256) float32 array."""
+        return self.decode_rows(np.array([self.names.index(name)]))[0]
+
+
+def compress_store(
+    store: MixStore,
+    rank: int = 32,
+    method: str = "auto",
+    dtype: str = "float32",
+    batch_size: int = 256,
+    memory_limit: int = 4 * 1024 ** 3,
+) -> LowRankPack:
+    """
+    Compress every voice in a MixStore to a rank-k pack.
+
+    method is "gram" (virtual mixes, exact), "svd" (all voices in memory),
+    "stream" (streaming_pca.py within memory_limit bytes) or "auto". The
+    voices are then read once more in batches to compute their coefficients
+    against the stored (dtype-rounded) basis and the reconstruction error.
+    """
+    ids = store.ids
+    if not ids:
+        raise ValueError("No voices to compress")
+    if store.stored_rows is not None:
+        raise ValueError(f"{store.path} stores only style rows {store.stored_rows}, not full voices")
+    shape = store.get_many(ids[:1]).shape[1:]
+    dim = int(np.prod(shape))
+
+    if method == "auto":
+        if store.is_virtual:
+            method = "gram"
+        else:
+            # Centered float64 copy plus the SVD's factors
+            method = "svd" if 3 * len(ids) * dim * 8 <= memory_limit else "stream"
+    if method in ("gram", "svd"):
+        result = pca_of_store(store, ids, rank, method=method, chunk_size=batch_size)
+    elif method == "stream":
+        result = fit_streaming_pca(store, rank, ids, memory_limit=memory_limit)
+    else:
+        raise ValueError(f"Unknown compression method {method!r}")
+
+    mean = result.mean.astype(dtype)
+    basis = result.components.astype(dtype)
+    mean32, basis32 = mean.astype(np.float32), basis.astype(np.float32)
+
+    coefficients = np.empty((len(ids), len(basis)), dtype=np.float32)
+    relative = np.empty(len(ids))
+    squared_error = squared_norm = max_abs = 0.0
+    for start in range(0, len(ids), batch_size):
+        x = store.get_many(ids[start:start + batch_size]).reshape(-1, dim)
+        c = (x - mean32) @ basis32.T
+        residual = x - (mean32 + c @ basis32)
+        coefficients[start:start + len(x)] = c
+
+        err = np.einsum("ij,ij->i", residual, residual, dtype=np.float64)
+        norm = np.einsum("ij,ij->i", x, x, dtype=np.float64)
+        relative[start:start + len(x)] = np.sqrt(err / np.where(norm > 0, norm, 1.0))
+        squared_error += err.sum()
+        squared_norm += norm.sum()
+        max_abs = max(max_abs, float(np.abs(residual).max()))
+
+    error = {
+        "relative": float(np.sqrt(squared_error / squared_norm)) if squared_norm else 0.0,
+        "rmse": float(np.sqrt(squared_error / (len(ids) * dim))),
+        "max_abs": max_abs,
+        "voice_relative_mean": float(relative.mean()),
+        "voice_relative_max": float(relative.max()),
+        "worst_voice": ids[int(relative.argmax())],
+        "explained_variance_ratio": float(result.explained_variance_ratio.sum()),
+        "method": result.method,
+    }
+    return LowRankPack(
+        names=list(ids),
+        mean=mean,
+        basis=basis,
+        coefficients=coefficients,
+        shape=tuple(int(n) for n in shape),
+        error=error,
+    )
+
+
+def _utf8(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+
+
+def _stored(array: np.ndarray) -> np.ndarray:
+    """float16 as its uint16 bits (the npy readers of koko lack float16)."""
+    return array.view(np.uint16) if array.dtype == np.float16 else array
+
+
+def save_lowrank_pack(pack: LowRankPack, path: Path) -> Path:
+    """Write a low-rank pack (*.lrvoices.npz)."""
+    header = {
+        "format": LOWRANK_FORMAT,
+        "version": LOWRANK_VERSION,
+        "num_voices": len(pack),
+        "rank": pack.rank,
+        "shape": list(pack.shape),
+        "dtype": str(pack.basis.dtype),
+        "error": pack.error,
+    }
+    if any("\n" in name for name in pack.names):
+        raise ValueError("Voice names in a low-rank pack cannot contain newlines")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(
+        path,
+        header=_utf8(json.dumps(header)),
+        names=_utf8("\n".join(pack.names)),
+        mean=_stored(pack.mean),
+        basis=_stored(pack.basis),
+        coefficients=pack.coefficients.astype(np.float32),
+    )
+    return path
+
+
+def load_lowrank_pack(path: Path) -> LowRankPack:
+    """Read a low-rank pack written by save_lowrank_pack()."""
+    with np.load(path) as npz:
+        header = json.loads(npz["header"].tobytes().decode("utf-8"))
+        if header.get("format") != LOWRANK_FORMAT:
+            raise ValueError(f"{path} is not a low-rank voice pack")
+        if header.get("version", 0) > LOWRANK_VERSION:
+            raise ValueError(
+                f"{path} uses low-rank pack format v{header['version']}, "
+                f"this reader supports up to v{LOWRANK_VERSION}"
+            )
+
+        names = npz["names"].tobytes().decode("utf-8")
+        dtype = np.dtype(header["dtype"])
+        return LowRankPack(
+            names=names.split("\n") if names else [],
+            mean=npz["mean"].view(dtype),
+            basis=npz["basis"].view(dtype),
+            coefficients=npz["coefficients"],
+            shape=tuple(header["shape"]),
+            error=header.get("error", {}),
+        )
+
+
+def decode_to_npz(
+    pack: LowRankPack,
+    path: Path,
+    names: Optional[list[str]] = None,
+    batch_size: int = 256,
+) -> Path:
+    """
+    Expand a low-rank pack (or the given voices of it) into a voices NPZ.
+
+    Voices are reconstructed batch by batch and streamed into the archive,
+    so memory stays flat in the number of voices. Repeated names are
+    decoded once.
+    """
+    position = {name: i for i, name in enumerate(pack.names)}
+    names = pack.names if names is None else list(dict.fromkeys(names))
+    missing = [name for name in names if name not in position]
+    if missing:
+        raise KeyError(f"Voices not in the pack: {', '.join(missing[:5])}")
+
+    with NpzWriter(path) as writer:
+        for start in range(0, len(names), batch_size):
+            chunk = names[start:start + batch_size]
+            voices = pack.decode_rows(np.array([position[name] for name in chunk]))
+            for name, voice in zip(chunk, voices):
+                writer.write(name, voice)
+    return Path(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Low-rank compressed voice packs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    compress = commands.add_parser("compress", help="Compress a voice pack or mix file")
+    compress.add_argument(
+        "input",
+        type=Path,
+        help="Voices NPZ, mix file or manifest (virtual mixes are compressed exactly)",
+    )
+    compress.add_argument(
+        "--voices",
+        type=Path,
+        help="Base voice pack of virtual mixes (default: the path recorded in the mix file)",
+    )
+    compress.add_argument(
+        "--rank",
+        type=int,
+        default=32,
+        help="Number of shared basis vectors",
+    )
+    compress.add_argument(
+        "--method",
+        choices=["auto", "gram", "svd", "stream"],
+        default="auto",
+        help="How the basis is fit (see pca.py and streaming_pca.py)",
+    )
+    compress.add_argument(
+        "--dtype",
+        choices=["float32", "float16"],
+        default="float32",
+        help="Storage type of the mean and basis",
+    )
+    compress.add_argument(
+        "--batch-size",
+        type=int,
+        default=256,
+        help="Voices read per batch",
+    )
+    compress.add_argument(
+        "--memory-limit",
+        type=float,
+        default=4.0,
+        help="Approximate memory cap in GB for fitting the basis",
+    )
+    compress.add_argument(
+        "--output",
+        type=Path,
+        required=True,
+        help=f"Output low-rank pack ({LOWRANK_SUFFIX})",
+    )
+
+    decode = commands.add_parser("decode", help="Expand a low-rank pack into a voices NPZ")
+    decode.add_argument("pack", type=Path, help=f"Low-rank pack ({LOWRANK_SUFFIX})")
+    decode.add_argument(
+        "--names",
+        nargs="+",
+        help="Only decode these voices",
+    )
+    decode.add_argument(
+        "--output",
+        type=Path,
+        required=True,
+        help="Output voices NPZ for koko",
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "compress":
+        store = MixStore(args.input, base_path=args.voices, cache_bytes=0)
+        print(f"Compressing {len(store)} voices from {args.input} to rank {args.rank}")
+        pack = compress_store(
+            store,
+            rank=args.rank,
+            method=args.method,
+            dtype=args.dtype,
+            batch_size=args.batch_size,
+            memory_limit=int(args.memory_limit * 1024 ** 3),
+        )
+        save_lowrank_pack(pack, args.output)
+
+        error = pack.error
+        original = len(pack) * int(np.prod(pack.shape)) * 4
+        print(f"  Basis fit: {error['method']}, {error['explained_variance_ratio']:.4%} of variance")
+        print(
+            f"  Reconstruction: relative {error['relative']:.3e}, RMSE {error['rmse']:.3e}, "
+            f"max abs {error['max_abs']:.3e}"
+        )
+        print(
+            f"  Per voice: mean relative {error['voice_relative_mean']:.3e}, "
+            f"worst {error['voice_relative_max']:.3e} ({error['worst_voice']})"
+        )
+        print(
+            f"  Size: {pack.nbytes / 1e6:.1f} MB in memory vs {original / 1e6:.1f} MB float32 "
+            f"({original / pack.nbytes:.1f}x); file {args.output.stat().st_size / 1e6:.1f} MB"
+        )
+        print(f"Saved low-rank pack to: {args.output}")
+    else:
+        pack = load_lowrank_pack(args.pack)
+        names = list(dict.fromkeys(args.names)) if args.names else pack.names
+        path = decode_to_npz(pack, args.output, names)
+        print(f"Decoded {len(names)} voices (rank {pack.rank}) to: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,722 @@
+#!/usr/bin/env python3
+"""
+Mix Storage for Kokoro Voice PCA
+
+Every mix produced by voice_mixer.py is a linear combination of the base
+voices in the Kokoro voice pack. This module holds the batched mixing engine
+and a compact "virtual mix" format that stores only the mixing weights.
+
+Virtual Mix Format (*.mixw.npz):
+- ids:          (M,) mix IDs
+- voice_names:  (V,) base voice names, in weight-column order
+- indptr, indices, values: CSR encoding of the sparse (M, V) weight matrix
+- header:       JSON string with the format version and the base voice
+                pack's SHA-256 content hash and path
+
+A mix is rebuilt on demand as weights[i] @ base_voices, so a 50k-mix sweep
+takes a few MB on disk instead of tens of GB. MixStore wraps either format
+in a lazy, LRU-cached mapping of mix ID -> voice array.
+
+Mix Manifest (*.manifest.json):
+A JSON file listing part files (mix data + metadata, relative to the
+manifest) and the mix IDs each holds. "All mixes" is written as a manifest
+over the intra/inter parts, so it is a view rather than a third copy.
+MixStore and load_mix_metadata() accept a manifest wherever they accept a
+single file.
+
+Style Rows:
+koko only reads style[len(tokens)] for a token chunk, so analysis of a fixed
+set of sentences needs just a few of the 510 rows. The mixing engine and
+MixStore take an optional list of rows, and a manifest may record "rows"
+when its materialized mixes were stored with only those rows. The rows of a
+set of sentences come from the token IDs `koko phonemize` prints (see
+load_token_rows()).
+"""
+
+import json
+from collections import OrderedDict
+from collections.abc import Mapping
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from npz_io import npz_directory, read_npz
+from voice_pack import DEFAULT_CACHE_DIR, open_voice_pack
+
+
+VIRTUAL_MIX_FORMAT = "kokoro-virtual-mixes"
+VIRTUAL_MIX_VERSION = 1
+VIRTUAL_MIX_SUFFIX = ".mixw.npz"
+
+MIX_MANIFEST_FORMAT = "kokoro-mix-manifest"
+MIX_MANIFEST_VERSION = 2
+MIX_MANIFEST_SUFFIX = ".manifest.json"
+
+
+def parse_rows(spec: str) -> list[int]:
+    """Parse a row list such as "12,40-45" into sorted, unique row indices."""
+    rows = set()
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        start, sep, end = part.partition("-")
+        if sep:
+            rows.update(range(int(start), int(end) + 1))
+        else:
+            rows.add(int(start))
+    return sorted(rows)
+
+
+def token_rows(tokens: Iterable[list[list[int]]]) -> list[int]:
+    """
+    Sorted style rows koko reads for phonemized texts.
+
+    tokens holds one entry per text: its token IDs per chunk, as printed by
+    `koko phonemize`. Each chunk reads style row len(chunk).
+    """
+    return sorted({len(chunk) for chunks in tokens for chunk in chunks})
+
+
+def load_token_rows(path: Path) -> list[int]:
+    """
+    Style rows used by the texts in a phonemes file.
+
+    Accepts generate_audio.py's phoneme cache (data/cache/phonemes.json) or
+    the JSON lines `koko phonemize` prints; other output lines are skipped.
+    """
+    with open(path) as f:
+        content = f.read()
+    try:
+        stored = json.loads(content)
+    except json.JSONDecodeError:
+        stored = None
+    if isinstance(stored, dict) and "phonemes" in stored and "build" in stored:
+        entries = [v for v in stored["phonemes"].values() if isinstance(v, dict)]
+    else:
+        entries = [
+            json.loads(line)
+            for line in content.splitlines()
+            if line.startswith("{")
+        ]
+    rows = token_rows(entry["tokens"] for entry in entries if entry.get("tokens"))
+    if not rows:
+        raise ValueError(f"No token IDs found in {path}")
+    return rows
+
+
+def check_rows(rows: Iterable[int], num_rows: int) -> list[int]:
+    """Validate style row indices against a (.., num_rows, ..) voice tensor."""
+    rows = [int(row) for row in rows]
+    bad = [row for row in rows if not 0 <= row < num_rows]
+    if bad:
+        raise ValueError(f"Style rows {bad[:5]} out of range for {num_rows} rows")
+    return rows
+
+
+def iter_mix_batches(
+    weights: np.ndarray,
+    stacked: np.ndarray,
+    chunk_size: int = 1024,
+    rows: Optional[Iterable[int]] = None,
+):
+    """
+    Yield (start, block) pairs materializing weights @ stacked in chunks of rows.
+
+    Args:
+        weights: (M, V) weight matrix, one row per mix. Rows are normalized to sum to 1.
+        stacked: (V, 510, 256) tensor of base voices.
+        chunk_size: Number of mixes materialized per matrix product.
+        rows: Style rows to mix (default: all). Only these rows of the base
+            voices are read, so the work shrinks with the number of rows.
+
+    Each block has shape (m, R, 1, 256) with m <= chunk_size and R the
+    number of rows (510 by default).
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.ndim != 2 or weights.shape[1] != stacked.shape[0]:
+        raise ValueError(
+            f"Weight matrix shape {weights.shape} does not match {stacked.shape[0]} voices"
+        )
+
+    totals = weights.sum(axis=1, keepdims=True)
+    if np.any(totals <= 0):
+        raise ValueError("Every mix needs a positive total weight")
+    normalized = (weights / totals).astype(np.float32)
+
+    if rows is not None:
+        stacked = stacked[:, check_rows(rows, stacked.shape[1]), :]
+    n_rows, n_dims = stacked.shape[1], stacked.shape[2]
+    flat = stacked.reshape(stacked.shape[0], n_rows * n_dims)
+
+    for start in range(0, normalized.shape[0], chunk_size):
+        block = normalized[start:start + chunk_size] @ flat
+        yield start, block.reshape(-1, n_rows, 1, n_dims)
+
+
+def mix_batch(
+    weights: np.ndarray,
+    stacked: np.ndarray,
+    chunk_size: int = 1024,
+    rows: Optional[Iterable[int]] = None,
+) -> np.ndarray:
+    """
+    Materialize every mix described by a (M, V) weight matrix in one pass.
+
+    Returns an (M, 510, 1, 256) float32 array, or (M, len(rows), 1, 256)
+    when rows is given. The work is a handful of BLAS matrix products over
+    chunks of chunk_size mixes.
+    """
+    rows = None if rows is None else list(rows)
+    n_mixes = np.asarray(weights).shape[0]
+    n_rows = stacked.shape[1] if rows is None else len(rows)
+    out = np.empty((n_mixes, n_rows, 1, stacked.shape[2]), dtype=np.float32)
+    for start, block in iter_mix_batches(weights, stacked, chunk_size, rows):
+        out[start:start + block.shape[0]] = block
+    return out
+
+
+def load_base_voices(
+    voices_path: Path,
+    voice_names: Optional[list[str]] = None,
+    cache_dir: Optional[Path] = DEFAULT_CACHE_DIR,
+) -> tuple[list[str], np.ndarray]:
+    """
+    Load a base voice pack as a (V, 510, 256) float32 tensor.
+
+    If voice_names is given, the tensor rows follow that order, so it lines
+    up with the weight columns of a virtual mix file. The pack is read
+    through the memory-mapped voice cache unless cache_dir is None.
+    """
+    pack = open_voice_pack(voices_path, cache_dir)
+    names = list(voice_names) if voice_names is not None else pack.names
+    return names, pack.stacked(names)
+
+
+@dataclass
+class MixWeights:
+    """Sparse (M, V) mixing weights plus a reference to the base voice pack."""
+
+    ids: list[str]
+    voice_names: list[str]
+    indptr: np.ndarray
+    indices: np.ndarray
+    values: np.ndarray
+    base_sha256: str
+    base_path: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def dense(self, rows: Optional[Iterable[int]] = None) -> np.ndarray:
+        """Expand the selected rows (default: all) into a dense (k, V) matrix."""
+        rows = range(len(self.ids)) if rows is None else list(rows)
+        out = np.zeros((len(rows), len(self.voice_names)))
+        for k, i in enumerate(rows):
+            start, end = self.indptr[i], self.indptr[i + 1]
+            out[k, self.indices[start:end]] = self.values[start:end]
+        return out
+
+    def row_index(self) -> dict[str, int]:
+        """Map mix ID to its row in the weight matrix."""
+        return {mix_id: i for i, mix_id in enumerate(self.ids)}
+
+    @classmethod
+    def from_dense(
+        cls,
+        ids: list[str],
+        voice_names: list[str],
+        weights: np.ndarray,
+        base_sha256: str,
+        base_path: Optional[str] = None,
+    ) -> "MixWeights":
+        """Build the sparse representation from a dense (M, V) matrix."""
+        weights = np.asarray(weights, dtype=np.float64)
+        mask = weights != 0
+        indptr = np.concatenate([[0], np.cumsum(mask.sum(axis=1))]).astype(np.int64)
+        rows, cols = np.nonzero(mask)
+        return cls(
+            ids=list(ids),
+            voice_names=list(voice_names),
+            indptr=indptr,
+            indices=cols.astype(np.int32),
+            values=weights[rows, cols],
+            base_sha256=base_sha256,
+            base_path=base_path,
+        )
+
+
+def save_mix_weights(mix_weights: MixWeights, path: Path) -> Path:
+    """Write a virtual mix file (weights only, no voice data)."""
+    header = {
+        "format": VIRTUAL_MIX_FORMAT,
+        "version": VIRTUAL_MIX_VERSION,
+        "num_mixes": len(mix_weights.ids),
+        "num_voices": len(mix_weights.voice_names),
+        "base_sha256": mix_weights.base_sha256,
+        "base_path": mix_weights.base_path,
+    }
+    np.savez_compressed(
+        path,
+        header=np.array(json.dumps(header)),
+        ids=np.array(mix_weights.ids),
+        voice_names=np.array(mix_weights.voice_names),
+        indptr=mix_weights.indptr,
+        indices=mix_weights.indices,
+        values=mix_weights.values,
+    )
+    return path
+
+
+def load_mix_weights(path: Path) -> MixWeights:
+    """Read a virtual mix file written by save_mix_weights()."""
+    with np.load(path) as npz:
+        header = json.loads(str(npz["header"]))
+        if header.get("format") != VIRTUAL_MIX_FORMAT:
+            raise ValueError(f"{path} is not a virtual mix file")
+        if header.get("version", 0) > VIRTUAL_MIX_VERSION:
+            raise ValueError(
+                f"{path} uses virtual mix format v{header['version']}, "
+                f"this reader supports up to v{VIRTUAL_MIX_VERSION}"
+            )
+
+        return MixWeights(
+            ids=npz["ids"].tolist(),
+            voice_names=npz["voice_names"].tolist(),
+            indptr=npz["indptr"],
+            indices=npz["indices"],
+            values=npz["values"],
+            base_sha256=header["base_sha256"],
+            base_path=header.get("base_path"),
+        )
+
+
+def is_virtual_mix_file(path: Path) -> bool:
+    """Check whether a path refers to a virtual mix file."""
+    return str(path).endswith(VIRTUAL_MIX_SUFFIX)
+
+
+def resolve_base_voices(
+    mix_weights: MixWeights,
+    base_path: Optional[Path] = None,
+    verify: bool = True,
+    cache_dir: Optional[Path] = DEFAULT_CACHE_DIR,
+) -> tuple[list[str], np.ndarray]:
+    """
+    Load the base voice pack a virtual mix file was generated from.
+
+    Falls back to the path recorded in the file if base_path is not given.
+    With verify=True the pack's content hash must match the recorded one.
+    """
+    path = Path(base_path) if base_path is not None else None
+    if path is None and mix_weights.base_path:
+        path = Path(mix_weights.base_path)
+    if path is None or not path.exists():
+        raise FileNotFoundError(
+            "Base voice pack not found; pass the voices file the mixes were generated from"
+        )
+
+    pack = open_voice_pack(path, cache_dir)
+    if verify and pack.sha256 != mix_weights.base_sha256:
+        raise ValueError(
+            f"Base voice pack {path} (sha256 {pack.sha256[:12]}) does not match "
+            f"the pack these mixes were built from (sha256 {mix_weights.base_sha256[:12]})"
+        )
+
+    return mix_weights.voice_names, pack.stacked(mix_weights.voice_names)
+
+
+def rebuild_mixes(
+    mix_weights: MixWeights,
+    ids: list[str],
+    base_voices: np.ndarray,
+    chunk_size: int = 1024,
+    rows: Optional[Iterable[int]] = None,
+) -> np.ndarray:
+    """Rebuild the given mixes as a (k, 510, 1, 256) array (or only the given rows)."""
+    index = mix_weights.row_index()
+    missing = [mix_id for mix_id in ids if mix_id not in index]
+    if missing:
+        raise KeyError(f"Unknown mix IDs: {', '.join(missing[:5])}")
+    weights = mix_weights.dense(index[mix_id] for mix_id in ids)
+    return mix_batch(weights, base_voices, chunk_size, rows)
+
+
+def rebuild_mix(
+    mix_weights: MixWeights,
+    mix_id: str,
+    base_voices: np.ndarray,
+) -> np.ndarray:
+    """Rebuild a single mix as a (510, 1, 256) array."""
+    return rebuild_mixes(mix_weights, [mix_id], base_voices)[0]
+
+
+def is_mix_manifest(path: Path) -> bool:
+    """Check whether a path refers to a mix manifest."""
+    return str(path).endswith(MIX_MANIFEST_SUFFIX)
+
+
+def write_mix_manifest(
+    path: Path,
+    parts: list[dict],
+    rows: Optional[list[int]] = None,
+) -> Path:
+    """
+    Write a manifest over existing mix files.
+
+    Each part is {"data": path, "metadata": path, "ids": [...]}; paths are
+    stored relative to the manifest's directory. rows records that the
+    materialized parts hold only those style rows, in that order.
+    """
+    path = Path(path)
+    root = path.parent.resolve()
+
+    def relative(p) -> str:
+        p = Path(p).resolve()
+        return str(p.relative_to(root)) if p.is_relative_to(root) else str(p)
+
+    manifest = {
+        "format": MIX_MANIFEST_FORMAT,
+        # Only row-sliced manifests need a reader that knows about "rows"
+        "version": MIX_MANIFEST_VERSION if rows is not None else 1,
+        "generated_at": datetime.now().isoformat(),
+        "total_mixes": sum(len(part["ids"]) for part in parts),
+        "parts": [
+            {
+                "data": relative(part["data"]),
+                "metadata": relative(part["metadata"]),
+                "ids": list(part["ids"]),
+            }
+            for part in parts
+        ],
+    }
+    if rows is not None:
+        manifest["rows"] = list(rows)
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return path
+
+
+def load_mix_manifest(path: Path) -> dict:
+    """Read a manifest written by write_mix_manifest(), resolving part paths."""
+    path = Path(path)
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != MIX_MANIFEST_FORMAT:
+        raise ValueError(f"{path} is not a mix manifest")
+    if manifest.get("version", 0) > MIX_MANIFEST_VERSION:
+        raise ValueError(
+            f"{path} uses mix manifest v{manifest['version']}, "
+            f"this reader supports up to v{MIX_MANIFEST_VERSION}"
+        )
+
+    for part in manifest["parts"]:
+        part["data"] = path.parent / part["data"]
+        part["metadata"] = path.parent / part["metadata"]
+    return manifest
+
+
+def mix_index(manifest: dict) -> dict[str, tuple[int, int]]:
+    """Map every mix ID in a manifest to its (part, offset within part)."""
+    return {
+        mix_id: (part_index, offset)
+        for part_index, part in enumerate(manifest["parts"])
+        for offset, mix_id in enumerate(part["ids"])
+    }
+
+
+def shard_parts(num_parts: int, shard: int, num_shards: int) -> list[int]:
+    """
+    Manifest part indices handled by shard i of N (parts i, i + N, ...).
+
+    With a manifest written by voice_mixer.py --shards N this is exactly
+    part i.
+    """
+    if not 0 <= shard < num_shards:
+        raise ValueError(f"Shard {shard} out of range for {num_shards} shards")
+    if num_parts < num_shards:
+        raise ValueError(f"Cannot split {num_parts} manifest parts into {num_shards} shards")
+    return list(range(shard, num_parts, num_shards))
+
+
+def load_mix_metadata(path: Path, parts: Optional[Iterable[int]] = None) -> dict:
+    """
+    Load mix metadata from a *_metadata.json file or a mix manifest.
+
+    Always returns the metadata JSON layout ({"mixes": [...], ...}); for a
+    manifest the parts' mixes are concatenated in manifest order. parts
+    restricts a manifest to the given part indices, so only their metadata
+    files are read.
+    """
+    if not is_mix_manifest(path):
+        if parts is not None:
+            raise ValueError(f"{path} is not a mix manifest; parts need a manifest")
+        with open(path) as f:
+            return json.load(f)
+
+    manifest = load_mix_manifest(path)
+    selected = range(len(manifest["parts"])) if parts is None else parts
+    mixes = []
+    for part in (manifest["parts"][i] for i in selected):
+        with open(part["metadata"]) as f:
+            mixes.extend(json.load(f)["mixes"])
+    return {
+        "generated_at": manifest["generated_at"],
+        "total_mixes": len(mixes),
+        "mixes": mixes,
+    }
+
+
+class MixStore(Mapping):
+    """
+    Read-only mapping of mix ID -> (510, 1, 256) voice array, built lazily.
+
+    Works on virtual mix files (*.mixw.npz), materialized mix NPZ files and
+    manifests over either (*.manifest.json); for a manifest, parts limits
+    the store to the given part indices. A mix is only rebuilt (or
+    decompressed) when it is accessed, and materialized arrays are kept in
+    an LRU cache bounded by cache_bytes.
+
+    If the manifest records "rows", stored_rows lists them and every mix is
+    an (R, 1, 256) array of just those style rows. get_many() can also
+    select rows itself.
+
+    Usage:
+        store = MixStore("data/mixed/all_mixes.mixw.npz")
+        voice = store["mix_inter_0042"]
+        batch = store.get_many(["mix_inter_0001", "mix_inter_0002"])
+        rows = store.get_many(ids, rows=[24, 31, 47])  # (k, 3, 1, 256)
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        base_path: Optional[Path] = None,
+        cache_bytes: int = 256 * 1024 * 1024,
+        verify: bool = True,
+        cache_dir: Optional[Path] = DEFAULT_CACHE_DIR,
+        parts: Optional[Iterable[int]] = None,
+    ):
+        self.path = Path(path)
+        self.cache_bytes = cache_bytes
+        self._cache: OrderedDict[object, np.ndarray] = OrderedDict()
+        self._cached_bytes = 0
+        self._parts: list["MixStore"] = []
+        self.stored_rows: Optional[list[int]] = None
+
+        if parts is not None and not is_mix_manifest(self.path):
+            raise ValueError(f"{self.path} is not a mix manifest; parts need a manifest")
+
+        if is_mix_manifest(self.path):
+            self.weights = None
+            self._ids = []
+            self._rows = {}
+            manifest = load_mix_manifest(self.path)
+            manifest_parts = manifest["parts"]
+            self.stored_rows = manifest.get("rows")
+            selected = range(len(manifest_parts)) if parts is None else parts
+            for part in (manifest_parts[i] for i in selected):
+                # Parts share this store's cache instead of keeping their own
+                store = MixStore(part["data"], base_path, 0, verify, cache_dir)
+                store.stored_rows = self.stored_rows
+                for mix_id in store.ids:
+                    self._rows[mix_id] = len(self._parts)
+                    self._ids.append(mix_id)
+                self._parts.append(store)
+        elif is_virtual_mix_file(self.path):
+            self.weights: Optional[MixWeights] = load_mix_weights(self.path)
+            self._base_path = base_path
+            self._verify = verify
+            self._cache_dir = cache_dir
+            self._base: Optional[np.ndarray] = None
+            self._ids = self.weights.ids
+            self._rows = self.weights.row_index()
+        else:
+            self.weights = None
+            # Parsed once; every batch read reuses the member offsets
+            self._members = npz_directory(self.path)
+            self._ids = list(self._members)
+            self._rows = {mix_id: i for i, mix_id in enumerate(self._ids)}
+
+    @property
+    def is_virtual(self) -> bool:
+        if self._parts:
+            return all(part.is_virtual for part in self._parts)
+        return self.weights is not None
+
+    @property
+    def ids(self) -> list[str]:
+        return list(self._ids)
+
+    @property
+    def base_voices(self) -> np.ndarray:
+        """(V, 510, 256) base voice tensor, loaded on first use (virtual only)."""
+        if self._parts and self.is_virtual:
+            self._check_shared_base()
+            return self._parts[0].base_voices
+        if self.weights is None:
+            raise TypeError(f"{self.path} stores materialized mixes, not weights")
+        if self._base is None:
+            _, self._base = resolve_base_voices(
+                self.weights, self._base_path, self._verify, self._cache_dir
+            )
+        return self._base
+
+    def weight_matrix(self, ids: list[str]) -> tuple[list[str], np.ndarray]:
+        """
+        Exact mixing weights of the given mixes (virtual only).
+
+        Returns the base voice names, in base_voices order, and the dense
+        (k, V) weight rows as stored (not normalized).
+        """
+        missing = [mix_id for mix_id in ids if mix_id not in self._rows]
+        if missing:
+            raise KeyError(f"Unknown mix IDs: {', '.join(missing[:5])}")
+        if self._parts and self.is_virtual:
+            self._check_shared_base()
+            names = list(self._parts[0].weights.voice_names)
+            out = np.zeros((len(ids), len(names)))
+            by_part: dict[int, list[int]] = {}
+            for k, mix_id in enumerate(ids):
+                by_part.setdefault(self._rows[mix_id], []).append(k)
+            for part, positions in by_part.items():
+                part_ids = [ids[k] for k in positions]
+                out[positions] = self._parts[part].weight_matrix(part_ids)[1]
+            return names, out
+        if self.weights is None:
+            raise TypeError(f"{self.path} stores materialized mixes, not weights")
+        return list(self.weights.voice_names), self.weights.dense(self._rows[mix_id] for mix_id in ids)
+
+    def _check_shared_base(self) -> None:
+        first = self._parts[0].weights
+        for part in self._parts[1:]:
+            if (
+                part.weights.base_sha256 != first.base_sha256
+                or part.weights.voice_names != first.voice_names
+            ):
+                raise ValueError(f"Parts of {self.path} were built from different base voice packs")
+
+    def mix_weights(self, mix_id: str) -> Optional[dict[str, float]]:
+        """
+        Exact {base voice: weight} for a mix, or None if only the mixed array is stored.
+
+        Only virtual mixes keep their weights; for materialized mixes use the
+        rounded "components" in the metadata instead.
+        """
+        if mix_id not in self._rows:
+            raise KeyError(mix_id)
+        if self._parts:
+            return self._parts[self._rows[mix_id]].mix_weights(mix_id)
+        if self.weights is None:
+            return None
+        row = self._rows[mix_id]
+        start, end = self.weights.indptr[row], self.weights.indptr[row + 1]
+        return {
+            self.weights.voice_names[i]: float(w)
+            for i, w in zip(self.weights.indices[start:end], self.weights.values[start:end])
+        }
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __contains__(self, mix_id) -> bool:
+        return mix_id in self._rows
+
+    def __getitem__(self, mix_id: str) -> np.ndarray:
+        cached = self._cache_get(self._cache_key(mix_id, self.stored_rows))
+        if cached is not None:
+            return cached
+        if mix_id not in self._rows:
+            raise KeyError(mix_id)
+        return self.get_many([mix_id])[0]
+
+    def get_many(
+        self,
+        ids: list[str],
+        chunk_size: int = 1024,
+        rows: Optional[Iterable[int]] = None,
+    ) -> np.ndarray:
+        """
+        Materialize many mixes at once as a (k, 510, 1, 256) array.
+
+        For virtual mixes, every uncached mix is rebuilt with one batched
+        matrix product over its weight rows. With rows, only those style
+        rows are built (or read) and the result is (k, len(rows), 1, 256);
+        rows defaults to stored_rows.
+        """
+        missing = [mix_id for mix_id in ids if mix_id not in self._rows]
+        if missing:
+            raise KeyError(f"Unknown mix IDs: {', '.join(missing[:5])}")
+        rows = self.stored_rows if rows is None else [int(row) for row in rows]
+
+        found = {}
+        todo = []
+        for mix_id in dict.fromkeys(ids):
+            cached = self._cache_get(self._cache_key(mix_id, rows))
+            if cached is None:
+                todo.append(mix_id)
+            else:
+                found[mix_id] = cached
+
+        if todo:
+            if self._parts:
+                by_part: dict[int, list[str]] = {}
+                for mix_id in todo:
+                    by_part.setdefault(self._rows[mix_id], []).append(mix_id)
+                built_by_id = {}
+                for part, part_ids in by_part.items():
+                    built_by_id.update(
+                        zip(part_ids, self._parts[part].get_many(part_ids, chunk_size, rows))
+                    )
+                built = [built_by_id[mix_id] for mix_id in todo]
+            elif self.weights is not None:
+                weights = self.weights.dense(self._rows[mix_id] for mix_id in todo)
+                built = mix_batch(weights, self.base_voices, chunk_size, rows)
+            else:
+                arrays = read_npz(self.path, todo, directory=self._members)
+                built = [self._select_rows(data, rows) for data in arrays.values()]
+            for mix_id, data in zip(todo, built):
+                found[mix_id] = data
+                self._cache_put(self._cache_key(mix_id, rows), data)
+
+        if not ids:
+            return np.zeros((0, 510 if rows is None else len(rows), 1, 256), dtype=np.float32)
+        return np.stack([found[mix_id] for mix_id in ids])
+
+    def _cache_key(self, mix_id: str, rows: Optional[list[int]]) -> object:
+        return mix_id if rows == self.stored_rows else (mix_id, tuple(rows))
+
+    def _select_rows(self, data: np.ndarray, rows: Optional[list[int]]) -> np.ndarray:
+        """Pick style rows out of a stored (materialized) mix."""
+        if rows == self.stored_rows:
+            return data
+        stored = self.stored_rows if self.stored_rows is not None else range(data.shape[0])
+        position = {row: i for i, row in enumerate(stored)}
+        missing = [row for row in rows if row not in position]
+        if missing:
+            raise ValueError(f"{self.path} does not store style rows {missing[:5]}")
+        return data[[position[row] for row in rows]]
+
+    def _cache_get(self, key: object) -> Optional[np.ndarray]:
+        data = self._cache.get(key)
+        if data is not None:
+            self._cache.move_to_end(key)
+        return data
+
+    def _cache_put(self, key: object, data: np.ndarray) -> None:
+        if data.nbytes > self.cache_bytes:
+            return
+        # Own the memory so a cached mix does not pin a whole batch array
+        data = np.array(data, copy=True)
+        self._cache[key] = data
+        self._cached_bytes += data.nbytes
+        while self._cached_bytes > self.cache_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= evicted.nbytes
+
+    def clear_cache(self) -> None:
+        self._cache.clear()
+        self._cached_bytes = 0
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Incremental, Multi-threaded NPZ I/O for Kokoro Voice PCA
+
+np.savez_compressed needs every array in memory at once and deflates the
+members one after another on a single core. NpzWriter instead appends one
+member at a time and compresses members on a thread pool (zlib releases the
+GIL), writing them out in submission order. read_npz() is the matching
+reader: it inflates members in parallel.
+
+The archives are standard NPZ files (one deflated .npy member per array,
+Zip64 records when needed), readable by np.load and by koko's NpzReader.
+"""
+
+import io
+import os
+import struct
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+
+# Zip record layouts (same as the stdlib zipfile module)
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_CENTRAL_DIR = struct.Struct("<4s4B4HL2L5H2L")
+_END_ARCHIVE = struct.Struct("<4s4H2LH")
+_END_ARCHIVE64 = struct.Struct("<4sQ2H2L4Q")
+_END_ARCHIVE64_LOCATOR = struct.Struct("<4sLQL")
+
+_ZIP64_LIMIT = 0xFFFFFFFF
+_ZIP_FILECOUNT_LIMIT = 0xFFFF
+_UTF8_FLAG = 0x800
+
+
+def default_workers() -> int:
+    """Thread count used when workers is not given."""
+    return min(32, os.cpu_count() or 1)
+
+
+def _dos_datetime(timestamp: float) -> tuple[int, int]:
+    t = time.localtime(timestamp)
+    dos_date = (t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday
+    dos_time = t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2
+    return dos_time, dos_date
+
+
+def _encode_member(array: np.ndarray, compress: bool, level: int) -> tuple[bytes, int, int]:
+    """Serialize one array as .npy and deflate it. Runs on a worker thread."""
+    buf = io.BytesIO()
+    np.lib.format.write_array(buf, np.asanyarray(array), allow_pickle=False)
+    raw = buf.getbuffer()
+    crc = zlib.crc32(raw)
+    if compress:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        payload = compressor.compress(raw) + compressor.flush()
+    else:
+        payload = bytes(raw)
+    return payload, crc, raw.nbytes
+
+
+class NpzWriter:
+    """
+    Append arrays to an NPZ archive, compressing members on a thread pool.
+
+    At most a few members per worker are in flight, so memory stays flat in
+    the number of arrays written. The archive is written to "<path>.partial"
+    and renamed into place on a clean close, so an interrupted run never
+    leaves a truncated NPZ behind.
+
+    Usage:
+        with NpzWriter("all_mixes.npz", workers=8) as writer:
+            for name, array in produce():
+                writer.write(name, array)
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        compress: bool = True,
+        workers: Optional[int] = None,
+        level: int = zlib.Z_DEFAULT_COMPRESSION,
+    ):
+        self.path = Path(path)
+        self.count = 0
+        self.compress = compress
+        self.level = level
+        self.workers = workers or default_workers()
+        self._partial = self.path.with_name(self.path.name + ".partial")
+        self._file = open(self._partial, "wb")
+        self._names: set[str] = set()
+        self._central: list[bytes] = []
+        self._pending: deque = deque()
+        self._max_pending = 2 * self.workers
+        self._executor = (
+            ThreadPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        )
+        self._dos_time, self._dos_date = _dos_datetime(time.time())
+
+    def write(self, name: str, array: np.ndarray) -> None:
+        """Queue one array as member <name>.npy."""
+        if name in self._names:
+            raise ValueError(f"Duplicate array name in {self.path}: {name}")
+        self._names.add(name)
+
+        if self._executor is None:
+            self._write_member(name, *_encode_member(array, self.compress, self.level))
+            return
+
+        future = self._executor.submit(_encode_member, array, self.compress, self.level)
+        self._pending.append((name, future))
+        while len(self._pending) > self._max_pending:
+            self._drain_one()
+
+    def _drain_one(self) -> None:
+        name, future = self._pending.popleft()
+        self._write_member(name, *future.result())
+
+    def _write_member(self, name: str, payload: bytes, crc: int, size: int) -> None:
+        filename = f"{name}.npy".encode("utf-8")
+        flags = 0 if filename.isascii() else _UTF8_FLAG
+        method = zipfile.ZIP_DEFLATED if self.compress else zipfile.ZIP_STORED
+        offset = self._file.tell()
+        csize = len(payload)
+
+        zip64 = size >= _ZIP64_LIMIT or csize >= _ZIP64_LIMIT
+        local_extra = struct.pack("<HHQQ", 1, 16, size, csize) if zip64 else b""
+        version = 45 if zip64 else 20
+        self._file.write(_LOCAL_HEADER.pack(
+            b"PK\003\004", version, 0, flags, method, self._dos_time, self._dos_date,
+            crc,
+            _ZIP64_LIMIT if zip64 else csize,
+            _ZIP64_LIMIT if zip64 else size,
+            len(filename), len(local_extra),
+        ))
+        self._file.write(filename)
+        self._file.write(local_extra)
+        self._file.write(payload)
+
+        # Central directory entry; Zip64 fields are only added where needed
+        extra_fields = []
+        if size >= _ZIP64_LIMIT:
+            extra_fields.append(size)
+        if csize >= _ZIP64_LIMIT:
+            extra_fields.append(csize)
+        if offset >= _ZIP64_LIMIT:
+            extra_fields.append(offset)
+        central_extra = (
+            struct.pack(f"<HH{len(extra_fields)}Q", 1, 8 * len(extra_fields), *extra_fields)
+            if extra_fields
+            else b""
+        )
+        version = 45 if extra_fields else 20
+        self._central.append(
+            _CENTRAL_DIR.pack(
+                b"PK\001\002", version, 3, version, 0, flags, method,
+                self._dos_time, self._dos_date, crc,
+                min(csize, _ZIP64_LIMIT), min(size, _ZIP64_LIMIT),
+                len(filename), len(central_extra), 0, 0, 0,
+                0o644 << 16, min(offset, _ZIP64_LIMIT),
+            )
+            + filename
+            + central_extra
+        )
+        self.count += 1
+
+    def _write_central_directory(self) -> None:
+        cd_offset = self._file.tell()
+        for entry in self._central:
+            self._file.write(entry)
+        cd_size = self._file.tell() - cd_offset
+        n = len(self._central)
+
+        if n >= _ZIP_FILECOUNT_LIMIT or cd_offset >= _ZIP64_LIMIT or cd_size >= _ZIP64_LIMIT:
+            end64_offset = self._file.tell()
+            self._file.write(_END_ARCHIVE64.pack(
+                b"PK\006\006", _END_ARCHIVE64.size - 12, 45, 45, 0, 0,
+                n, n, cd_size, cd_offset,
+            ))
+            self._file.write(_END_ARCHIVE64_LOCATOR.pack(b"PK\006\007", 0, end64_offset, 1))
+
+        self._file.write(_END_ARCHIVE.pack(
+            b"PK\005\006", 0, 0,
+            min(n, _ZIP_FILECOUNT_LIMIT), min(n, _ZIP_FILECOUNT_LIMIT),
+            min(cd_size, _ZIP64_LIMIT), min(cd_offset, _ZIP64_LIMIT), 0,
+        ))
+
+    def close(self) -> Path:
+        """Write the remaining members and the zip directory, then move into place."""
+        if self._file is None:
+            return self.path
+        try:
+            while self._pending:
+                self._drain_one()
+            self._write_central_directory()
+        except BaseException:
+            self.abort()
+            raise
+        self._file.close()
+        self._file = None
+        if self._executor is not None:
+            self._executor.shutdown()
+        os.replace(self._partial, self.path)
+        return self.path
+
+    def abort(self) -> None:
+        """Discard the partially written archive."""
+        if self._file is None:
+            return
+        if self._executor is not None:
+            for _, future in self._pending:
+                future.cancel()
+            self._executor.shutdown()
+        self._pending.clear()
+        self._file.close()
+        self._file = None
+        self._partial.unlink(missing_ok=True)
+
+    def __enter__(self) -> "NpzWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def save_npz(
+    path: Path,
+    arrays: dict[str, np.ndarray],
+    compress: bool = True,
+    workers: Optional[int] = None,
+) -> Path:
+    """Multi-threaded drop-in for np.savez_compressed(path, **arrays)."""
+    with NpzWriter(path, compress=compress, workers=workers) as writer:
+        for name, array in arrays.items():
+            writer.write(name, array)
+    return writer.path
+
+
+def _read_member(path: Path, info: zipfile.ZipInfo) -> np.ndarray:
+    """Read and inflate one .npy member. Runs on a worker thread."""
+    with open(path, "rb") as f:
+        f.seek(info.header_offset)
+        header = f.read(_LOCAL_HEADER.size)
+        fields = _LOCAL_HEADER.unpack(header)
+        if fields[0] != b"PK\003\004":
+            raise ValueError(f"Bad local header for {info.filename} in {path}")
+        f.seek(fields[-2] + fields[-1], os.SEEK_CUR)
+        payload = f.read(info.compress_size)
+
+    if info.compress_type == zipfile.ZIP_DEFLATED:
+        payload = zlib.decompress(payload, -15)
+    elif info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f"Unsupported compression for {info.filename} in {path}")
+    if zlib.crc32(payload) != info.CRC:
+        raise ValueError(f"CRC mismatch for {info.filename} in {path}")
+
+    return np.lib.format.read_array(io.BytesIO(payload), allow_pickle=False)
+
+
+def npz_directory(path: Path) -> dict[str, zipfile.ZipInfo]:
+    """Parse an NPZ file's zip directory once: {array name: member info}, in archive order."""
+    with zipfile.ZipFile(path) as zf:
+        return {
+            info.filename[: -len(".npy")]: info
+            for info in zf.infolist()
+            if info.filename.endswith(".npy")
+        }
+
+
+def read_npz(
+    path: Path,
+    names: Optional[Iterable[str]] = None,
+    workers: Optional[int] = None,
+    directory: Optional[dict[str, zipfile.ZipInfo]] = None,
+) -> dict[str, np.ndarray]:
+    """
+    Read arrays from an NPZ file, inflating members on a thread pool.
+
+    Returns {name: array} for the requested names (default: all members),
+    in archive order when names is None and in request order otherwise.
+    Callers reading the same archive many times pass its npz_directory()
+    so the zip directory is not parsed again on every call.
+    """
+    path = Path(path)
+    members = npz_directory(path) if directory is None else directory
+
+    names = list(members) if names is None else list(names)
+    missing = [name for name in names if name not in members]
+    if missing:
+        raise KeyError(f"Arrays not found in {path}: {', '.join(missing[:5])}")
+
+    workers = workers or default_workers()
+    if workers <= 1 or len(names) < 2:
+        return {name: _read_member(path, members[name]) for name in names}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        arrays = executor.map(lambda name: _read_member(path, members[name]), names)
+        return dict(zip(names, arrays))
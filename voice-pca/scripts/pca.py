@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+PCA of the Kokoro Voice Space
+
+Every mix voice_mixer.py produces is a convex combination of the V base
+voices, x = w @ B, with B the (V, D) matrix of flattened base voices
+(D = 510 * 256, or R * 256 for selected style rows). The mix covariance is
+B^T S B, with S the (V, V) covariance of the weights, so its eigenvectors
+lie in the row space of B. fit_mix_pca() solves the problem in V dimensions
+from the Gram matrix B B^T: the PCA of any number of virtual mixes is exact
+and costs a single pass over the base voices.
+
+fit_pca() is the generic path for vectors that are not known mixes
+(materialized NPZ files, imported voice packs): an SVD of the centered data.
+
+Result Format (*.pca.npz):
+- header:      JSON string with the format version, method, sample count,
+               style rows and total variance
+- ids:         (N,) IDs of the analyzed vectors
+- mean:        (D,) mean vector
+- components:  (k, D) unit principal axes, by decreasing variance
+- explained_variance: (k,) variance along each component
+- scores:      (N, k) projection of each centered vector onto the components
+- voice_names, voice_loadings: (gram method only) each component as a
+               weighted sum of the flattened base voices
+"""
+
+import argparse
+import json
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from mix_store import MIX_MANIFEST_SUFFIX, MixStore, check_rows, load_token_rows, parse_rows
+
+
+PCA_FORMAT = "kokoro-pca"
+PCA_VERSION = 1
+PCA_SUFFIX = ".pca.npz"
+
+STYLE_DIM = 256
+
+
+@dataclass
+class PCAResult:
+    """Principal components of a set of voice vectors."""
+
+    ids: list[str]
+    mean: np.ndarray
+    components: np.ndarray
+    explained_variance: np.ndarray
+    total_variance: float
+    scores: np.ndarray
+    method: str
+    rows: Optional[list[int]] = None
+    voice_names: Optional[list[str]] = None
+    voice_loadings: Optional[np.ndarray] = None
+
+    @property
+    def explained_variance_ratio(self) -> np.ndarray:
+        if self.total_variance <= 0:
+            return np.zeros_like(self.explained_variance)
+        return self.explained_variance / self.total_variance
+
+    def component_voice(self, index: int) -> np.ndarray:
+        """Component index as an (R, 1, 256) style tensor, R = 510 or len(rows)."""
+        return self.components[index].reshape(-1, 1, STYLE_DIM)
+
+
+def component_signs(components: np.ndarray) -> np.ndarray:
+    """Per-component signs that make each component's largest entry positive."""
+    largest = components[np.arange(len(components)), np.abs(components).argmax(axis=1)]
+    return np.where(largest < 0, -1.0, 1.0)
+
+
+def _num_components(n_components: Optional[int], available: int) -> int:
+    if n_components is None:
+        return available
+    if n_components < 1:
+        raise ValueError("n_components must be at least 1")
+    return min(n_components, available)
+
+
+def fit_mix_pca(
+    weights: np.ndarray,
+    base_voices: np.ndarray,
+    ids: Optional[list[str]] = None,
+    n_components: Optional[int] = None,
+    rows: Optional[Iterable[int]] = None,
+) -> PCAResult:
+    """
+    Exact PCA of the mixes weights @ base_voices, without materializing them.
+
+    Args:
+        weights: (M, V) mixing weights; rows are normalized to sum to 1 as in
+            mix_store.mix_batch().
+        base_voices: (V, 510, 256) base voice tensor.
+        ids: Mix IDs (default: "0".."M-1").
+        n_components: Components to keep (default: one per direction the
+            base voices span; those past M - 1 have zero variance).
+        rows: Style rows to analyze (default: all).
+
+    Only the (V, V) Gram matrix of the base voices and (M, V) products are
+    computed; the components themselves are (k, V) @ (V, D).
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.ndim != 2 or weights.shape[1] != base_voices.shape[0]:
+        raise ValueError(
+            f"Weight matrix shape {weights.shape} does not match {base_voices.shape[0]} voices"
+        )
+    totals = weights.sum(axis=1, keepdims=True)
+    if np.any(totals <= 0):
+        raise ValueError("Every mix needs a positive total weight")
+    weights = weights / totals
+
+    if rows is not None:
+        rows = check_rows(rows, base_voices.shape[1])
+        base_voices = base_voices[:, rows, :]
+    flat = base_voices.reshape(base_voices.shape[0], -1).astype(np.float64)
+
+    # B = U diag(root) Q^T with Q (D, r) orthonormal; drop directions the
+    # base voices do not span
+    lam, u = np.linalg.eigh(flat @ flat.T)
+    keep = lam > lam.max() * len(lam) * np.finfo(np.float64).eps
+    u, root = u[:, keep], np.sqrt(lam[keep])
+
+    # Centered mixes in the Q basis, and their (r, r) covariance
+    mean_weights = weights.mean(axis=0)
+    coords = (weights - mean_weights) @ (u * root)
+    cov = coords.T @ coords / max(len(weights) - 1, 1)
+    variance, z = np.linalg.eigh(cov)
+    order = np.argsort(variance)[::-1][:_num_components(n_components, len(variance))]
+    variance, z = np.clip(variance[order], 0.0, None), z[:, order]
+
+    # Component i = Q z_i = B^T (U / root) z_i
+    loadings = ((u / root) @ z).T
+    components = loadings @ flat
+    signs = component_signs(components)
+    components *= signs[:, None]
+    loadings *= signs[:, None]
+
+    return PCAResult(
+        ids=list(ids) if ids is not None else [str(i) for i in range(len(weights))],
+        mean=mean_weights @ flat,
+        components=components,
+        explained_variance=variance,
+        total_variance=float(np.trace(cov)),
+        scores=coords @ (z * signs),
+        method="gram",
+        rows=rows,
+        voice_loadings=loadings,
+    )
+
+
+def fit_pca(
+    data: np.ndarray,
+    ids: Optional[list[str]] = None,
+    n_components: Optional[int] = None,
+    rows: Optional[list[int]] = None,
+) -> PCAResult:
+    """
+    PCA of arbitrary voice vectors by SVD of the centered data.
+
+    data is (N, ...) with one voice per entry, e.g. (N, 510, 1, 256); each
+    voice is flattened. rows only labels the result (data is already
+    sliced). Memory is a few copies of the (N, D) matrix.
+    """
+    data = np.asarray(data)
+    x = data.reshape(len(data), -1).astype(np.float64)
+    mean = x.mean(axis=0)
+    x -= mean
+
+    u, s, vt = np.linalg.svd(x, full_matrices=False)
+    k = _num_components(n_components, len(s))
+    dof = max(len(x) - 1, 1)
+    signs = component_signs(vt[:k])
+
+    return PCAResult(
+        ids=list(ids) if ids is not None else [str(i) for i in range(len(x))],
+        mean=mean,
+        components=vt[:k] * signs[:, None],
+        explained_variance=s[:k] ** 2 / dof,
+        total_variance=float(np.sum(s ** 2) / dof),
+        scores=u[:, :k] * (s[:k] * signs),
+        method="svd",
+        rows=list(rows) if rows is not None else None,
+    )
+
+
+def pca_of_store(
+    store: MixStore,
+    ids: Optional[list[str]] = None,
+    n_components: Optional[int] = None,
+    rows: Optional[Iterable[int]] = None,
+    method: str = "auto",
+    chunk_size: int = 1024,
+) -> PCAResult:
+    """
+    PCA of the mixes in a MixStore.
+
+    method "auto" uses the exact Gram path for virtual (weights-only) mixes
+    and the generic SVD for materialized ones; rows defaults to the store's
+    stored_rows.
+    """
+    ids = store.ids if ids is None else list(ids)
+    rows = store.stored_rows if rows is None else list(rows)
+    if method == "auto":
+        method = "gram" if store.is_virtual else "svd"
+
+    if method == "gram":
+        voice_names, weights = store.weight_matrix(ids)
+        result = fit_mix_pca(weights, store.base_voices, ids, n_components, rows)
+        result.voice_names = voice_names
+        return result
+    if method == "svd":
+        return fit_pca(store.get_many(ids, chunk_size, rows), ids, n_components, rows)
+    raise ValueError(f"Unknown PCA method {method!r}")
+
+
+def save_pca_result(result: PCAResult, path: Path) -> Path:
+    """Write a PCA result (*.pca.npz); components and mean are stored as float32."""
+    header = {
+        "format": PCA_FORMAT,
+        "version": PCA_VERSION,
+        "method": result.method,
+        "num_samples": len(result.ids),
+        "num_components": len(result.components),
+        "rows": result.rows,
+        "total_variance": result.total_variance,
+    }
+    arrays = {
+        "header": np.array(json.dumps(header)),
+        "ids": np.array(result.ids),
+        "mean": result.mean.astype(np.float32),
+        "components": result.components.astype(np.float32),
+        "explained_variance": result.explained_variance,
+        "scores": result.scores,
+    }
+    if result.voice_loadings is not None:
+        arrays["voice_names"] = np.array(result.voice_names or [])
+        arrays["voice_loadings"] = result.voice_loadings
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(path, **arrays)
+    return path
+
+
+def load_pca_result(path: Path) -> PCAResult:
+    """Read a PCA result written by save_pca_result()."""
+    with np.load(path) as npz:
+        header = json.loads(str(npz["header"]))
+        if header.get("format") != PCA_FORMAT:
+            raise ValueError(f"{path} is not a PCA result")
+        if header.get("version", 0) > PCA_VERSION:
+            raise ValueError(
+                f"{path} uses PCA format v{header['version']}, "
+                f"this reader supports up to v{PCA_VERSION}"
+            )
+
+        return PCAResult(
+            ids=npz["ids"].tolist(),
+            mean=npz["mean"],
+            components=npz["components"],
+            explained_variance=npz["explained_variance"],
+            total_variance=header["total_variance"],
+            scores=npz["scores"],
+            method=header["method"],
+            rows=header.get("rows"),
+            voice_names=npz["voice_names"].tolist() if "voice_names" in npz else None,
+            voice_loadings=npz["voice_loadings"] if "voice_loadings" in npz else None,
+        )
+
+
+def print_summary(result: PCAResult, top_voices: int = 3) -> None:
+    """Print explained variance per component (and top base voices for the gram path)."""
+    ratio = result.explained_variance_ratio
+    print(f"{'PC':>4} {'variance':>12} {'ratio':>8} {'cumul.':>8}")
+    for i, (variance, share, total) in enumerate(
+        zip(result.explained_variance, ratio, np.cumsum(ratio))
+    ):
+        line = f"{i + 1:>4} {variance:>12.6g} {share:>8.2%} {total:>8.2%}"
+        if result.voice_loadings is not None and result.voice_names:
+            top = np.argsort(-np.abs(result.voice_loadings[i]))[:top_voices]
+            line += "  " + " ".join(
+                f"{result.voice_names[j]}:{result.voice_loadings[i, j]:+.3g}" for j in top
+            )
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PCA of mixed voice vectors")
+    parser.add_argument(
+        "--mixes",
+        type=Path,
+        default=Path(__file__).parent.parent / "data" / "mixed" / f"all_mixes{MIX_MANIFEST_SUFFIX}",
+        help="Mix file or manifest (virtual mixes use the exact Gram path), or any voices NPZ",
+    )
+    parser.add_argument(
+        "--voices",
+        type=Path,
+        help="Base voice pack of virtual mixes (default: the path recorded in the mix file)",
+    )
+    parser.add_argument(
+        "--components",
+        type=int,
+        default=10,
+        help="Number of principal components to keep",
+    )
+    parser.add_argument(
+        "--method",
+        choices=["auto", "gram", "svd"],
+        default="auto",
+        help="gram: exact PCA from mixing weights (virtual mixes only); "
+        "svd: generic PCA of the voice vectors; auto: gram when possible",
+    )
+    parser.add_argument(
+        "--rows",
+        type=parse_rows,
+        help="Only analyze these style rows, e.g. \"24,31,40-47\"",
+    )
+    parser.add_argument(
+        "--rows-from",
+        type=Path,
+        help="Only analyze the style rows koko reads for the texts in a phonemes file",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=1024,
+        help="Mixes materialized per batched matrix product (svd method)",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path(__file__).parent.parent / "data" / "pca" / f"mix_pca{PCA_SUFFIX}",
+        help="Output PCA result file",
+    )
+
+    args = parser.parse_args()
+
+    rows = None
+    if args.rows is not None or args.rows_from is not None:
+        rows = sorted(set(args.rows or []) | set(load_token_rows(args.rows_from) if args.rows_from else []))
+
+    store = MixStore(args.mixes, base_path=args.voices, cache_bytes=0)
+    print(f"Analyzing {len(store)} voices from {args.mixes}")
+    if rows is not None:
+        print(f"Style rows: {rows}")
+
+    start = time.perf_counter()
+    result = pca_of_store(store, None, args.components, rows, args.method, args.chunk_size)
+    elapsed = time.perf_counter() - start
+    print(f"PCA ({result.method}) took {elapsed * 1000:.1f} ms\n")
+
+    print_summary(result)
+    save_pca_result(result, args.output)
+    print(f"\nSaved PCA result to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,8 @@ import json
 from pathlib import Path
 from urllib.parse import quote
 
+from mix_store import load_mix_metadata
+
 
 def create_label_studio_tasks(
     metadata_path: Path,
@@ -27,7 +29,7 @@ def create_label_studio_tasks(
     Create Label Studio tasks JSON from metadata and audio files.
 
     Args:
-        metadata_path: Path to all_mixes_metadata.json
+        metadata_path: Path to a metadata JSON or mix manifest (all_mixes.manifest.json)
         audio_dir: Directory containing audio files
         output_path: Output JSON file path
         audio_url_prefix: URL prefix for audio files in Label Studio
@@ -36,8 +38,7 @@ def create_label_studio_tasks(
         Number of tasks created
     """
     # Load metadata
-    with open(metadata_path) as f:
-        metadata = json.load(f)
+    metadata = load_mix_metadata(metadata_path)
 
     mixes = metadata["mixes"]
     tasks = []
@@ -159,8 +160,8 @@ def main():
     parser.add_argument(
         "--metadata",
         type=Path,
-        default=Path(__file__).parent.parent / "data" / "mixed" / "all_mixes_metadata.json",
-        help="Path to metadata JSON",
+        default=Path(__file__).parent.parent / "data" / "mixed" / "all_mixes.manifest.json",
+        help="Path to metadata JSON or mix manifest",
     )
     parser.add_argument(
         "--audio-dir",
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Per-Token-Length PCA for Kokoro Voice PCA
+
+koko reads one 256-dim style row per token chunk, style[len(tokens)], so
+each of the 510 rows is its own style space. This module computes a
+separate PCA for every row at once: the (R, 256, 256) stack of per-row
+covariances is built with batched matrix products and decomposed with a
+single batched np.linalg.eigh, with no Python loop over rows.
+- gram: virtual mixes; every row covariance is B_r^T S B_r from the weight
+  covariance S, exact for any number of mixes
+- stream: any voice vectors, accumulated batch by batch
+
+Drift across lengths is measured by subspace similarity, the mean squared
+cosine of the principal angles between two rows' top-k components (1 =
+same subspace, about k/256 = unrelated). Rows whose similarity to the first
+row of their run stays above a threshold are grouped; each group can share
+one basis.
+
+Result Format (*.rowpca.npz):
+- header:      JSON string with the format version, method, sample count
+               and grouping threshold
+- rows:        (R,) style rows
+- mean:        (R, 256) per-row mean
+- components:  (R, k, 256) per-row principal axes, by decreasing variance
+- explained_variance: (R, k)
+- total_variance: (R,)
+- similarity:  (R, R) subspace similarity between rows
+"""
+
+import argparse
+import json
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from mix_store import MIX_MANIFEST_SUFFIX, MixStore, check_rows, load_token_rows, parse_rows
+
+
+ROW_PCA_FORMAT = "kokoro-row-pca"
+ROW_PCA_VERSION = 1
+ROW_PCA_SUFFIX = ".rowpca.npz"
+
+STYLE_DIM = 256
+
+
+@dataclass
+class RowPCAResult:
+    """A PCA per style row, plus how the components drift between rows."""
+
+    rows: list[int]
+    mean: np.ndarray
+    components: np.ndarray
+    explained_variance: np.ndarray
+    total_variance: np.ndarray
+    num_samples: int
+    method: str
+
+    @property
+    def explained_variance_ratio(self) -> np.ndarray:
+        total = np.where(self.total_variance > 0, self.total_variance, 1.0)
+        return self.explained_variance / total[:, None]
+
+    def similarity(self) -> np.ndarray:
+        """(R, R) subspace similarity between the rows' components."""
+        return subspace_similarity(self.components, self.components)
+
+    def adjacent_similarity(self) -> np.ndarray:
+        """(R - 1,) subspace similarity between consecutive rows."""
+        overlap = np.einsum("rkd,rjd->rkj", self.components[:-1], self.components[1:])
+        return np.sum(overlap ** 2, axis=(1, 2)) / self.components.shape[1]
+
+    def component_drift(self) -> np.ndarray:
+        """(R - 1, k) |cosine| between component j of consecutive rows."""
+        return np.abs(np.einsum("rkd,rkd->rk", self.components[:-1], self.components[1:]))
+
+    def transform(self, data: np.ndarray) -> np.ndarray:
+        """Scores of (N, R, 1, 256) voices against every row's components: (N, R, k)."""
+        x = np.asarray(data, dtype=np.float64).reshape(len(data), len(self.rows), STYLE_DIM)
+        return np.einsum("nrd,rkd->nrk", x - self.mean, self.components)
+
+
+def subspace_similarity(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Mean squared cosine of the principal angles between (R, k, D) and (S, k, D) bases.
+
+    Returns an (R, S) matrix: ||A_r B_s^T||_F^2 / k.
+    """
+    (r, k, d), s = a.shape, b.shape[0]
+    overlap = (a.reshape(r * k, d) @ b.reshape(s * k, d).T).reshape(r, k, s, k)
+    return np.sum(overlap ** 2, axis=(1, 3)) / k
+
+
+def share_basis_groups(
+    similarity: np.ndarray,
+    rows: list[int],
+    threshold: float = 0.9,
+) -> list[list[int]]:
+    """
+    Split rows into runs whose similarity to the run's first row is >= threshold.
+
+    Each run can share the first row's basis (or a basis fit to the run).
+    """
+    groups = []
+    start = 0
+    for i in range(1, len(rows) + 1):
+        if i == len(rows) or similarity[start, i] < threshold:
+            groups.append(rows[start:i])
+            start = i
+    return groups
+
+
+def _fit_from_covariance(
+    cov: np.ndarray,
+    mean: np.ndarray,
+    rows: list[int],
+    n_components: int,
+    num_samples: int,
+    method: str,
+) -> RowPCAResult:
+    """Batched eigendecomposition of an (R, 256, 256) covariance stack."""
+    variance, vectors = np.linalg.eigh(cov)
+    k = min(n_components, cov.shape[-1])
+    variance = np.clip(variance[:, ::-1][:, :k], 0.0, None)
+    components = np.swapaxes(vectors[:, :, ::-1][:, :, :k], 1, 2)
+
+    # Make each component's largest entry positive, as pca.component_signs()
+    largest = np.take_along_axis(
+        components, np.abs(components).argmax(axis=2)[:, :, None], axis=2
+    )
+    components *= np.where(largest < 0, -1.0, 1.0)
+
+    return RowPCAResult(
+        rows=rows,
+        mean=mean,
+        components=components,
+        explained_variance=variance,
+        total_variance=np.trace(cov, axis1=1, axis2=2),
+        num_samples=num_samples,
+        method=method,
+    )
+
+
+def fit_row_pca_mixes(
+    weights: np.ndarray,
+    base_voices: np.ndarray,
+    n_components: int = 10,
+    rows: Optional[Iterable[int]] = None,
+) -> RowPCAResult:
+    """
+    Exact per-row PCA of the mixes weights @ base_voices.
+
+    weights is (M, V), normalized per mix like mix_store.mix_batch();
+    base_voices is (V, 510, 256). Each row's covariance is B_r^T S B_r,
+    computed for all rows in one batched product.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.ndim != 2 or weights.shape[1] != base_voices.shape[0]:
+        raise ValueError(
+            f"Weight matrix shape {weights.shape} does not match {base_voices.shape[0]} voices"
+        )
+    totals = weights.sum(axis=1, keepdims=True)
+    if np.any(totals <= 0):
+        raise ValueError("Every mix needs a positive total weight")
+    weights = weights / totals
+
+    rows = check_rows(range(base_voices.shape[1]) if rows is None else rows, base_voices.shape[1])
+    base = np.asarray(base_voices[:, rows, :], dtype=np.float64)
+
+    centered = weights - weights.mean(axis=0)
+    weight_cov = centered.T @ centered / max(len(weights) - 1, 1)
+    num_voices = base.shape[0]
+    weighted = (weight_cov @ base.reshape(num_voices, -1)).reshape(base.shape)
+    # (R, 256, V) @ (R, V, 256): every row's B_r^T S B_r in one batched matmul
+    cov = base.transpose(1, 2, 0) @ weighted.transpose(1, 0, 2)
+    mean = np.einsum("v,vrd->rd", weights.mean(axis=0), base)
+
+    return _fit_from_covariance(cov, mean, rows, n_components, len(weights), "gram")
+
+
+def fit_row_pca_stream(
+    store: MixStore,
+    ids: Optional[list[str]] = None,
+    n_components: int = 10,
+    rows: Optional[Iterable[int]] = None,
+    batch_size: int = 256,
+) -> RowPCAResult:
+    """
+    Per-row PCA of any voices in a MixStore, accumulated batch by batch.
+
+    Memory is the (R, 256, 256) covariance stack plus one (R, batch, 256)
+    batch; voices are shifted by the first batch's mean before accumulating.
+    """
+    ids = store.ids if ids is None else list(ids)
+    if not ids:
+        raise ValueError("No voices to analyze")
+    rows = store.stored_rows if rows is None else list(rows)
+
+    cov = shift = total = None
+    for start in range(0, len(ids), batch_size):
+        batch = store.get_many(ids[start:start + batch_size], rows=rows)
+        x = batch.reshape(len(batch), batch.shape[1], STYLE_DIM).astype(np.float64)
+        x = x.transpose(1, 0, 2)                              # (R, n, 256)
+        if shift is None:
+            shift = x.mean(axis=1, keepdims=True)
+            cov = np.zeros((x.shape[0], STYLE_DIM, STYLE_DIM))
+            total = np.zeros((x.shape[0], STYLE_DIM))
+        x -= shift
+        cov += np.swapaxes(x, 1, 2) @ x
+        total += x.sum(axis=1)
+
+    count = len(ids)
+    mean = total / count
+    cov = (cov - count * np.einsum("rd,re->rde", mean, mean)) / max(count - 1, 1)
+    rows = list(range(cov.shape[0])) if rows is None else rows
+    return _fit_from_covariance(cov, shift[:, 0] + mean, rows, n_components, count, "stream")
+
+
+def row_pca_of_store(
+    store: MixStore,
+    ids: Optional[list[str]] = None,
+    n_components: int = 10,
+    rows: Optional[Iterable[int]] = None,
+    method: str = "auto",
+    batch_size: int = 256,
+) -> RowPCAResult:
+    """Per-row PCA of a MixStore: exact from weights for virtual mixes, else streamed."""
+    ids = store.ids if ids is None else list(ids)
+    rows = store.stored_rows if rows is None else list(rows)
+    if method == "auto":
+        method = "gram" if store.is_virtual else "stream"
+    if method == "gram":
+        _, weights = store.weight_matrix(ids)
+        return fit_row_pca_mixes(weights, store.base_voices, n_components, rows)
+    if method == "stream":
+        return fit_row_pca_stream(store, ids, n_components, rows, batch_size)
+    raise ValueError(f"Unknown row PCA method {method!r}")
+
+
+def save_row_pca_result(result: RowPCAResult, path: Path, threshold: float = 0.9) -> Path:
+    """Write a per-row PCA result (*.rowpca.npz) with its row similarity matrix."""
+    header = {
+        "format": ROW_PCA_FORMAT,
+        "version": ROW_PCA_VERSION,
+        "method": result.method,
+        "num_samples": result.num_samples,
+        "num_components": result.components.shape[1],
+        "threshold": threshold,
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(
+        path,
+        header=np.array(json.dumps(header)),
+        rows=np.array(result.rows),
+        mean=result.mean.astype(np.float32),
+        components=result.components.astype(np.float32),
+        explained_variance=result.explained_variance,
+        total_variance=result.total_variance,
+        similarity=result.similarity().astype(np.float32),
+    )
+    return path
+
+
+def load_row_pca_result(path: Path) -> RowPCAResult:
+    """Read a per-row PCA result written by save_row_pca_result()."""
+    with np.load(path) as npz:
+        header = json.loads(str(npz["header"]))
+        if header.get("format") != ROW_PCA_FORMAT:
+            raise ValueError(f"{path} is not a per-row PCA result")
+        if header.get("version", 0) > ROW_PCA_VERSION:
+            raise ValueError(
+                f"{path} uses per-row PCA format v{header['version']}, "
+                f"this reader supports up to v{ROW_PCA_VERSION}"
+            )
+
+        return RowPCAResult(
+            rows=npz["rows"].tolist(),
+            mean=npz["mean"],
+            components=npz["components"].astype(np.float64),
+            explained_variance=npz["explained_variance"],
+            total_variance=npz["total_variance"],
+            num_samples=header["num_samples"],
+            method=header["method"],
+        )
+
+
+def print_drift_report(result: RowPCAResult, threshold: float = 0.9, max_groups: int = 20) -> None:
+    """Print explained variance by row, component drift and the shared-basis groups."""
+    k = result.components.shape[1]
+    ratio = result.explained_variance_ratio.sum(axis=1)
+    print(f"Top {k} components explain {ratio.min():.1%} - {ratio.max():.1%} of each row's variance")
+
+    if len(result.rows) > 1:
+        adjacent = result.adjacent_similarity()
+        worst = int(np.argmin(adjacent))
+        print(
+            f"Adjacent-row subspace similarity: median {np.median(adjacent):.3f}, "
+            f"min {adjacent[worst]:.3f} (rows {result.rows[worst]} -> {result.rows[worst + 1]})"
+        )
+        drift = result.component_drift().mean(axis=0)
+        print("Mean |cos| between consecutive rows, per component: "
+              + " ".join(f"PC{j + 1}:{c:.2f}" for j, c in enumerate(drift)))
+
+    groups = share_basis_groups(result.similarity(), result.rows, threshold)
+    print(f"\n{len(groups)} row groups share a basis at similarity >= {threshold}:")
+    for group in groups[:max_groups]:
+        span = f"{group[0]}" if len(group) == 1 else f"{group[0]}-{group[-1]}"
+        print(f"  rows {span:>9} ({len(group)} rows)")
+    if len(groups) > max_groups:
+        print(f"  ... {len(groups) - max_groups} more")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-token-length (per style row) PCA")
+    parser.add_argument(
+        "--mixes",
+        type=Path,
+        default=Path(__file__).parent.parent / "data" / "mixed" / f"all_mixes{MIX_MANIFEST_SUFFIX}",
+        help="Mix file or manifest (virtual mixes are analyzed exactly), or any voices NPZ",
+    )
+    parser.add_argument(
+        "--voices",
+        type=Path,
+        help="Base voice pack of virtual mixes (default: the path recorded in the mix file)",
+    )
+    parser.add_argument(
+        "--components",
+        type=int,
+        default=10,
+        help="Principal components kept per row",
+    )
+    parser.add_argument(
+        "--method",
+        choices=["auto", "gram", "stream"],
+        default="auto",
+        help="gram: exact from mixing weights (virtual mixes only); "
+        "stream: accumulate the voices batch by batch; auto: gram when possible",
+    )
+    parser.add_argument(
+        "--rows",
+        type=parse_rows,
+        help="Only analyze these style rows, e.g. \"24,31,40-47\" (default: all)",
+    )
+    parser.add_argument(
+        "--rows-from",
+        type=Path,
+        help="Only analyze the style rows koko reads for the texts in a phonemes file",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.9,
+        help="Subspace similarity at which consecutive rows share a basis",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=256,
+        help="Voices per batch (stream method)",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path(__file__).parent.parent / "data" / "pca" / f"row_pca{ROW_PCA_SUFFIX}",
+        help="Output per-row PCA result file",
+    )
+
+    args = parser.parse_args()
+
+    rows = None
+    if args.rows is not None or args.rows_from is not None:
+        rows = sorted(set(args.rows or []) | set(load_token_rows(args.rows_from) if args.rows_from else []))
+
+    store = MixStore(args.mixes, base_path=args.voices, cache_bytes=0)
+    print(f"Analyzing {len(store)} voices from {args.mixes}")
+
+    start = time.perf_counter()
+    result = row_pca_of_store(store, None, args.components, rows, args.method, args.batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"Per-row PCA ({result.method}) of {len(result.rows)} rows took {elapsed:.2f} s\n")
+
+    print_drift_report(result, args.threshold)
+    save_row_pca_result(result, args.output, args.threshold)
+    print(f"\nSaved per-row PCA result to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Out-of-Core PCA for Kokoro Voice PCA
+
+pca.py's exact path needs mixing weights. Any other voice vectors (imported
+packs, perturbed voices, materialized mixes) are streamed here in batches,
+so the full (N, 510*256) matrix is never built:
+- covariance: one pass accumulating the (D, D) covariance, then one pass for
+  the scores. Exact; used when the covariance fits the memory limit (e.g.
+  with a few style rows).
+- randomized: block power iteration on the covariance with k + oversample
+  random directions (Halko et al.), one pass per iteration, then a final
+  pass that projects every vector and solves the small Rayleigh-Ritz
+  problem. Memory is O(D * (k + oversample)) plus one batch.
+
+Vectors are shifted by the first batch's mean before accumulating, which
+keeps the one-pass covariance numerically sound. Progress is checkpointed
+to an NPZ file every few batches; rerunning the same command resumes from
+it. The result is a pca.PCAResult, saved in the same *.pca.npz format.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from mix_store import MIX_MANIFEST_SUFFIX, MixStore, load_token_rows, parse_rows
+from pca import PCA_SUFFIX, PCAResult, component_signs, print_summary, save_pca_result
+
+
+CHECKPOINT_FORMAT = "kokoro-pca-checkpoint"
+CHECKPOINT_VERSION = 1
+
+# Bytes per vector element in a batch: the float32 read, its float64 copy
+# and temporaries
+BATCH_BYTES_PER_VALUE = 24
+
+
+def working_memory(method: str, dim: int, rank: int, num_samples: int) -> int:
+    """Bytes held across batches: accumulators, basis and projections."""
+    if method == "covariance":
+        # Accumulator plus eigh's copy and eigenvectors
+        fixed = 3 * dim * dim * 8
+    else:
+        # Basis and accumulator
+        fixed = 2 * dim * rank * 8
+    return fixed + num_samples * rank * 8 + 4 * dim * 8
+
+
+def plan_batch_size(
+    method: str,
+    dim: int,
+    rank: int,
+    num_samples: int,
+    memory_limit: int,
+) -> int:
+    """Largest batch of vectors that keeps the run under memory_limit bytes."""
+    free = memory_limit - working_memory(method, dim, rank, num_samples)
+    if free < dim * BATCH_BYTES_PER_VALUE:
+        raise MemoryError(
+            f"{method} PCA of {num_samples} x {dim} vectors needs more than "
+            f"{memory_limit / 1024 ** 3:.2f} GB; raise the memory limit or use fewer rows/components"
+        )
+    return int(min(free // (dim * BATCH_BYTES_PER_VALUE), num_samples))
+
+
+def _ids_sha256(ids: list[str]) -> str:
+    return hashlib.sha256("\n".join(ids).encode()).hexdigest()
+
+
+def _save_checkpoint(path: Path, header: dict, state: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(
+                f,
+                header=np.array(json.dumps(header)),
+                **{k: np.asarray(v) for k, v in state.items() if v is not None},
+            )
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _load_checkpoint(path: Path, header: dict) -> Optional[dict]:
+    """State saved for the same run, or None if there is no checkpoint."""
+    if not path.exists():
+        return None
+    with np.load(path) as npz:
+        stored = json.loads(str(npz["header"]))
+        if stored != header:
+            raise ValueError(
+                f"Checkpoint {path} belongs to a different PCA run; delete it to start over"
+            )
+        state = {k: npz[k] for k in npz.files if k != "header"}
+    for key in ("stage", "position", "count"):
+        state[key] = int(state[key])
+    state["sumsq"] = float(state["sumsq"])
+    for key in ("shift", "basis", "accum"):
+        state.setdefault(key, None)
+    return state
+
+
+def fit_streaming_pca(
+    store: MixStore,
+    n_components: int = 10,
+    ids: Optional[list[str]] = None,
+    rows: Optional[Iterable[int]] = None,
+    method: str = "auto",
+    oversample: int = 10,
+    n_iter: int = 4,
+    memory_limit: int = 4 * 1024 ** 3,
+    batch_size: Optional[int] = None,
+    checkpoint_path: Optional[Path] = None,
+    checkpoint_every: int = 20,
+    seed: int = 0,
+) -> PCAResult:
+    """
+    PCA of the voices in a MixStore, reading them batch by batch.
+
+    Args:
+        store: Any MixStore (NPZ file, manifest over shards, virtual mixes).
+        n_components: Components to keep.
+        ids: Voices to analyze (default: all).
+        rows: Style rows to analyze (default: the store's stored_rows, or all).
+        method: "covariance", "randomized", or "auto" (covariance when it
+            fits in half the memory limit).
+        oversample, n_iter: Extra random directions and power iterations of
+            the randomized method.
+        memory_limit: Approximate cap in bytes; sets the batch size.
+        batch_size: Voices per batch (default: as large as the limit allows;
+            larger values raise MemoryError).
+        checkpoint_path: NPZ file for resumable progress (deleted on success).
+        checkpoint_every: Batches between checkpoints.
+        seed: Seed of the random starting directions.
+    """
+    ids = store.ids if ids is None else list(ids)
+    rows = store.stored_rows if rows is None else list(rows)
+    if not ids:
+        raise ValueError("No voices to analyze")
+    num_samples = len(ids)
+    dim = int(np.prod(store.get_many(ids[:1], rows=rows).shape[1:]))
+
+    if method == "auto":
+        covariance_bytes = working_memory("covariance", dim, n_components, num_samples)
+        method = "covariance" if covariance_bytes <= memory_limit // 2 else "randomized"
+    if method not in ("covariance", "randomized"):
+        raise ValueError(f"Unknown streaming PCA method {method!r}")
+    n_components = min(n_components, num_samples, dim)
+    rank = n_components if method == "covariance" else min(n_components + oversample, num_samples, dim)
+    planned = plan_batch_size(method, dim, rank, num_samples, memory_limit)
+    if batch_size is None:
+        batch_size = planned
+    elif batch_size > planned:
+        raise MemoryError(
+            f"{method} PCA of {num_samples} x {dim} vectors in batches of {batch_size} needs more "
+            f"than {memory_limit / 1024 ** 3:.2f} GB; use --batch-size {planned} or less, "
+            "or raise the memory limit"
+        )
+    num_stages = 2 if method == "covariance" else n_iter + 1
+
+    header = {
+        "format": CHECKPOINT_FORMAT,
+        "version": CHECKPOINT_VERSION,
+        "method": method,
+        "ids_sha256": _ids_sha256(ids),
+        "num_samples": num_samples,
+        "dim": dim,
+        "rows": rows,
+        "rank": rank,
+        "n_iter": n_iter,
+        "seed": seed,
+    }
+    checkpoint_path = Path(checkpoint_path) if checkpoint_path is not None else None
+    state = _load_checkpoint(checkpoint_path, header) if checkpoint_path else None
+    if state is not None:
+        print(f"Resuming from {checkpoint_path}: pass {state['stage'] + 1}, voice {state['position']}")
+    else:
+        basis = None
+        if method == "randomized":
+            rng = np.random.default_rng(seed)
+            basis = np.linalg.qr(rng.standard_normal((dim, rank)))[0]
+        state = {"stage": 0, "position": 0, "shift": None, "basis": basis}
+
+    print(
+        f"Streaming {method} PCA: {num_samples} voices x {dim} values, "
+        f"{num_stages} passes, batches of {batch_size}"
+    )
+
+    while state["stage"] < num_stages:
+        final = state["stage"] == num_stages - 1
+        if state["position"] == 0:
+            state.update(count=0, sum=np.zeros(dim), sumsq=0.0)
+            if final:
+                state["accum"] = np.zeros((num_samples, state["basis"].shape[1]))
+            elif method == "covariance":
+                state["accum"] = np.zeros((dim, dim))
+            else:
+                state["accum"] = np.zeros((dim, rank))
+
+        started = time.perf_counter()
+        batches = 0
+        for start in range(state["position"], num_samples, batch_size):
+            batch = store.get_many(ids[start:start + batch_size], rows=rows)
+            x = batch.reshape(len(batch), -1).astype(np.float64)
+            if state["shift"] is None:
+                state["shift"] = x.mean(axis=0)
+            x -= state["shift"]
+
+            state["count"] += len(x)
+            state["sum"] += x.sum(axis=0)
+            state["sumsq"] += float(np.einsum("ij,ij->", x, x))
+            if final:
+                state["accum"][start:start + len(x)] = x @ state["basis"]
+            elif method == "covariance":
+                state["accum"] += x.T @ x
+            else:
+                state["accum"] += x.T @ (x @ state["basis"])
+            state["position"] = start + len(x)
+
+            batches += 1
+            if checkpoint_path and batches % checkpoint_every == 0:
+                _save_checkpoint(checkpoint_path, header, state)
+
+        # Undo the shift: sum over centered x of x x^T = sum x' x'^T - N m m^T
+        count = state["count"]
+        mean = state["sum"] / count
+        dof = max(count - 1, 1)
+        if final:
+            state["accum"] -= mean @ state["basis"]
+        elif method == "covariance":
+            cov = (state["accum"] - count * np.outer(mean, mean)) / dof
+            variance, vectors = np.linalg.eigh(cov)
+            state["basis"] = vectors[:, np.argsort(variance)[::-1][:rank]]
+        else:
+            product = (state["accum"] - count * np.outer(mean, mean @ state["basis"])) / dof
+            state["basis"] = np.linalg.qr(product)[0]
+
+        print(f"  Pass {state['stage'] + 1}/{num_stages} took {time.perf_counter() - started:.1f} s")
+        if final:
+            break
+        state.update(stage=state["stage"] + 1, position=0, accum=None)
+        if checkpoint_path:
+            _save_checkpoint(checkpoint_path, header, state)
+
+    # Rayleigh-Ritz on the projections: rotate the basis to principal axes
+    projections = state["accum"]
+    variance, z = np.linalg.eigh(projections.T @ projections / dof)
+    order = np.argsort(variance)[::-1][:n_components]
+    variance, z = np.clip(variance[order], 0.0, None), z[:, order]
+    components = (state["basis"] @ z).T
+    signs = component_signs(components)
+
+    result = PCAResult(
+        ids=ids,
+        mean=state["shift"] + mean,
+        components=components * signs[:, None],
+        explained_variance=variance,
+        total_variance=float((state["sumsq"] - count * mean @ mean) / dof),
+        scores=projections @ (z * signs),
+        method=method,
+        rows=rows,
+    )
+    if checkpoint_path and checkpoint_path.exists():
+        checkpoint_path.unlink()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Out-of-core PCA of voice vectors")
+    parser.add_argument(
+        "--mixes",
+        type=Path,
+        default=Path(__file__).parent.parent / "data" / "mixed" / f"all_mixes{MIX_MANIFEST_SUFFIX}",
+        help="Mix file, manifest over shards, or any voices NPZ",
+    )
+    parser.add_argument(
+        "--voices",
+        type=Path,
+        help="Base voice pack of virtual mixes (default: the path recorded in the mix file)",
+    )
+    parser.add_argument(
+        "--components",
+        type=int,
+        default=10,
+        help="Number of principal components to keep",
+    )
+    parser.add_argument(
+        "--method",
+        choices=["auto", "covariance", "randomized"],
+        default="auto",
+        help="covariance: exact, needs (D, D) memory; randomized: block power iteration; "
+        "auto: covariance when it fits",
+    )
+    parser.add_argument(
+        "--oversample",
+        type=int,
+        default=10,
+        help="Extra random directions of the randomized method",
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=4,
+        help="Power iterations (passes over the data) of the randomized method",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=float,
+        default=4.0,
+        help="Approximate memory cap in GB; sets the batch size",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        help="Voices per batch (default: as many as the memory limit allows)",
+    )
+    parser.add_argument(
+        "--rows",
+        type=parse_rows,
+        help="Only analyze these style rows, e.g. \"24,31,40-47\"",
+    )
+    parser.add_argument(
+        "--rows-from",
+        type=Path,
+        help="Only analyze the style rows koko reads for the texts in a phonemes file",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        help="Checkpoint file (default: <output>.ckpt.npz); rerun to resume",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=20,
+        help="Batches between checkpoints",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Random seed for the randomized method",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path(__file__).parent.parent / "data" / "pca" / f"voice_pca{PCA_SUFFIX}",
+        help="Output PCA result file",
+    )
+
+    args = parser.parse_args()
+
+    rows = None
+    if args.rows is not None or args.rows_from is not None:
+        rows = sorted(set(args.rows or []) | set(load_token_rows(args.rows_from) if args.rows_from else []))
+    checkpoint = args.checkpoint or args.output.with_name(args.output.name.split(".")[0] + ".ckpt.npz")
+
+    store = MixStore(args.mixes, base_path=args.voices, cache_bytes=0)
+    print(f"Analyzing {len(store)} voices from {args.mixes}")
+
+    start = time.perf_counter()
+    result = fit_streaming_pca(
+        store,
+        n_components=args.components,
+        rows=rows,
+        method=args.method,
+        oversample=args.oversample,
+        n_iter=args.iterations,
+        memory_limit=int(args.memory_limit * 1024 ** 3),
+        batch_size=args.batch_size,
+        checkpoint_path=checkpoint,
+        checkpoint_every=args.checkpoint_every,
+        seed=args.seed,
+    )
+    print(f"PCA ({result.method}) took {time.perf_counter() - start:.1f} s\n")
+
+    print_summary(result)
+    save_pca_result(result, args.output)
+    print(f"\nSaved PCA result to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -21,8 +21,8 @@ Naming Convention:
 
 import argparse
 import json
-import random
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
@@ -30,6 +30,20 @@ from typing import Optional
 
 import numpy as np
 
+from mix_store import (
+    MIX_MANIFEST_SUFFIX,
+    VIRTUAL_MIX_SUFFIX,
+    MixWeights,
+    iter_mix_batches,
+    load_token_rows,
+    mix_batch,
+    parse_rows,
+    save_mix_weights,
+    write_mix_manifest,
+)
+from npz_io import NpzWriter
+from voice_pack import DEFAULT_CACHE_DIR, file_sha256, open_voice_pack, read_npz_headers
+
 
 # Voice metadata structure
 @dataclass
@@ -82,22 +96,63 @@ def parse_voice_name(name: str) -> VoiceInfo:
     )
 
 
-def load_voices(voices_path: Path) -> dict[str, VoiceInfo]:
-    """Load all voices from NPZ file."""
+def load_voices(
+    voices_path: Path,
+    cache_dir: Optional[Path] = DEFAULT_CACHE_DIR,
+    load_data: bool = True,
+) -> dict[str, VoiceInfo]:
+    """
+    Load all voices from NPZ file.
+
+    Voice data is memory-mapped from the uncompressed voice cache (built on
+    first use); pass cache_dir=None to decompress the NPZ into memory instead.
+    With load_data=False only the NPZ headers are read and VoiceInfo.data
+    stays None.
+    """
     print(f"Loading voices from: {voices_path}")
 
-    npz = np.load(voices_path)
+    if not load_data:
+        voices = {name: parse_voice_name(name) for name in read_npz_headers(voices_path)}
+        print(f"Found {len(voices)} voices")
+        return voices
+
+    pack = open_voice_pack(voices_path, cache_dir)
     voices = {}
 
-    for name in npz.files:
+    for name in pack.names:
         info = parse_voice_name(name)
-        info.data = npz[name]
+        info.data = pack[name]
         voices[name] = info
 
     print(f"Loaded {len(voices)} voices")
     return voices
 
 
+def stack_voices(voices: dict[str, VoiceInfo]) -> tuple[list[str], np.ndarray]:
+    """
+    Stack all source voices into a single (V, 510, 256) float32 tensor.
+
+    Returns (names, tensor) where names[i] is the voice stored at tensor[i].
+    Row order follows the order of the voices dict, i.e. the NPZ member order.
+    """
+    names = list(voices.keys())
+    if not names:
+        raise ValueError("No voices to stack")
+
+    first = voices[names[0]].data
+    if first is None:
+        raise ValueError(f"Voice data not loaded for {names[0]}")
+
+    stacked = np.empty((len(names), first.shape[0], first.shape[-1]), dtype=np.float32)
+    for i, name in enumerate(names):
+        data = voices[name].data
+        if data is None:
+            raise ValueError(f"Voice data not loaded for {name}")
+        stacked[i] = data.reshape(first.shape[0], first.shape[-1])
+
+    return names, stacked
+
+
 def mix_voices(
     voices: list[tuple[VoiceInfo, float]],
 ) -> np.ndarray:
@@ -113,152 +168,162 @@ def mix_voices(
     if not voices:
         raise ValueError("No voices to mix")
 
-    # Normalize weights
-    total_weight = sum(w for _, w in voices)
-    normalized = [(v, w / total_weight) for v, w in voices]
-
-    # Get first voice data for shape reference
-    first_voice_data = voices[0][0].data
-    if first_voice_data is None:
-        raise ValueError("Voice data not loaded")
+    selected = {info.name: info for info, _ in voices}
+    names, stacked = stack_voices(selected)
+    row = np.zeros((1, len(names)))
+    for info, weight in voices:
+        row[0, names.index(info.name)] += weight
 
-    # Initialize with zeros
-    result = np.zeros_like(first_voice_data, dtype=np.float32)
+    return mix_batch(row, stacked)[0]
 
-    # Weighted sum
-    for voice_info, weight in normalized:
-        if voice_info.data is None:
-            raise ValueError(f"Voice data not loaded for {voice_info.name}")
-        result += voice_info.data * weight
 
-    return result
+def weight_row(
+    voice_weights: list[tuple[VoiceInfo, float]],
+    voice_index: dict[str, int],
+) -> np.ndarray:
+    """Build a dense weight row over all source voices for one mix."""
+    row = np.zeros(len(voice_index))
+    for info, weight in voice_weights:
+        row[voice_index[info.name]] += weight
+    return row
 
 
-def generate_intra_language_mixes(
+def materialize_mixes(
+    mixes: list[dict],
     voices: dict[str, VoiceInfo],
-    num_mixes: int,
-    min_voices: int = 2,
-    max_voices: int = 4,
-    seed: Optional[int] = None,
-) -> list[dict]:
-    """
-    Generate random mixes within each language.
+    chunk_size: int = 1024,
+) -> None:
+    """Fill in the "data" field of each mix spec from its weight row."""
+    if not mixes:
+        return
+    _, stacked = stack_voices(voices)
+    data = mix_batch(np.stack([mix["weights"] for mix in mixes]), stacked, chunk_size)
+    for mix, mixed_data in zip(mixes, data):
+        mix["data"] = mixed_data
 
-    Returns list of mix specifications with metadata.
-    """
-    if seed is not None:
-        random.seed(seed)
-        np.random.seed(seed)
 
-    # Group voices by language
-    by_language: dict[str, list[VoiceInfo]] = {}
-    for info in voices.values():
-        lang = info.language
-        if lang not in by_language:
-            by_language[lang] = []
-        by_language[lang].append(info)
+def mix_rng(seed_entropy: int, index: int) -> np.random.Generator:
+    """
+    Random generator for the mix at a given index.
 
-    mixes = []
-    mix_id = 0
+    Equivalent to SeedSequence(seed).spawn(n)[index], without spawning the
+    preceding children, so every mix can be drawn independently.
+    """
+    return np.random.default_rng(np.random.SeedSequence(seed_entropy, spawn_key=(index,)))
 
-    # Generate mixes per language
-    mixes_per_lang = max(1, num_mixes // len(by_language))
 
-    for lang, lang_voices in by_language.items():
-        if len(lang_voices) < 2:
-            print(f"Skipping {lang}: only {len(lang_voices)} voice(s)")
-            continue
+def run_sharded(worker, plan: list, processes: int, *args) -> list:
+    """
+    Apply worker(plan_chunk, *args) over contiguous chunks of plan, in order.
 
-        for _ in range(mixes_per_lang):
-            # Random number of voices to mix
-            n_voices = random.randint(
-                min_voices, min(max_voices, len(lang_voices))
-            )
+    With processes > 1 the chunks run in a process pool. Since every mix
+    draws from its own generator, the result does not depend on processes.
+    """
+    if processes <= 1 or len(plan) < 2:
+        return worker(plan, *args)
+
+    n_chunks = min(len(plan), processes * 4)
+    bounds = np.linspace(0, len(plan), n_chunks + 1).astype(int)
+    chunks = [plan[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    results = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(worker, chunk, *args) for chunk in chunks]
+        for future in futures:
+            results.extend(future.result())
+    return results
+
+
+def _intra_mix_specs(
+    plan: list[tuple[int, str]],
+    voice_names: list[str],
+    min_voices: int,
+    max_voices: int,
+    seed_entropy: int,
+) -> list[dict]:
+    """Build intra-language mix specs for (mix_id, language) plan entries."""
+    voices = [parse_voice_name(name) for name in voice_names]
+    voice_index = {name: i for i, name in enumerate(voice_names)}
+    by_language: dict[str, list[VoiceInfo]] = {}
+    for info in voices:
+        by_language.setdefault(info.language, []).append(info)
 
-            # Random selection
-            selected = random.sample(lang_voices, n_voices)
+    mixes = []
+    for mix_id, lang in plan:
+        rng = mix_rng(seed_entropy, mix_id)
+        lang_voices = by_language[lang]
 
-            # Random weights (Dirichlet distribution for natural mixing)
-            weights = np.random.dirichlet(np.ones(n_voices)).tolist()
+        # Random number of voices to mix
+        n_voices = int(rng.integers(min_voices, min(max_voices, len(lang_voices)) + 1))
 
-            # Create mix
-            voice_weights = [(v, w) for v, w in zip(selected, weights)]
-            mixed_data = mix_voices(voice_weights)
+        # Random selection
+        selected = [lang_voices[i] for i in rng.choice(len(lang_voices), n_voices, replace=False)]
 
-            # Generate mix name
-            mix_name = f"mix_intra_{lang}_{mix_id:04d}"
+        # Random weights (Dirichlet distribution for natural mixing)
+        weights = rng.dirichlet(np.ones(n_voices)).tolist()
 
-            mix_spec = {
-                "id": mix_name,
-                "type": "intra_language",
-                "language": lang,
-                "language_full": selected[0].language_full,
-                "components": [
-                    {"voice": v.name, "weight": round(w, 4)}
-                    for v, w in voice_weights
-                ],
-                "genders": list(set(v.gender for v in selected)),
-                "data": mixed_data,
-            }
+        # Create mix
+        voice_weights = [(v, w) for v, w in zip(selected, weights)]
 
-            mixes.append(mix_spec)
-            mix_id += 1
+        mixes.append({
+            "id": f"mix_intra_{lang}_{mix_id:04d}",
+            "type": "intra_language",
+            "language": lang,
+            "language_full": selected[0].language_full,
+            "components": [
+                {"voice": v.name, "weight": round(w, 4)}
+                for v, w in voice_weights
+            ],
+            "genders": list(set(v.gender for v in selected)),
+            "weights": weight_row(voice_weights, voice_index),
+        })
 
-    print(f"Generated {len(mixes)} intra-language mixes")
     return mixes
 
 
-def generate_inter_language_mixes(
-    voices: dict[str, VoiceInfo],
-    num_mixes: int,
-    min_voices: int = 2,
-    max_voices: int = 5,
-    seed: Optional[int] = None,
+def _inter_mix_specs(
+    plan: list[int],
+    voice_names: list[str],
+    min_voices: int,
+    max_voices: int,
+    seed_entropy: int,
 ) -> list[dict]:
-    """
-    Generate random mixes across different languages.
-
-    Returns list of mix specifications with metadata.
-    """
-    if seed is not None:
-        random.seed(seed)
-        np.random.seed(seed)
+    """Build inter-language mix specs for the given mix IDs."""
+    voice_list = [parse_voice_name(name) for name in voice_names]
+    voice_index = {name: i for i, name in enumerate(voice_names)}
 
-    voice_list = list(voices.values())
     mixes = []
+    for mix_id in plan:
+        rng = mix_rng(seed_entropy, mix_id)
 
-    for mix_id in range(num_mixes):
         # Random number of voices
-        n_voices = random.randint(min_voices, min(max_voices, len(voice_list)))
+        n_voices = int(rng.integers(min_voices, min(max_voices, len(voice_list)) + 1))
 
         # Select voices ensuring language diversity
         selected = []
         available = voice_list.copy()
 
         while len(selected) < n_voices and available:
-            voice = random.choice(available)
+            voice = available[rng.integers(len(available))]
             selected.append(voice)
             # Remove same-language voices to encourage diversity
             # (but keep some for natural mixing)
-            if random.random() > 0.3:
+            if rng.random() > 0.3:
                 available = [v for v in available if v.language != voice.language]
             if not available:
                 available = [v for v in voice_list if v not in selected]
 
         # Random weights
-        weights = np.random.dirichlet(np.ones(len(selected))).tolist()
+        weights = rng.dirichlet(np.ones(len(selected))).tolist()
 
         # Create mix
         voice_weights = [(v, w) for v, w in zip(selected, weights)]
-        mixed_data = mix_voices(voice_weights)
 
         # Determine languages involved
         languages = list(set(v.language for v in selected))
 
-        mix_name = f"mix_inter_{mix_id:04d}"
-
-        mix_spec = {
-            "id": mix_name,
+        mixes.append({
+            "id": f"mix_inter_{mix_id:04d}",
             "type": "inter_language",
             "languages": languages,
             "components": [
@@ -270,45 +335,127 @@ def generate_inter_language_mixes(
                 for v, w in voice_weights
             ],
             "genders": list(set(v.gender for v in selected)),
-            "data": mixed_data,
-        }
+            "weights": weight_row(voice_weights, voice_index),
+        })
+
+    return mixes
 
-        mixes.append(mix_spec)
+
+def generate_intra_language_mixes(
+    voices: dict[str, VoiceInfo],
+    num_mixes: int,
+    min_voices: int = 2,
+    max_voices: int = 4,
+    seed: Optional[int] = None,
+    chunk_size: int = 1024,
+    materialize: bool = True,
+    processes: int = 1,
+) -> list[dict]:
+    """
+    Generate random mixes within each language.
+
+    Each mix draws from its own generator keyed by its mix index (see
+    mix_rng), so specs can be built across `processes` worker processes
+    with bit-identical results. The voice data for all mixes is then
+    materialized in one batched pass (see mix_batch), unless materialize
+    is False, in which case only the "weights" rows are kept.
+
+    Returns list of mix specifications with metadata.
+    """
+    seed_entropy = np.random.SeedSequence(seed).entropy
+
+    # Group voices by language
+    by_language: dict[str, list[VoiceInfo]] = {}
+    for info in voices.values():
+        lang = info.language
+        if lang not in by_language:
+            by_language[lang] = []
+        by_language[lang].append(info)
+
+    # Plan (mix_id, language) pairs up front; mix IDs key the random streams
+    plan = []
+    mixes_per_lang = max(1, num_mixes // len(by_language))
+
+    for lang, lang_voices in by_language.items():
+        if len(lang_voices) < 2:
+            print(f"Skipping {lang}: only {len(lang_voices)} voice(s)")
+            continue
+        for _ in range(mixes_per_lang):
+            plan.append((len(plan), lang))
+
+    mixes = run_sharded(
+        _intra_mix_specs, plan, processes,
+        list(voices.keys()), min_voices, max_voices, seed_entropy,
+    )
+
+    if materialize:
+        materialize_mixes(mixes, voices, chunk_size)
+
+    print(f"Generated {len(mixes)} intra-language mixes")
+    return mixes
+
+
+def generate_inter_language_mixes(
+    voices: dict[str, VoiceInfo],
+    num_mixes: int,
+    min_voices: int = 2,
+    max_voices: int = 5,
+    seed: Optional[int] = None,
+    chunk_size: int = 1024,
+    materialize: bool = True,
+    processes: int = 1,
+) -> list[dict]:
+    """
+    Generate random mixes across different languages.
+
+    Each mix draws from its own generator keyed by its mix index (see
+    mix_rng), so specs can be built across `processes` worker processes
+    with bit-identical results. The voice data for all mixes is then
+    materialized in one batched pass (see mix_batch), unless materialize
+    is False, in which case only the "weights" rows are kept.
+
+    Returns list of mix specifications with metadata.
+    """
+    seed_entropy = np.random.SeedSequence(seed).entropy
+
+    mixes = run_sharded(
+        _inter_mix_specs, list(range(num_mixes)), processes,
+        list(voices.keys()), min_voices, max_voices, seed_entropy,
+    )
+
+    if materialize:
+        materialize_mixes(mixes, voices, chunk_size)
 
     print(f"Generated {len(mixes)} inter-language mixes")
     return mixes
 
 
-def save_mixes(
+def shard_mixes(mixes: list[dict], num_shards: int) -> dict[str, list[dict]]:
+    """Split mixes into num_shards contiguous, near-equal groups keyed by shard prefix."""
+    bounds = np.linspace(0, len(mixes), num_shards + 1).astype(int)
+    return {
+        f"mixes_shard_{i:04d}_of_{num_shards:04d}": mixes[start:end]
+        for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))
+    }
+
+
+def save_metadata(
     mixes: list[dict],
     output_dir: Path,
     prefix: str = "mixed_voices",
-) -> tuple[Path, Path]:
+) -> Path:
     """
-    Save mixed voices to NPZ file and metadata to JSON.
+    Save mix metadata (everything except the arrays) to JSON.
 
-    Returns paths to (npz_file, json_file).
+    Returns path to the json_file.
     """
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    # Prepare data for NPZ
-    voice_data = {}
-    metadata = []
-
-    for mix in mixes:
-        mix_id = mix["id"]
-        voice_data[mix_id] = mix["data"]
-
-        # Metadata without numpy array
-        meta = {k: v for k, v in mix.items() if k != "data"}
-        metadata.append(meta)
+    metadata = [
+        {k: v for k, v in mix.items() if k not in ("data", "weights")}
+        for mix in mixes
+    ]
 
-    # Save NPZ
-    npz_path = output_dir / f"{prefix}.npz"
-    np.savez_compressed(npz_path, **voice_data)
-    print(f"Saved voice data to: {npz_path}")
-
-    # Save metadata JSON
     json_path = output_dir / f"{prefix}_metadata.json"
     with open(json_path, "w") as f:
         json.dump(
@@ -322,9 +469,166 @@ def save_mixes(
         )
     print(f"Saved metadata to: {json_path}")
 
+    return json_path
+
+
+def save_mixes(
+    mixes: list[dict],
+    output_dir: Path,
+    prefix: str = "mixed_voices",
+) -> tuple[Path, Path]:
+    """
+    Save mixed voices to NPZ file and metadata to JSON.
+
+    Returns paths to (npz_file, json_file).
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    npz_path = output_dir / f"{prefix}.npz"
+    with NpzWriter(npz_path) as writer:
+        for mix in mixes:
+            writer.write(mix["id"], mix["data"])
+    print(f"Saved voice data to: {npz_path}")
+
+    json_path = save_metadata(mixes, output_dir, prefix)
+
     return npz_path, json_path
 
 
+class MixWriter:
+    """
+    Stream mixes to <prefix>.npz and <prefix>_metadata.jsonl as they are produced.
+
+    On close the JSON Lines file is also rewritten, one line at a time, into
+    the <prefix>_metadata.json layout that save_metadata() produces, so the
+    downstream scripts keep working without holding all metadata in memory.
+    """
+
+    def __init__(self, output_dir: Path, prefix: str = "mixed_voices"):
+        output_dir.mkdir(parents=True, exist_ok=True)
+        self.npz_path = output_dir / f"{prefix}.npz"
+        self.jsonl_path = output_dir / f"{prefix}_metadata.jsonl"
+        self.json_path = output_dir / f"{prefix}_metadata.json"
+        self.generated_at = datetime.now().isoformat()
+        self._npz = NpzWriter(self.npz_path)
+        self._jsonl = open(self.jsonl_path, "w")
+
+    @property
+    def count(self) -> int:
+        return self._npz.count
+
+    def write(self, mix: dict, data: np.ndarray) -> None:
+        self._npz.write(mix["id"], data)
+        metadata = {k: v for k, v in mix.items() if k not in ("data", "weights")}
+        self._jsonl.write(json.dumps(metadata) + "\n")
+
+    def close(self) -> tuple[Path, Path]:
+        self._npz.close()
+        self._jsonl.close()
+        print(f"Saved voice data to: {self.npz_path}")
+
+        with open(self.jsonl_path) as src, open(self.json_path, "w") as f:
+            f.write("{\n")
+            f.write(f'  "generated_at": {json.dumps(self.generated_at)},\n')
+            f.write(f'  "total_mixes": {self.count},\n')
+            f.write('  "mixes": [')
+            for i, line in enumerate(src):
+                entry = json.dumps(json.loads(line), indent=2).replace("\n", "\n    ")
+                f.write(("," if i else "") + "\n    " + entry)
+            f.write("\n  ]\n}\n")
+        print(f"Saved metadata to: {self.jsonl_path} (+ {self.json_path.name})")
+
+        return self.npz_path, self.json_path
+
+    def abort(self) -> None:
+        self._npz.abort()
+        self._jsonl.close()
+
+    def __enter__(self) -> "MixWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def stream_mixes(
+    groups: dict[str, list[dict]],
+    voices: dict[str, VoiceInfo],
+    output_dir: Path,
+    chunk_size: int = 1024,
+    rows: Optional[list[int]] = None,
+) -> list[dict]:
+    """
+    Materialize and write mix specs chunk by chunk.
+
+    Each group (prefix -> mixes with "weights" rows) gets its own archive.
+    Only chunk_size mixes are in memory at any time. With rows, only those
+    style rows are mixed and stored, as (len(rows), 1, 256) arrays.
+
+    Returns one manifest part ({"data", "metadata", "ids"}) per group.
+    """
+    _, stacked = stack_voices(voices)
+    parts = []
+
+    for prefix, mixes in groups.items():
+        with MixWriter(output_dir, prefix) as writer:
+            if mixes:
+                weights = np.stack([mix["weights"] for mix in mixes])
+                for start, block in iter_mix_batches(weights, stacked, chunk_size, rows):
+                    for mix, data in zip(mixes[start:start + len(block)], block):
+                        writer.write(mix, data)
+        parts.append({
+            "data": writer.npz_path,
+            "metadata": writer.json_path,
+            "ids": [mix["id"] for mix in mixes],
+        })
+
+    return parts
+
+
+def save_virtual_mixes(
+    mixes: list[dict],
+    output_dir: Path,
+    voice_names: list[str],
+    base_sha256: str,
+    base_path: Optional[Path] = None,
+    prefix: str = "mixed_voices",
+) -> tuple[Path, Path]:
+    """
+    Save mixes as weights only (virtual mix file) plus metadata JSON.
+
+    The voice data is not stored; mix_store rebuilds any mix on demand from
+    the weights and the base voice pack identified by base_sha256.
+
+    Returns paths to (mixw_file, json_file).
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    weights = (
+        np.stack([mix["weights"] for mix in mixes])
+        if mixes
+        else np.zeros((0, len(voice_names)))
+    )
+    mix_weights = MixWeights.from_dense(
+        ids=[mix["id"] for mix in mixes],
+        voice_names=voice_names,
+        weights=weights,
+        base_sha256=base_sha256,
+        base_path=str(base_path.resolve()) if base_path is not None else None,
+    )
+
+    mixw_path = output_dir / f"{prefix}{VIRTUAL_MIX_SUFFIX}"
+    save_mix_weights(mix_weights, mixw_path)
+    print(f"Saved mix weights to: {mixw_path}")
+
+    json_path = save_metadata(mixes, output_dir, prefix)
+
+    return mixw_path, json_path
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Generate mixed voice vectors for PCA analysis"
@@ -335,6 +639,17 @@ def main():
         default=Path(__file__).parent.parent.parent / "data" / "voices-v1.0.bin",
         help="Path to voices NPZ file",
     )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help="Directory for the uncompressed, memory-mapped voice pack cache",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Decompress the voice pack into memory instead of using the cache",
+    )
     parser.add_argument(
         "--output",
         type=Path,
@@ -371,6 +686,44 @@ def main():
         default=42,
         help="Random seed for reproducibility",
     )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=1024,
+        help="Mixes materialized per batched matrix product (bounds peak memory)",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="Worker processes for building mix specs (output is identical for any value)",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Split all mixes into N shard files (for generate_audio.py --shard i/N) "
+        "instead of intra/inter files",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["npz", "weights"],
+        default="npz",
+        help="Output format: materialized voice arrays (npz) or mixing weights only "
+        "(weights, rebuilt on demand from the base voice pack)",
+    )
+    parser.add_argument(
+        "--rows",
+        type=parse_rows,
+        help="Only mix and store these style rows, e.g. \"24,31,40-47\" "
+        "(analysis only; koko needs full voices)",
+    )
+    parser.add_argument(
+        "--rows-from",
+        type=Path,
+        help="Only mix and store the style rows koko reads for the texts in a phonemes "
+        "file (data/cache/phonemes.json or `koko phonemize` output)",
+    )
     parser.add_argument(
         "--list-voices",
         action="store_true",
@@ -379,8 +732,14 @@ def main():
 
     args = parser.parse_args()
 
+    rows = None
+    if args.rows is not None or args.rows_from is not None:
+        rows = sorted(set(args.rows or []) | set(load_token_rows(args.rows_from) if args.rows_from else []))
+        print(f"Style rows: {rows}")
+
     # Load voices
-    voices = load_voices(args.voices)
+    cache_dir = None if args.no_cache else args.cache_dir
+    voices = load_voices(args.voices, cache_dir, load_data=not args.list_voices)
 
     if args.list_voices:
         print("\nAvailable voices by language:\n")
@@ -405,6 +764,9 @@ def main():
         min_voices=args.min_voices,
         max_voices=args.max_voices,
         seed=args.seed,
+        chunk_size=args.chunk_size,
+        materialize=False,
+        processes=args.processes,
     )
 
     inter_mixes = generate_inter_language_mixes(
@@ -413,15 +775,50 @@ def main():
         min_voices=args.min_voices,
         max_voices=args.max_voices,
         seed=args.seed + 1000,  # Different seed for variety
+        chunk_size=args.chunk_size,
+        materialize=False,
+        processes=args.processes,
     )
 
-    # Save separately
-    save_mixes(intra_mixes, args.output, "intra_language_mixes")
-    save_mixes(inter_mixes, args.output, "inter_language_mixes")
-
-    # Also save combined
     all_mixes = intra_mixes + inter_mixes
-    save_mixes(all_mixes, args.output, "all_mixes")
+
+    if args.shards > 1:
+        groups = shard_mixes(all_mixes, args.shards)
+    else:
+        groups = {
+            "intra_language_mixes": intra_mixes,
+            "inter_language_mixes": inter_mixes,
+        }
+
+    if args.format == "weights":
+        if rows is not None:
+            print("Note: --rows only applies to --format npz; weight files describe whole voices")
+            rows = None
+        voice_names = list(voices.keys())
+        if cache_dir is None:
+            base_sha256 = file_sha256(args.voices)
+        else:
+            base_sha256 = open_voice_pack(args.voices, cache_dir).sha256
+        parts = []
+        for prefix, mixes in groups.items():
+            mixw_path, json_path = save_virtual_mixes(
+                mixes, args.output, voice_names, base_sha256, args.voices, prefix
+            )
+            parts.append({
+                "data": mixw_path,
+                "metadata": json_path,
+                "ids": [mix["id"] for mix in mixes],
+            })
+    else:
+        # Materialize in chunks and stream into one archive per group
+        parts = stream_mixes(groups, voices, args.output, chunk_size=args.chunk_size, rows=rows)
+
+    # "All mixes" is a manifest over the part files, not another copy; it
+    # also serves as the ID -> (shard, offset) index for sharded runs
+    manifest_path = write_mix_manifest(
+        args.output / f"all_mixes{MIX_MANIFEST_SUFFIX}", parts, rows=rows
+    )
+    print(f"Saved manifest to: {manifest_path}")
 
     print(f"\nTotal mixes generated: {len(all_mixes)}")
     print(f"  - Intra-language: {len(intra_mixes)}")
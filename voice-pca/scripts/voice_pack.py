@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Voice Pack Cache for Kokoro Voice PCA
+
+The Kokoro voice pack (voices-v1.0.bin) is a compressed NPZ, so every np.load
+decompresses all voices into private memory. This module converts the pack
+once into an uncompressed cache and memory-maps it on later runs, so startup
+is near-instant and worker processes share the same page cache.
+
+Cache Layout (keyed by the source pack's SHA-256):
+- <cache_dir>/<sha256>/voices.npy   (V, 510, 1, 256) float32, uncompressed
+- <cache_dir>/<sha256>/index.json   voice names in row order + source info
+- <cache_dir>/sources.json          path/size/mtime -> sha256, so unchanged
+                                    packs are not rehashed on every run
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from npz_io import read_npz
+
+
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent / "data" / "cache" / "voices"
+
+CACHE_DATA_FILE = "voices.npy"
+CACHE_INDEX_FILE = "index.json"
+CACHE_SOURCES_FILE = "sources.json"
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    """Return the hex SHA-256 digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class VoicePack:
+    """Voice pack as one (V, 510, 1, 256) array plus a name index."""
+
+    source: Path
+    sha256: str
+    names: list[str]
+    data: np.ndarray = field(repr=False)
+
+    def __post_init__(self):
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name) -> bool:
+        return name in self._index
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.data[self._index[name]]
+
+    def stacked(self, names: Optional[list[str]] = None) -> np.ndarray:
+        """
+        Return a (V, 510, 256) view of the pack, optionally in a given voice order.
+
+        Without names this is a zero-copy view of the memory map.
+        """
+        flat = self.data.reshape(self.data.shape[0], self.data.shape[1], self.data.shape[-1])
+        if names is None or list(names) == self.names:
+            return flat
+        missing = [name for name in names if name not in self._index]
+        if missing:
+            raise KeyError(f"Voices not found in {self.source}: {', '.join(missing)}")
+        return flat[[self._index[name] for name in names]]
+
+
+def read_npz_headers(path: Path) -> dict[str, tuple[tuple[int, ...], np.dtype]]:
+    """
+    Return {member name: (shape, dtype)} for an NPZ file without loading arrays.
+
+    Only the zip central directory and the first bytes of each .npy member
+    (its header) are read, so this stays fast on large compressed packs.
+    """
+    headers = {}
+    with zipfile.ZipFile(path) as zf:
+        for member in zf.infolist():
+            if not member.filename.endswith(".npy"):
+                continue
+            with zf.open(member) as f:
+                version = np.lib.format.read_magic(f)
+                if version == (1, 0):
+                    shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+                else:
+                    shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+            headers[member.filename[: -len(".npy")]] = (shape, dtype)
+    return headers
+
+
+def npz_member_names(path: Path) -> list[str]:
+    """List the array names stored in an NPZ file (zip directory only)."""
+    with zipfile.ZipFile(path) as zf:
+        return [name[: -len(".npy")] for name in zf.namelist() if name.endswith(".npy")]
+
+
+def _read_json(path: Path) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json_atomic(path: Path, data: dict) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def source_sha256(voices_path: Path, cache_dir: Path) -> str:
+    """
+    Hash a voice pack, reusing the digest recorded for an unchanged file.
+
+    A pack is considered unchanged if its resolved path, size and mtime
+    match the entry in <cache_dir>/sources.json.
+    """
+    stat = voices_path.stat()
+    key = str(voices_path.resolve())
+    sources_path = cache_dir / CACHE_SOURCES_FILE
+    sources = _read_json(sources_path)
+
+    entry = sources.get(key)
+    if entry and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+        return entry["sha256"]
+
+    digest = file_sha256(voices_path)
+    sources[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+    _write_json_atomic(sources_path, sources)
+    return digest
+
+
+def build_voice_cache(voices_path: Path, entry_dir: Path, sha256: str) -> None:
+    """Decompress a voice pack once into <entry_dir>/voices.npy + index.json."""
+    print(f"Building voice cache for {voices_path} in {entry_dir}")
+    entry_dir.mkdir(parents=True, exist_ok=True)
+
+    voices = read_npz(voices_path)
+    names = list(voices)
+    if not names:
+        raise ValueError(f"No voices found in {voices_path}")
+
+    first = voices[names[0]]
+    fd, tmp = tempfile.mkstemp(dir=entry_dir, suffix=".npy.tmp")
+    os.close(fd)
+    out = np.lib.format.open_memmap(
+        tmp, mode="w+", dtype=np.float32, shape=(len(names),) + first.shape
+    )
+    for i, name in enumerate(names):
+        voice = voices[name]
+        if voice.shape != first.shape:
+            raise ValueError(
+                f"Voice {name} has shape {voice.shape}, expected {first.shape}"
+            )
+        out[i] = voice
+    out.flush()
+    del out
+
+    os.replace(tmp, entry_dir / CACHE_DATA_FILE)
+    # The index is written last and marks the entry as complete
+    _write_json_atomic(
+        entry_dir / CACHE_INDEX_FILE,
+        {"source": str(voices_path), "sha256": sha256, "names": names},
+    )
+
+
+def open_voice_pack(
+    voices_path: Path,
+    cache_dir: Optional[Path] = DEFAULT_CACHE_DIR,
+) -> VoicePack:
+    """
+    Open a voice pack through the uncompressed memory-mapped cache.
+
+    The first call for a given pack builds the cache; later calls only map
+    it. With cache_dir=None the pack is decompressed into memory instead.
+    """
+    voices_path = Path(voices_path)
+
+    if cache_dir is None:
+        voices = read_npz(voices_path)
+        names = list(voices)
+        data = np.stack([voices[name] for name in names]).astype(np.float32, copy=False)
+        return VoicePack(voices_path, file_sha256(voices_path), names, data)
+
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    sha256 = source_sha256(voices_path, cache_dir)
+    entry_dir = cache_dir / sha256
+
+    index = _read_json(entry_dir / CACHE_INDEX_FILE)
+    if index.get("sha256") != sha256 or not (entry_dir / CACHE_DATA_FILE).exists():
+        build_voice_cache(voices_path, entry_dir, sha256)
+        index = _read_json(entry_dir / CACHE_INDEX_FILE)
+
+    data = np.load(entry_dir / CACHE_DATA_FILE, mmap_mode="r")
+    return VoicePack(voices_path, sha256, index["names"], data)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Checks for the audio cache keys in scripts/audio_cache.py and generate_audio.py.
+
+Runs with pytest or standalone:
+    python tests/test_audio_cache.py
+"""
+
+import json
+import sys
+import tempfile
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from audio_cache import AudioCache, audio_cache_key, style_rows  # noqa: E402
+from generate_audio import job_cache_keys, mix_style_rows  # noqa: E402
+from mix_store import MixStore  # noqa: E402
+from voice_pack import open_voice_pack  # noqa: E402
+
+
+def _voices() -> dict[str, np.ndarray]:
+    rng = np.random.default_rng(1)
+    return {
+        name: rng.standard_normal((510, 1, 256)).astype(np.float32)
+        for name in ("af_a", "am_b", "bf_c")
+    }
+
+
+def test_key_is_stable():
+    style = np.arange(3 * 256, dtype=np.float32).reshape(3, 256) / 256
+    key = audio_cache_key("ab" * 32, style, tokens=[[0, 30, 16, 4]], speed=1.0)
+
+    # Same inputs, in any numeric type, give the same key
+    assert key == audio_cache_key("ab" * 32, style.astype(np.float64), tokens=[[0, 30, 16, 4]])
+    assert key == audio_cache_key("ab" * 32, style, tokens=[[0, 30, 16, 4]], speed=np.float32(1.0))
+    # Text and language do not matter once tokens are known
+    assert key == audio_cache_key("ab" * 32, style, tokens=[[0, 30, 16, 4]], text="x", language="fr")
+    # Keys are persisted on disk, so their derivation must not drift
+    assert key == "6698a349a5655416379b29a6145d47b002cd4d7a8ddee51bdb47d350e869dac4", key
+
+    changed = [
+        audio_cache_key("cd" * 32, style, tokens=[[0, 30, 16, 4]]),
+        audio_cache_key("ab" * 32, style * 2, tokens=[[0, 30, 16, 4]]),
+        audio_cache_key("ab" * 32, style, tokens=[[0, 30, 16, 5]]),
+        audio_cache_key("ab" * 32, style, tokens=[[0, 30, 16, 4]], speed=1.1),
+        audio_cache_key("ab" * 32, style, tokens=[[0, 30, 16, 4]], mono=True),
+        audio_cache_key("ab" * 32, style, text="Hello", language="en-us"),
+    ]
+    assert len({key, *changed}) == len(changed) + 1
+
+
+def test_style_rows_blends_mixes():
+    voices = _voices()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "voices.npz"
+        np.savez(path, **voices)
+        pack = open_voice_pack(path, cache_dir=None)
+
+        rows = style_rows(pack, "af_a:0.25+am_b:0.75", [3, 0, 3])
+        expected = 0.25 * voices["af_a"][[3, 0, 3], 0] + 0.75 * voices["am_b"][[3, 0, 3], 0]
+        np.testing.assert_allclose(rows, expected, rtol=1e-6)
+        assert style_rows(pack, "bf_c").shape == (510, 256)
+
+
+def test_combined_pack_and_pack_keys_agree():
+    # The same voice read from the original pack and from a mix file gets
+    # the same key, including chunks longer than the voice's 510 rows
+    voices = _voices()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        np.savez(tmp / "voices.npz", **voices)
+        np.savez(tmp / "mixes.npz", mix_0=voices["am_b"])
+        pack = open_voice_pack(tmp / "voices.npz", cache_dir=None)
+        store = MixStore(tmp / "mixes.npz", cache_bytes=0)
+
+        read_pack = partial(style_rows, pack)
+        read_store = partial(mix_style_rows, store)
+
+        tokens = [[30] * 12, [16] * 509, [4] * 510, [4] * 515]
+        phonemized = {"text": {"tokens": tokens}}
+        job = {"id": "j", "text": "text", "language": "en-us"}
+        keys_pack = job_cache_keys([{**job, "style": "am_b"}], read_pack, "m", phonemized)
+        keys_store = job_cache_keys([{**job, "style": "mix_0"}], read_store, "m", phonemized)
+        assert keys_pack == keys_store
+
+        # Rows past the voice read koko's zero padding
+        rows = voices["am_b"][[12, 509], 0]
+        padded = np.concatenate([rows, np.zeros((2, 256), dtype=np.float32)])
+        assert keys_pack["j"] == audio_cache_key("m", padded, tokens=tokens)
+
+        # Unphonemized jobs are keyed on the text and the whole voice
+        keys_text = job_cache_keys([{**job, "style": "mix_0"}], read_store, "m", {})
+        assert keys_text["j"] == audio_cache_key(
+            "m", voices["am_b"].reshape(510, 256), text="text", language="en-us"
+        )
+
+
+def test_cache_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        cache = AudioCache(tmp / "audio")
+        (tmp / "a.wav").write_bytes(b"RIFF-a")
+        (tmp / "model.onnx").write_bytes(b"model")
+
+        key = "0f" * 32
+        assert key not in cache
+        assert not cache.fetch(key, tmp / "out.wav")
+        cache.store(key, tmp / "a.wav")
+        (tmp / "a.wav").write_bytes(b"RIFF-b")  # later rewrites do not reach the cache
+        assert cache.fetch(key, tmp / "out.wav")
+        assert (tmp / "out.wav").read_bytes() == b"RIFF-a"
+
+        # The model digest lives in the audio cache's own metadata
+        digest = cache.model_sha256(tmp / "model.onnx")
+        sources = json.loads((tmp / "audio" / "sources.json").read_text())
+        assert [entry["sha256"] for entry in sources.values()] == [digest]
+
+
+if __name__ == "__main__":
+    tests = [(name, test) for name, test in globals().items() if name.startswith("test_")]
+    for name, test in tests:
+        test()
+        print(f"ok  {name}")
+    print(f"{len(tests)} passed")
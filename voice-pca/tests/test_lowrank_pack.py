@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Checks for the low-rank voice packs in scripts/lowrank_pack.py.
+
+Runs with pytest or standalone:
+    python tests/test_lowrank_pack.py
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from lowrank_pack import (  # noqa: E402
+    compress_store,
+    decode_to_npz,
+    load_lowrank_pack,
+    save_lowrank_pack,
+)
+from mix_store import MixStore  # noqa: E402
+
+
+def _voices(count: int = 8, rank: int = 3) -> dict[str, np.ndarray]:
+    """Voices that lie exactly in a rank-`rank` affine subspace."""
+    rng = np.random.default_rng(2)
+    mean = rng.standard_normal(510 * 256)
+    basis = rng.standard_normal((rank, 510 * 256))
+    voices = mean + rng.standard_normal((count, rank)) @ basis
+    return {f"mix_{i}": voice.astype(np.float32).reshape(510, 1, 256) for i, voice in enumerate(voices)}
+
+
+def test_compress_decode_round_trip():
+    voices = _voices()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        np.savez(tmp / "mixes.npz", **voices)
+        store = MixStore(tmp / "mixes.npz", cache_bytes=0)
+
+        pack = compress_store(store, rank=3, method="svd", batch_size=3)
+        assert pack.rank == 3 and pack.names == list(voices)
+        assert pack.error["relative"] < 1e-5, pack.error
+        np.testing.assert_allclose(pack.decode("mix_5"), voices["mix_5"], atol=1e-4)
+
+        # Too small a rank shows up in the measured error
+        assert compress_store(store, rank=1, method="svd").error["relative"] > 1e-2
+
+        # Repeated names are written once
+        path = decode_to_npz(pack, tmp / "decoded.npz", ["mix_2", "mix_0", "mix_2"], batch_size=1)
+        with np.load(path) as npz:
+            assert list(npz.files) == ["mix_2", "mix_0"]
+            for name in npz.files:
+                assert npz[name].dtype == np.float32
+                np.testing.assert_allclose(npz[name], voices[name], atol=1e-4)
+
+        try:
+            decode_to_npz(pack, tmp / "missing.npz", ["mix_0", "nope"])
+        except KeyError as e:
+            assert "nope" in str(e)
+        else:
+            raise AssertionError("unknown voice was decoded")
+
+
+def test_save_load():
+    voices = _voices()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        np.savez(tmp / "mixes.npz", **voices)
+        store = MixStore(tmp / "mixes.npz", cache_bytes=0)
+
+        for dtype in ("float32", "float16"):
+            pack = compress_store(store, rank=3, method="svd", dtype=dtype)
+            path = save_lowrank_pack(pack, tmp / f"mixes_{dtype}.lrvoices.npz")
+
+            # koko's npy reader handles plain numeric arrays only
+            with np.load(path) as npz:
+                assert {name: npz[name].dtype.str[1:] for name in npz.files} == {
+                    "header": "u1",
+                    "names": "u1",
+                    "mean": "f4" if dtype == "float32" else "u2",
+                    "basis": "f4" if dtype == "float32" else "u2",
+                    "coefficients": "f4",
+                }
+
+            loaded = load_lowrank_pack(path)
+            assert loaded.names == pack.names and loaded.shape == (510, 1, 256)
+            assert loaded.basis.dtype == np.dtype(dtype)
+            assert loaded.error == pack.error
+            np.testing.assert_array_equal(loaded.decode("mix_7"), pack.decode("mix_7"))
+
+        pack.names[0] = "two\nlines"
+        try:
+            save_lowrank_pack(pack, tmp / "bad.lrvoices.npz")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("a name with a newline was saved")
+
+
+if __name__ == "__main__":
+    tests = [(name, test) for name, test in globals().items() if name.startswith("test_")]
+    for name, test in tests:
+        test()
+        print(f"ok  {name}")
+    print(f"{len(tests)} passed")
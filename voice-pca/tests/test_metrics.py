@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Checks for the generation metrics in scripts/generate_audio.py.
+
+Runs with pytest or standalone:
+    python tests/test_metrics.py
+"""
+
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from generate_audio import (  # noqa: E402
+    SAMPLE_RATE,
+    check_job_result,
+    peak_child_rss_mb,
+    percentiles,
+    summarize_metrics,
+)
+
+
+def test_percentiles():
+    assert percentiles([]) is None
+    assert percentiles([7.5]) == {"p50": 7.5, "p95": 7.5, "p99": 7.5, "mean": 7.5, "max": 7.5}
+
+    stats = percentiles([float(v) for v in range(1, 101)])
+    assert stats["p50"] == 50.5
+    assert abs(stats["p95"] - 95.05) < 1e-9
+    assert abs(stats["p99"] - 99.01) < 1e-9
+    assert stats["mean"] == 50.5
+    assert stats["max"] == 100.0
+
+
+def test_check_job_result():
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "a.wav"
+        output.write_bytes(b"\0" * 2000)
+        job = {"id": "a", "output": str(output)}
+        reply = {"status": "success", "worker": 3, "audio_seconds": 2.0, "elapsed_ms": 500.0}
+
+        result = check_job_result(job, reply)
+        assert result["status"] == "success"
+        assert result["worker"] == 3
+        assert result["synth_ms"] == 500.0
+        assert result["rtf"] == 0.25
+
+        output.unlink()
+        failed = check_job_result(job, {"status": "error", "error": "boom", "worker": 1})
+        assert failed["status"] == "error" and failed["error"] == "boom"
+        assert check_job_result(job, None)["error"] == "No result from koko"
+
+
+def test_summarize_metrics():
+    results = [
+        {"status": "success", "audio_seconds": 2.0, "synth_ms": 400.0, "wall_ms": 450.0, "queue_wait_ms": 5.0},
+        {"status": "success", "audio_seconds": 3.0, "synth_ms": 600.0, "wall_ms": 650.0, "queue_wait_ms": 15.0},
+        # Failed jobs count for nothing, not even latency
+        {"status": "timeout", "error": "timed out", "wall_ms": 60000.0, "queue_wait_ms": 1.0},
+        {"status": "error", "error": "boom", "wall_ms": 10.0},
+        # Cached voices were not synthesized in this run
+        {"status": "success", "cached": True, "audio_seconds": 9.0},
+    ]
+    metrics = summarize_metrics(results, wall_seconds=2.0)
+
+    assert metrics["voices_synthesized"] == 2
+    assert metrics["audio_seconds"] == 5.0
+    assert metrics["samples_per_second"] == 5.0 * SAMPLE_RATE / 2.0 == 60000.0
+    assert metrics["rtf"] == 1.0 / 5.0
+    assert metrics["wall_ms"]["max"] == 650.0
+    assert metrics["wall_ms"]["p50"] == 550.0
+    assert metrics["synth_ms"]["mean"] == 500.0
+    assert metrics["queue_wait_ms"]["p50"] == 10.0
+
+    empty = summarize_metrics([], wall_seconds=0.0)
+    assert empty["voices_synthesized"] == 0
+    assert empty["samples_per_second"] is None and empty["rtf"] is None
+    assert empty["wall_ms"] is None
+
+
+def test_peak_child_rss_mb():
+    if sys.platform == "win32":
+        assert peak_child_rss_mb() is None
+        return
+    # A finished child holding ~64 MB raises the children's peak RSS to at least that
+    subprocess.run(
+        [sys.executable, "-c", "b = bytearray(64 * 1024 * 1024); b[::4096] = b'x' * len(b[::4096])"],
+        check=True,
+    )
+    peak = peak_child_rss_mb()
+    assert 64 <= peak < 64 * 1024, peak
+
+
+if __name__ == "__main__":
+    tests = [(name, test) for name, test in globals().items() if name.startswith("test_")]
+    for name, test in tests:
+        test()
+        print(f"ok  {name}")
+    print(f"{len(tests)} passed")
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Checks for the mix storage formats in scripts/mix_store.py.
+
+Runs with pytest or standalone:
+    python tests/test_mix_store.py
+"""
+
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from mix_store import (  # noqa: E402
+    MixStore,
+    MixWeights,
+    load_mix_metadata,
+    load_mix_manifest,
+    load_mix_weights,
+    mix_batch,
+    mix_index,
+    parse_rows,
+    rebuild_mixes,
+    resolve_base_voices,
+    save_mix_weights,
+    shard_parts,
+    token_rows,
+    write_mix_manifest,
+)
+from voice_pack import file_sha256  # noqa: E402
+
+
+def _base_voices() -> dict[str, np.ndarray]:
+    rng = np.random.default_rng(3)
+    return {
+        name: rng.standard_normal((510, 1, 256)).astype(np.float32)
+        for name in ("af_a", "am_b", "bf_c", "bm_d")
+    }
+
+
+def _mix_weights(base_path: Path) -> MixWeights:
+    weights = np.array([
+        [0.5, 0.5, 0.0, 0.0],
+        [0.0, 1.0, 2.0, 1.0],
+        [0.0, 0.0, 0.0, 3.0],
+    ])
+    return MixWeights.from_dense(
+        ["mix_0", "mix_1", "mix_2"],
+        ["af_a", "am_b", "bf_c", "bm_d"],
+        weights,
+        base_sha256=file_sha256(base_path),
+        base_path=str(base_path),
+    )
+
+
+def test_mix_weights_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        np.savez(tmp / "voices.npz", **_base_voices())
+        mix_weights = _mix_weights(tmp / "voices.npz")
+        # Only the nonzero weights are stored
+        assert len(mix_weights.values) == 6
+
+        path = save_mix_weights(mix_weights, tmp / "mixes.mixw.npz")
+        loaded = load_mix_weights(path)
+        assert loaded.ids == mix_weights.ids
+        assert loaded.voice_names == mix_weights.voice_names
+        assert loaded.base_sha256 == mix_weights.base_sha256
+        assert loaded.base_path == str(tmp / "voices.npz")
+        np.testing.assert_array_equal(loaded.dense(), mix_weights.dense())
+        np.testing.assert_array_equal(loaded.dense([2, 0]), mix_weights.dense()[[2, 0]])
+
+
+def test_rebuild_mixes():
+    voices = _base_voices()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        np.savez(tmp / "voices.npz", **voices)
+        mix_weights = _mix_weights(tmp / "voices.npz")
+
+        names, base = resolve_base_voices(mix_weights, cache_dir=None)
+        assert names == mix_weights.voice_names
+        mixes = rebuild_mixes(mix_weights, ["mix_1", "mix_2"], base, chunk_size=1)
+
+        # Weights are normalized per mix
+        expected = (voices["am_b"] + 2 * voices["bf_c"] + voices["bm_d"]) / 4
+        np.testing.assert_allclose(mixes[0], expected, atol=1e-5)
+        np.testing.assert_allclose(mixes[1], voices["bm_d"], atol=1e-6)
+        np.testing.assert_array_equal(mixes, mix_batch(mix_weights.dense([1, 2]), base))
+
+
+def test_base_pack_must_match():
+    voices = _base_voices()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        np.savez(tmp / "voices.npz", **voices)
+        mix_weights = _mix_weights(tmp / "voices.npz")
+
+        # Same names, different contents
+        voices["am_b"] = voices["am_b"] + 1
+        np.savez(tmp / "other.npz", **voices)
+        try:
+            resolve_base_voices(mix_weights, tmp / "other.npz", cache_dir=None)
+        except ValueError as e:
+            assert "does not match" in str(e)
+        else:
+            raise AssertionError("a base pack with another sha256 was accepted")
+        names, base = resolve_base_voices(
+            mix_weights, tmp / "other.npz", verify=False, cache_dir=None
+        )
+        np.testing.assert_array_equal(base[1], voices["am_b"].reshape(510, 256))
+
+        try:
+            resolve_base_voices(mix_weights, tmp / "missing.npz", cache_dir=None)
+        except FileNotFoundError:
+            pass
+        else:
+            raise AssertionError("a missing base pack was accepted")
+
+
+def test_store_reads_virtual_and_npz():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        np.savez(tmp / "voices.npz", **_base_voices())
+        mix_weights = _mix_weights(tmp / "voices.npz")
+        save_mix_weights(mix_weights, tmp / "mixes.mixw.npz")
+        _, base = resolve_base_voices(mix_weights, cache_dir=None)
+        mixes = rebuild_mixes(mix_weights, mix_weights.ids, base)
+        np.savez(tmp / "mixes.npz", **dict(zip(mix_weights.ids, mixes)))
+
+        virtual = MixStore(tmp / "mixes.mixw.npz", base_path=tmp / "voices.npz", cache_dir=None)
+        stored = MixStore(tmp / "mixes.npz")
+        assert virtual.is_virtual and not stored.is_virtual
+        for store in (virtual, stored):
+            assert store.ids == ["mix_0", "mix_1", "mix_2"] and len(store) == 3
+            assert "mix_1" in store and "mix_9" not in store
+            batch = store.get_many(["mix_2", "mix_0", "mix_2"])
+            assert batch.shape == (3, 510, 1, 256)
+            np.testing.assert_allclose(batch, mixes[[2, 0, 2]], atol=1e-6)
+            np.testing.assert_allclose(store["mix_1"], mixes[1], atol=1e-6)
+            assert store.get_many([]).shape == (0, 510, 1, 256)
+            try:
+                store.get_many(["mix_0", "mix_9"])
+            except KeyError:
+                pass
+            else:
+                raise AssertionError("an unknown mix was read")
+
+
+def test_cache_is_byte_bounded():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        np.savez(tmp / "voices.npz", **_base_voices())
+        save_mix_weights(_mix_weights(tmp / "voices.npz"), tmp / "mixes.mixw.npz")
+
+        voice_bytes = 510 * 256 * 4
+        store = MixStore(tmp / "mixes.mixw.npz", cache_bytes=2 * voice_bytes, cache_dir=None)
+        store.get_many(["mix_0", "mix_1"])
+        store["mix_0"]  # now the most recently used
+        store.get_many(["mix_2"])
+        assert list(store._cache) == ["mix_0", "mix_2"]
+        assert store._cached_bytes == 2 * voice_bytes
+
+        # A cached mix is a copy, not a view into the batch it was built in
+        assert store["mix_2"].base is None
+
+        store.clear_cache()
+        assert not store._cache and store._cached_bytes == 0
+        uncached = MixStore(tmp / "mixes.mixw.npz", cache_bytes=0, cache_dir=None)
+        uncached.get_many(uncached.ids)
+        assert not uncached._cache
+
+
+def test_manifest_over_parts():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        (tmp / "parts").mkdir()
+        np.savez(tmp / "voices.npz", **_base_voices())
+        mix_weights = _mix_weights(tmp / "voices.npz")
+        save_mix_weights(mix_weights, tmp / "parts" / "intra.mixw.npz")
+        _, base = resolve_base_voices(mix_weights, cache_dir=None)
+        mixes = rebuild_mixes(mix_weights, mix_weights.ids, base)
+        inter_ids = ["inter_0", "inter_1"]
+        np.savez(tmp / "parts" / "inter.npz", **dict(zip(inter_ids, mixes[:2][::-1])))
+
+        parts = []
+        for name, ids in (("intra", mix_weights.ids), ("inter", inter_ids)):
+            metadata = tmp / "parts" / f"{name}_metadata.json"
+            metadata.write_text(json.dumps({"mixes": [{"id": i, "type": name} for i in ids]}))
+            data = tmp / "parts" / (f"{name}.mixw.npz" if name == "intra" else f"{name}.npz")
+            parts.append({"data": data, "metadata": metadata, "ids": ids})
+        path = write_mix_manifest(tmp / "all.manifest.json", parts)
+
+        # Part paths are stored relative to the manifest
+        manifest = json.loads(path.read_text())
+        assert manifest["total_mixes"] == 5
+        assert manifest["parts"][1]["data"] == "parts/inter.npz"
+
+        store = MixStore(path, base_path=tmp / "voices.npz", cache_dir=None)
+        assert store.ids == mix_weights.ids + inter_ids and not store.is_virtual
+        batch = store.get_many(["inter_0", "mix_2", "inter_1", "mix_0"])
+        np.testing.assert_allclose(batch, mixes[[1, 2, 0, 0]], atol=1e-6)
+        np.testing.assert_allclose(store["mix_1"], mixes[1], atol=1e-6)
+
+        metadata = load_mix_metadata(path)
+        assert metadata["total_mixes"] == 5
+        assert [m["id"] for m in metadata["mixes"]] == store.ids
+
+
+def test_shards_select_manifest_parts():
+    mixes = np.arange(5 * 510 * 256, dtype=np.float32).reshape(5, 510, 1, 256)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        parts = []
+        for shard, rows in enumerate(([0, 1], [2, 3], [4])):
+            ids = [f"mix_{row}" for row in rows]
+            np.savez(tmp / f"shard_{shard}.npz", **dict(zip(ids, mixes[rows])))
+            metadata = tmp / f"shard_{shard}_metadata.json"
+            metadata.write_text(json.dumps({"mixes": [{"id": i} for i in ids]}))
+            parts.append({"data": tmp / f"shard_{shard}.npz", "metadata": metadata, "ids": ids})
+        path = write_mix_manifest(tmp / "all.manifest.json", parts)
+
+        assert mix_index(load_mix_manifest(path))["mix_3"] == (1, 1)
+        assert shard_parts(3, 0, 2) == [0, 2] and shard_parts(3, 1, 2) == [1]
+        for shard, num_shards in ((2, 2), (0, 4)):
+            try:
+                shard_parts(3, shard, num_shards)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"shard {shard}/{num_shards} of 3 parts was accepted")
+
+        store = MixStore(path, parts=shard_parts(3, 0, 2))
+        assert store.ids == ["mix_0", "mix_1", "mix_4"] and "mix_2" not in store
+        np.testing.assert_array_equal(store.get_many(["mix_4", "mix_0"]), mixes[[4, 0]])
+        metadata = load_mix_metadata(path, parts=[1])
+        assert [m["id"] for m in metadata["mixes"]] == ["mix_2", "mix_3"]
+
+        try:
+            MixStore(tmp / "shard_0.npz", parts=[0])
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("parts were accepted for a plain NPZ")
+
+
+def test_style_rows():
+    assert parse_rows("12, 40-42,3,12") == [3, 12, 40, 41, 42]
+    assert token_rows([[[1] * 12, [2] * 30], [[3] * 12]]) == [12, 30]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        np.savez(tmp / "voices.npz", **_base_voices())
+        mix_weights = _mix_weights(tmp / "voices.npz")
+        save_mix_weights(mix_weights, tmp / "mixes.mixw.npz")
+        _, base = resolve_base_voices(mix_weights, cache_dir=None)
+        mixes = rebuild_mixes(mix_weights, mix_weights.ids, base)
+        np.savez(tmp / "mixes.npz", **dict(zip(mix_weights.ids, mixes)))
+
+        rows = [509, 3, 40]
+        np.testing.assert_allclose(
+            rebuild_mixes(mix_weights, mix_weights.ids, base, rows=rows), mixes[:, rows], atol=1e-6
+        )
+        virtual = MixStore(tmp / "mixes.mixw.npz", base_path=tmp / "voices.npz", cache_dir=None)
+        stored = MixStore(tmp / "mixes.npz")
+        for store in (virtual, stored):
+            full = store.get_many(["mix_1", "mix_2"])
+            batch = store.get_many(["mix_1", "mix_2"], rows=rows)
+            assert batch.shape == (2, 3, 1, 256)
+            np.testing.assert_allclose(batch, mixes[1:, rows], atol=1e-6)
+            # Row-sliced reads are cached apart from whole mixes
+            np.testing.assert_array_equal(store["mix_1"], full[0])
+            assert store.get_many([], rows=rows).shape == (0, 3, 1, 256)
+            try:
+                store.get_many(["mix_0"], rows=[510])
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("an out-of-range style row was read")
+
+        # A manifest over row-sliced mixes records the rows it stores
+        stored_rows = [3, 40, 509]
+        np.savez(tmp / "rows.npz", **dict(zip(mix_weights.ids, mixes[:, stored_rows])))
+        metadata = tmp / "rows_metadata.json"
+        metadata.write_text(json.dumps({"mixes": [{"id": i} for i in mix_weights.ids]}))
+        path = write_mix_manifest(
+            tmp / "rows.manifest.json",
+            [{"data": tmp / "rows.npz", "metadata": metadata, "ids": mix_weights.ids}],
+            rows=stored_rows,
+        )
+        assert json.loads(path.read_text())["version"] == 2
+        store = MixStore(path)
+        assert store.stored_rows == stored_rows
+        assert store["mix_0"].shape == (3, 1, 256)
+        np.testing.assert_array_equal(store.get_many(["mix_2"], rows=[509, 3]), mixes[[2]][:, [509, 3]])
+        try:
+            store.get_many(["mix_2"], rows=[4])
+        except ValueError as e:
+            assert "does not store" in str(e)
+        else:
+            raise AssertionError("a style row the manifest does not store was read")
+
+
+if __name__ == "__main__":
+    tests = [(name, test) for name, test in globals().items() if name.startswith("test_")]
+    for name, test in tests:
+        test()
+        print(f"ok  {name}")
+    print(f"{len(tests)} passed")
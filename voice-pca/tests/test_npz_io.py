@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Checks for the hand-written NPZ writer and reader in scripts/npz_io.py.
+
+Runs with pytest or standalone:
+    python tests/test_npz_io.py
+"""
+
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import npz_io  # noqa: E402
+from npz_io import NpzWriter, npz_directory, read_npz, save_npz  # noqa: E402
+
+
+def _arrays() -> dict[str, np.ndarray]:
+    rng = np.random.default_rng(0)
+    return {
+        "af_sky": rng.standard_normal((510, 1, 256)).astype(np.float32),
+        "ints": np.arange(1000, dtype=np.int64),
+        "scalar": np.array(3.5),
+        "empty": np.zeros((0, 4), dtype=np.float16),
+        "voix_été": np.ones((2, 3), dtype=np.float32),
+    }
+
+
+def test_round_trip_np_load():
+    arrays = _arrays()
+    with tempfile.TemporaryDirectory() as tmp:
+        for compress in (True, False):
+            for workers in (1, 4):
+                path = Path(tmp) / f"voices_{compress}_{workers}.npz"
+                save_npz(path, arrays, compress=compress, workers=workers)
+
+                with np.load(path) as npz:
+                    assert list(npz.files) == list(arrays)
+                    for name, array in arrays.items():
+                        assert npz[name].dtype == array.dtype
+                        np.testing.assert_array_equal(npz[name], array)
+                with zipfile.ZipFile(path) as zf:
+                    assert zf.testzip() is None
+
+                loaded = read_npz(path, workers=workers)
+                assert list(loaded) == list(arrays)
+                for name, array in arrays.items():
+                    np.testing.assert_array_equal(loaded[name], array)
+                assert list(read_npz(path, ["ints", "af_sky"])) == ["ints", "af_sky"]
+
+
+def test_read_npz_matches_savez_compressed():
+    arrays = _arrays()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "reference.npz"
+        np.savez_compressed(path, **arrays)
+        loaded = read_npz(path)
+        for name, array in arrays.items():
+            np.testing.assert_array_equal(loaded[name], array)
+
+        # A directory parsed once serves any number of reads
+        directory = npz_directory(path)
+        assert list(directory) == list(arrays)
+        names = list(arrays)[::-2]
+        subset = read_npz(path, names, directory=directory)
+        assert list(subset) == names
+        for name in names:
+            np.testing.assert_array_equal(subset[name], arrays[name])
+
+
+def test_read_npz_detects_corruption():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "voices.npz"
+        save_npz(path, {"a": np.arange(4096, dtype=np.float32)}, compress=False)
+        with zipfile.ZipFile(path) as zf:
+            info = zf.getinfo("a.npy")
+        data = bytearray(path.read_bytes())
+        data[info.header_offset + 30 + len("a.npy") + info.file_size - 1] ^= 0xFF
+        path.write_bytes(bytes(data))
+        try:
+            read_npz(path)
+        except ValueError as e:
+            assert "CRC mismatch" in str(e)
+        else:
+            raise AssertionError("corrupted member was read without error")
+
+
+def test_zip64_file_count():
+    # At 0xFFFF members the classic end record overflows; the writer must add
+    # the Zip64 end record and locator
+    count = npz_io._ZIP_FILECOUNT_LIMIT + 1
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "many.npz"
+        with NpzWriter(path, compress=False, workers=1) as writer:
+            for i in range(count):
+                writer.write(f"v{i}", np.array([i], dtype=np.int32))
+
+        assert b"PK\x06\x06" in path.read_bytes()[-200:]
+        with np.load(path) as npz:
+            assert len(npz.files) == count
+            assert npz[f"v{count - 1}"][0] == count - 1
+        assert read_npz(path, [f"v{count - 1}"])[f"v{count - 1}"][0] == count - 1
+
+
+def test_zip64_offset():
+    # A member that starts past 4 GiB needs a Zip64 offset in the central
+    # directory; skipping ahead leaves a sparse hole instead of writing 4 GiB
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "large.npz"
+        with NpzWriter(path, compress=True, workers=1) as writer:
+            writer.write("first", np.arange(8, dtype=np.float32))
+            writer._file.seek(npz_io._ZIP64_LIMIT + 1)
+            writer.write("second", np.arange(16, dtype=np.float32))
+
+        with zipfile.ZipFile(path) as zf:
+            assert zf.getinfo("second.npy").header_offset > npz_io._ZIP64_LIMIT
+        with np.load(path) as npz:
+            np.testing.assert_array_equal(npz["second"], np.arange(16, dtype=np.float32))
+        np.testing.assert_array_equal(
+            read_npz(path, ["second"])["second"], np.arange(16, dtype=np.float32)
+        )
+
+
+def test_partial_removed_on_error():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "voices.npz"
+        partial = path.with_name(path.name + ".partial")
+        for workers in (1, 4):
+            try:
+                with NpzWriter(path, workers=workers) as writer:
+                    writer.write("a", np.zeros(10))
+                    assert partial.exists()
+                    raise RuntimeError("interrupted")
+            except RuntimeError:
+                pass
+            assert not partial.exists()
+            assert not path.exists()
+
+        # A duplicate name fails the write, and the archive is discarded
+        try:
+            with NpzWriter(path) as writer:
+                writer.write("a", np.zeros(10))
+                writer.write("a", np.ones(10))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("duplicate member name was accepted")
+        assert not partial.exists()
+        assert not path.exists()
+
+
+if __name__ == "__main__":
+    tests = [(name, test) for name, test in globals().items() if name.startswith("test_")]
+    for name, test in tests:
+        test()
+        print(f"ok  {name}")
+    print(f"{len(tests)} passed")
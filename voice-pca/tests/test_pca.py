@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Checks for the mix-space PCA in scripts/pca.py.
+
+Runs with pytest or standalone:
+    python tests/test_pca.py
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from mix_store import MixStore, MixWeights, save_mix_weights  # noqa: E402
+from pca import fit_mix_pca, fit_pca, load_pca_result, pca_of_store, save_pca_result  # noqa: E402
+from voice_pack import file_sha256  # noqa: E402
+
+NAMES = ["af_a", "am_b", "bf_c", "bm_d", "ef_e", "em_f"]
+
+
+def _base_voices() -> np.ndarray:
+    rng = np.random.default_rng(5)
+    return rng.standard_normal((len(NAMES), 510, 256))
+
+
+def _weights(num_mixes: int = 40) -> np.ndarray:
+    rng = np.random.default_rng(6)
+    weights = rng.random((num_mixes, len(NAMES)))
+    weights[weights < 0.4] = 0.0
+    weights[:, 0] += 0.1
+    return weights
+
+
+def _materialized(weights: np.ndarray, base: np.ndarray, rows=None) -> np.ndarray:
+    """The mixes in float64, as mix_batch() would build them."""
+    if rows is not None:
+        base = base[:, rows]
+    normalized = weights / weights.sum(axis=1, keepdims=True)
+    return np.einsum("mv,vrd->mrd", normalized, base)
+
+
+def _assert_same_pca(gram, svd, k):
+    np.testing.assert_allclose(gram.explained_variance[:k], svd.explained_variance[:k], rtol=1e-8)
+    assert abs(gram.total_variance - svd.total_variance) < 1e-8 * svd.total_variance
+    np.testing.assert_allclose(gram.mean, svd.mean, atol=1e-10)
+    for i in range(k):
+        sign = np.sign(gram.components[i] @ svd.components[i])
+        np.testing.assert_allclose(gram.components[i], sign * svd.components[i], atol=1e-8)
+        np.testing.assert_allclose(gram.scores[:, i], sign * svd.scores[:, i], atol=1e-8)
+
+
+def test_gram_matches_svd():
+    base, weights = _base_voices(), _weights()
+    for rows in (None, [3, 40, 509]):
+        gram = fit_mix_pca(weights, base, rows=rows)
+        svd = fit_pca(_materialized(weights, base, rows), rows=rows)
+        # Mixes of 6 voices span at most 5 directions around their mean
+        assert len(gram.components) <= len(NAMES)
+        assert svd.explained_variance[len(NAMES):].max() < 1e-20 * svd.total_variance
+        _assert_same_pca(gram, svd, len(NAMES) - 1)
+        assert gram.rows == rows
+        np.testing.assert_allclose(
+            gram.voice_loadings @ base[:, rows if rows else slice(None)].reshape(len(NAMES), -1),
+            gram.components,
+            atol=1e-10,
+        )
+
+    # Same input, same signs and numbers
+    again = fit_mix_pca(weights, base, n_components=3)
+    np.testing.assert_array_equal(again.components, fit_mix_pca(weights, base, n_components=3).components)
+    assert again.components.shape == (3, 510 * 256)
+
+
+def test_store_auto_method_and_round_trip():
+    base, weights = _base_voices(), _weights(12)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        voices = {name: voice[:, None].astype(np.float32) for name, voice in zip(NAMES, base)}
+        np.savez(tmp / "voices.npz", **voices)
+        ids = [f"mix_{i}" for i in range(len(weights))]
+        mix_weights = MixWeights.from_dense(
+            ids, NAMES, weights, base_sha256=file_sha256(tmp / "voices.npz")
+        )
+        save_mix_weights(mix_weights, tmp / "mixes.mixw.npz")
+        store = MixStore(tmp / "mixes.mixw.npz", base_path=tmp / "voices.npz", cache_dir=None)
+
+        rows = [12, 30]
+        result = pca_of_store(store, n_components=4, rows=rows)
+        assert result.method == "gram" and result.voice_names == NAMES
+        assert result.ids == ids and result.components.shape == (4, 2 * 256)
+        svd = pca_of_store(store, n_components=4, rows=rows, method="svd")
+        assert svd.method == "svd"
+        # The SVD path reads float32 mixes
+        np.testing.assert_allclose(result.explained_variance, svd.explained_variance, rtol=1e-5)
+
+        loaded = load_pca_result(save_pca_result(result, tmp / "mixes.pca.npz"))
+        assert loaded.ids == ids and loaded.method == "gram" and loaded.rows == rows
+        assert loaded.voice_names == NAMES
+        np.testing.assert_allclose(loaded.components, result.components, rtol=1e-6, atol=1e-7)
+        np.testing.assert_array_equal(loaded.explained_variance, result.explained_variance)
+        np.testing.assert_array_equal(loaded.scores, result.scores)
+        assert loaded.total_variance == result.total_variance
+        assert loaded.component_voice(0).shape == (2, 1, 256)
+
+
+if __name__ == "__main__":
+    tests = [(name, test) for name, test in globals().items() if name.startswith("test_")]
+    for name, test in tests:
+        test()
+        print(f"ok  {name}")
+    print(f"{len(tests)} passed")
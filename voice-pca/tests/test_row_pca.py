@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Checks for the per-token-length PCA in scripts/row_pca.py.
+
+Runs with pytest or standalone:
+    python tests/test_row_pca.py
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from mix_store import MixStore, MixWeights, save_mix_weights  # noqa: E402
+from row_pca import (  # noqa: E402
+    load_row_pca_result,
+    row_pca_of_store,
+    save_row_pca_result,
+    share_basis_groups,
+    subspace_similarity,
+)
+from voice_pack import file_sha256  # noqa: E402
+
+NAMES = ["af_a", "am_b", "bf_c", "bm_d", "ef_e", "em_f"]
+ROWS = [5, 6, 120, 509]
+
+
+def _store(tmp: Path, num_mixes: int = 25) -> MixStore:
+    rng = np.random.default_rng(9)
+    voices = {name: rng.standard_normal((510, 1, 256)).astype(np.float32) for name in NAMES}
+    np.savez(tmp / "voices.npz", **voices)
+    ids = [f"mix_{i}" for i in range(num_mixes)]
+    mix_weights = MixWeights.from_dense(
+        ids, NAMES, rng.random((num_mixes, len(NAMES))), base_sha256=file_sha256(tmp / "voices.npz")
+    )
+    save_mix_weights(mix_weights, tmp / "mixes.mixw.npz")
+    return MixStore(tmp / "mixes.mixw.npz", base_path=tmp / "voices.npz", cache_dir=None)
+
+
+def test_gram_matches_stream():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _store(Path(tmp))
+        gram = row_pca_of_store(store, n_components=4, rows=ROWS)
+        stream = row_pca_of_store(store, n_components=4, rows=ROWS, method="stream", batch_size=7)
+        assert gram.method == "gram" and stream.method == "stream"
+        assert gram.rows == stream.rows == ROWS
+        assert gram.components.shape == (len(ROWS), 4, 256)
+
+        # The streamed path reads float32 mixes
+        similarity = subspace_similarity(gram.components, stream.components)
+        np.testing.assert_allclose(np.diag(similarity), 1.0, atol=1e-6)
+        np.testing.assert_allclose(gram.mean, stream.mean, atol=1e-6)
+        np.testing.assert_allclose(gram.explained_variance, stream.explained_variance, rtol=1e-4)
+        np.testing.assert_allclose(gram.total_variance, stream.total_variance, rtol=1e-4)
+
+        scores = gram.transform(store.get_many(store.ids, rows=ROWS))
+        assert scores.shape == (25, len(ROWS), 4)
+        np.testing.assert_allclose(scores.var(axis=0, ddof=1), gram.explained_variance, rtol=1e-4)
+
+
+def test_drift_report_and_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        result = row_pca_of_store(_store(tmp), n_components=3, rows=ROWS)
+        similarity = result.similarity()
+        np.testing.assert_allclose(np.diag(similarity), 1.0, atol=1e-10)
+        np.testing.assert_allclose(result.adjacent_similarity(), np.diag(similarity, 1), atol=1e-10)
+        assert result.component_drift().shape == (len(ROWS) - 1, 3)
+
+        groups = share_basis_groups(similarity, ROWS, threshold=1.1)
+        assert groups == [[row] for row in ROWS]
+        assert share_basis_groups(similarity, ROWS, threshold=0.0) == [ROWS]
+
+        loaded = load_row_pca_result(save_row_pca_result(result, tmp / "mixes.rowpca.npz"))
+        assert loaded.rows == ROWS and loaded.method == "gram" and loaded.num_samples == 25
+        np.testing.assert_allclose(loaded.components, result.components, atol=1e-6)
+        np.testing.assert_array_equal(loaded.explained_variance, result.explained_variance)
+
+
+if __name__ == "__main__":
+    tests = [(name, test) for name, test in globals().items() if name.startswith("test_")]
+    for name, test in tests:
+        test()
+        print(f"ok  {name}")
+    print(f"{len(tests)} passed")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Checks for the out-of-core PCA in scripts/streaming_pca.py.
+
+Runs with pytest or standalone:
+    python tests/test_streaming_pca.py
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from mix_store import MixStore  # noqa: E402
+from pca import fit_pca  # noqa: E402
+from streaming_pca import fit_streaming_pca, plan_batch_size, working_memory  # noqa: E402
+
+ROWS = [3, 40]
+
+
+def _mixes(num_mixes: int = 30) -> dict[str, np.ndarray]:
+    # Mixes of 6 voices, so the centered data has rank 5
+    rng = np.random.default_rng(8)
+    base = rng.standard_normal((6, 510, 1, 256)).astype(np.float32)
+    weights = rng.random((num_mixes, 6))
+    weights /= weights.sum(axis=1, keepdims=True)
+    mixes = np.einsum("mv,vrcd->mrcd", weights, base).astype(np.float32)
+    return {f"mix_{i}": mix for i, mix in enumerate(mixes)}
+
+
+class _InterruptedStore:
+    """A MixStore stand-in whose reads fail after a number of get_many calls."""
+
+    def __init__(self, store: MixStore, calls: int):
+        self.store = store
+        self.ids = store.ids
+        self.stored_rows = store.stored_rows
+        self.calls = calls
+
+    def get_many(self, ids, chunk_size=1024, rows=None):
+        if self.calls == 0:
+            raise RuntimeError("interrupted")
+        self.calls -= 1
+        return self.store.get_many(ids, chunk_size, rows)
+
+
+def _assert_same_pca(streamed, exact, k, atol):
+    np.testing.assert_allclose(streamed.explained_variance[:k], exact.explained_variance[:k], rtol=atol)
+    np.testing.assert_allclose(streamed.total_variance, exact.total_variance, rtol=1e-10)
+    np.testing.assert_allclose(streamed.mean, exact.mean, atol=1e-10)
+    for i in range(k):
+        sign = np.sign(streamed.components[i] @ exact.components[i])
+        np.testing.assert_allclose(streamed.components[i], sign * exact.components[i], atol=atol)
+        np.testing.assert_allclose(streamed.scores[:, i], sign * exact.scores[:, i], atol=atol)
+
+
+def test_methods_match_exact_pca():
+    mixes = _mixes()
+    with tempfile.TemporaryDirectory() as tmp:
+        np.savez(Path(tmp) / "mixes.npz", **mixes)
+        store = MixStore(Path(tmp) / "mixes.npz")
+        exact = fit_pca(store.get_many(store.ids, rows=ROWS), store.ids, rows=ROWS)
+
+        covariance = fit_streaming_pca(store, 4, rows=ROWS, method="covariance", batch_size=7)
+        assert covariance.method == "covariance" and covariance.rows == ROWS
+        _assert_same_pca(covariance, exact, 4, 1e-8)
+
+        randomized = fit_streaming_pca(store, 4, rows=ROWS, method="randomized", batch_size=7)
+        assert randomized.components.shape == (4, len(ROWS) * 256)
+        _assert_same_pca(randomized, exact, 4, 1e-8)
+
+        # Small problems pick the exact covariance path
+        assert fit_streaming_pca(store, 2, rows=ROWS).method == "covariance"
+
+
+def test_checkpoint_resume():
+    mixes = _mixes()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        np.savez(tmp / "mixes.npz", **mixes)
+        store = MixStore(tmp / "mixes.npz")
+        checkpoint = tmp / "pca.ckpt.npz"
+        options = dict(rows=ROWS, method="covariance", batch_size=5)
+        expected = fit_streaming_pca(store, 3, **options)
+
+        # One probe read, six batches in the first pass, then two more
+        try:
+            fit_streaming_pca(
+                _InterruptedStore(store, 9), 3, checkpoint_path=checkpoint, checkpoint_every=1, **options
+            )
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("the interrupted run finished")
+        assert checkpoint.exists()
+
+        resumed = fit_streaming_pca(store, 3, checkpoint_path=checkpoint, checkpoint_every=1, **options)
+        assert not checkpoint.exists()
+        np.testing.assert_allclose(resumed.components, expected.components, atol=1e-12)
+        np.testing.assert_allclose(resumed.scores, expected.scores, atol=1e-12)
+        np.testing.assert_allclose(resumed.explained_variance, expected.explained_variance, rtol=1e-12)
+
+
+def test_memory_limit():
+    dim = len(ROWS) * 256
+    limit = working_memory("covariance", dim, 3, 30) + 5 * dim * 24
+    assert plan_batch_size("covariance", dim, 3, 30, limit) == 5
+    try:
+        plan_batch_size("covariance", dim, 3, 30, limit - 5 * dim * 24)
+    except MemoryError:
+        pass
+    else:
+        raise AssertionError("a plan over the memory limit was accepted")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        np.savez(Path(tmp) / "mixes.npz", **_mixes())
+        store = MixStore(Path(tmp) / "mixes.npz")
+        options = dict(rows=ROWS, method="covariance", memory_limit=limit)
+        assert fit_streaming_pca(store, 3, batch_size=5, **options).components.shape == (3, dim)
+        try:
+            fit_streaming_pca(store, 3, batch_size=6, **options)
+        except MemoryError as e:
+            assert "--batch-size 5" in str(e)
+        else:
+            raise AssertionError("a batch size over the memory limit was accepted")
+
+
+if __name__ == "__main__":
+    tests = [(name, test) for name, test in globals().items() if name.startswith("test_")]
+    for name, test in tests:
+        test()
+        print(f"ok  {name}")
+    print(f"{len(tests)} passed")
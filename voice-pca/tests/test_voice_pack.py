@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Checks for the memory-mapped voice pack cache in scripts/voice_pack.py.
+
+Runs with pytest or standalone:
+    python tests/test_voice_pack.py
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from voice_pack import file_sha256, open_voice_pack  # noqa: E402
+
+
+def _voices() -> dict[str, np.ndarray]:
+    rng = np.random.default_rng(4)
+    return {
+        name: rng.standard_normal((510, 1, 256)).astype(np.float32)
+        for name in ("bf_c", "af_a", "am_b")
+    }
+
+
+def _open_logged(path: Path, cache_dir: Path):
+    """Open a pack and return it with whatever the open printed."""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        pack = open_voice_pack(path, cache_dir)
+    return pack, out.getvalue()
+
+
+def test_cache_is_built_once_and_mapped():
+    voices = _voices()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        path = tmp / "voices.npz"
+        np.savez_compressed(path, **voices)
+
+        pack, log = _open_logged(path, tmp / "cache")
+        assert "Building voice cache" in log
+        assert pack.sha256 == file_sha256(path)
+        assert pack.names == list(voices) and len(pack) == 3
+        assert isinstance(pack.data, np.memmap)
+        for name, voice in voices.items():
+            np.testing.assert_array_equal(pack[name], voice)
+
+        # The second open maps the cache without rebuilding or rehashing
+        again, log = _open_logged(path, tmp / "cache")
+        assert log == ""
+        assert again.sha256 == pack.sha256
+        sources = json.loads((tmp / "cache" / "sources.json").read_text())
+        assert [entry["sha256"] for entry in sources.values()] == [pack.sha256]
+
+        stacked = pack.stacked(["am_b", "bf_c"])
+        assert stacked.shape == (2, 510, 256)
+        np.testing.assert_array_equal(stacked[0], voices["am_b"][:, 0])
+        assert np.shares_memory(pack.stacked(), pack.data)
+        try:
+            pack.stacked(["af_a", "zz_missing"])
+        except KeyError as e:
+            assert "zz_missing" in str(e)
+        else:
+            raise AssertionError("a missing voice was stacked")
+
+
+def test_changed_pack_is_rebuilt():
+    voices = _voices()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        path = tmp / "voices.npz"
+        np.savez(path, **voices)
+        first = open_voice_pack(path, tmp / "cache")
+
+        voices["af_a"] = voices["af_a"] * 2
+        np.savez(path, **voices)
+        stat = path.stat()
+        # Make sure the size or mtime differs from the recorded entry
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        second, log = _open_logged(path, tmp / "cache")
+        assert "Building voice cache" in log
+        assert second.sha256 != first.sha256
+        np.testing.assert_array_equal(second["af_a"], voices["af_a"])
+        assert sorted(p.name for p in (tmp / "cache").iterdir() if p.is_dir()) == sorted(
+            [first.sha256, second.sha256]
+        )
+
+
+def test_uncached_matches_cached():
+    voices = _voices()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        np.savez(tmp / "voices.npz", **voices)
+        cached = open_voice_pack(tmp / "voices.npz", tmp / "cache")
+        plain = open_voice_pack(tmp / "voices.npz", cache_dir=None)
+        assert not isinstance(plain.data, np.memmap)
+        assert plain.sha256 == cached.sha256 and plain.names == cached.names
+        np.testing.assert_array_equal(plain.data, cached.data)
+        assert not (tmp / "voices.npz.partial").exists()
+
+
+if __name__ == "__main__":
+    tests = [(name, test) for name, test in globals().items() if name.startswith("test_")]
+    for name, test in tests:
+        test()
+        print(f"ok  {name}")
+    print(f"{len(tests)} passed")